@@ -1,8 +1,44 @@
-import datetime
-from api.payloads import APTDireccion, APTLocalidades
-import duckdb
-from typing import List, Optional
+from api.cache import cache_negativo
+from api.conexiones_duckdb import obtener_cursor
+from api.indice_apt import APT_INDICE_MEMORIA, obtener_indice_apt
+from api.metricas import medir_etapa
+from api.registros import LocalidadAPT, PuntoAPT
+import pandas as pd
+from typing import List, Optional, Tuple
 from mapeador.config.PathConfig import obtener_ruta_apt_chile, obtener_ruta_apt_localidades
+from mapeador.normalizacion import normalizar_referencia, patron_like
+
+COLUMNAS_APT_CHILE = [
+    "COD_DIRECCION",
+    "NOMBRE_DIRECC",
+    "NUMERO",
+    "COORDENADA_X",
+    "COORDENADA_Y",
+    "FECHA_INGRESO",
+    "FECHA_ACTUALIZACION",
+    "FECHA_GEOREFERENCIA",
+    "FECHA_NOVIGENCIA",
+    "COD_VIGENCIA",
+    "FLAG_NORMALIZADO",
+    "COD_COMUNA_INE",
+    "COD_COM_TXT",
+    "COD_CALLE",
+    "LETNUM",
+    "SITIO",
+    "DEPTO",
+    "CASA",
+    "BLOCK",
+    "COD_CALLE_OLD",
+    "COD_VIA",
+    "FUENTE",
+    "COD_LOCALIDAD",
+    "COD_ENTIDAD",
+    "COD_CPOBLADO",
+    "REFERENCIA",
+    "COD_UVECINAL",
+    "COD_AH",
+    "LOCALIDAD_RSH",
+]
 
 
 class AptChile:
@@ -11,7 +47,8 @@ class AptChile:
         self.database_apt_localidades_path = obtener_ruta_apt_localidades()
         
         
-    def buscar_direccion_sin_numero(self, cod_comuna: str, nombre_localidad: str) -> APTLocalidades:
+    @medir_etapa("apt_localidades")
+    def buscar_direccion_sin_numero(self, cod_comuna: str, nombre_localidad: str) -> Optional[LocalidadAPT]:
         """
         Busca una localidad en la base de datos localidades.duckdb.
 
@@ -20,13 +57,18 @@ class AptChile:
             nombre_localidad (str): Nombre exacto de la localidad.
 
         Returns:
-            Optional[LocalidadesResponse]: Resultado de la consulta o None si no se encuentra.
+            Optional[LocalidadAPT]: Resultado de la consulta o None si no se encuentra.
         """
-        # Conectar a DuckDB
-        conn = duckdb.connect(self.database_apt_localidades_path)
+        # Búsqueda que ya se hizo sin resultado dentro del TTL del caché negativo
+        clave = (cod_comuna, nombre_localidad)
+        if cache_negativo.sin_resultado("apt_localidades", clave):
+            return None
+
+        # Cursor del hilo actual sobre la conexión compartida a DuckDB
+        conn = obtener_cursor(self.database_apt_localidades_path)
         
-                # Ajustar el formato de la dirección
-        direccion_like = '%'.join(nombre_localidad.split())  # Reemplaza espacios con %
+        # Palabras normalizadas en orden: 'LOS AROMOS' -> '%LOS%AROMOS%'
+        direccion_like = patron_like(nombre_localidad)
 
         # Query parametrizada
         query = """
@@ -54,43 +96,21 @@ class AptChile:
         FROM localidades
         WHERE 
             cod_comuna = ?
-            AND nombre_localidad ILIKE ? 
+            AND nombre_localidad_norm LIKE ? ESCAPE '\\'
         LIMIT 1
         """
 
         # Ejecutar la consulta
-        resultado = conn.execute(query, (cod_comuna, f"%{direccion_like}%")).fetchone()
-
-        # Cerrar la conexión
-        conn.close()
+        resultado = conn.execute(query, (cod_comuna, direccion_like)).fetchone()
 
-        # Retornar el resultado mapeado si existe
+        # Retornar la fila cruda; el APTLocalidades se arma solo para la traza
         if resultado:
-            return APTLocalidades(
-                id_localid=int(resultado[0]) if resultado[0] is not None else None,
-                cod_comuna=str(resultado[1]) if resultado[1] is not None else "",
-                comuna=str(resultado[2]) if resultado[2] is not None else "",
-                cod_r=str(resultado[3]) if resultado[3] is not None else "",
-                region=str(resultado[4]) if resultado[4] is not None else "",
-                nombre_localidad=str(resultado[5]) if resultado[5] is not None else "",
-                longitud=float(resultado[6]) if resultado[6] is not None else None,
-                latitud=float(resultado[7]) if resultado[7] is not None else None,
-                tipo=str(resultado[8]) if resultado[8] is not None else "",
-                estado=str(resultado[9]) if resultado[9] is not None else "",
-                circuns=str(resultado[10]) if resultado[10] is not None else "",
-                codigo_cir=str(resultado[11]) if resultado[11] is not None else "",
-                glosacircu=str(resultado[12]) if resultado[12] is not None else "",
-                principal=str(resultado[13]) if resultado[13] is not None else "",
-                revisado=str(resultado[14]) if resultado[14] is not None else "",
-                created_user=str(resultado[15]) if resultado[15] is not None else None,
-                created_date=datetime.fromisoformat(resultado[16]) if resultado[16] is not None else None,
-                last_edited_user=str(resultado[17]) if resultado[17] is not None else None,
-                last_edited_date=datetime.fromisoformat(resultado[18]) if resultado[18] is not None else None,
-                globalid=str(resultado[19]) if resultado[19] is not None else "",
-            )
-        return None        
-
-    def buscar_direccion_con_numero(self, cut: int , direccion: str, numero: str) -> APTDireccion:
+            return LocalidadAPT.desde_fila(resultado)
+        cache_negativo.registrar("apt_localidades", clave)
+        return None
+
+    @medir_etapa("apt_chile")
+    def buscar_direccion_con_numero(self, cut: int , direccion: str, numero: str) -> Optional[PuntoAPT]:
         """
         Busca una dirección en la base de datos apt_chile.duckdb.
 
@@ -100,92 +120,106 @@ class AptChile:
             numero (str): Número exacto de la dirección.
 
         Returns:
-            AptChileResponse: Resultado de la consulta con todos los campos de la tabla apt_chile.
+            Optional[PuntoAPT]: Punto encontrado, con la fila completa de la tabla apt_chile.
         """
-        # Conectar a DuckDB
-        conn = duckdb.connect(self.database_apt_chile_path)
+        # Búsqueda que ya se hizo sin resultado dentro del TTL del caché negativo
+        clave = (cut, direccion, numero)
+        if cache_negativo.sin_resultado("apt_chile", clave):
+            return None
+
+        # Acierto exacto en el índice en memoria (si está activo); si no, consulta LIKE en DuckDB
+        if APT_INDICE_MEMORIA:
+            encontrada = obtener_indice_apt().buscar(cut, direccion, numero)
+            if encontrada is not None:
+                return encontrada
 
-        # Ajustar el formato de la dirección
-        direccion_like = '%'.join(direccion.split())  # Reemplaza espacios con %
+        # Cursor del hilo actual sobre la conexión compartida a DuckDB
+        conn = obtener_cursor(self.database_apt_chile_path)
+
+        # Palabras normalizadas en orden: 'LOS AROMOS' -> '%LOS%AROMOS%'
+        direccion_like = patron_like(direccion)
         
         # Query parametrizada con todos los atributos
-        query = """
-        SELECT
-            COD_DIRECCION,
-            NOMBRE_DIRECC,
-            NUMERO,
-            COORDENADA_X,
-            COORDENADA_Y,
-            FECHA_INGRESO,
-            FECHA_ACTUALIZACION,
-            FECHA_GEOREFERENCIA,
-            FECHA_NOVIGENCIA,
-            COD_VIGENCIA,
-            FLAG_NORMALIZADO,
-            COD_COMUNA_INE,
-            COD_COM_TXT,
-            COD_CALLE,
-            LETNUM,
-            SITIO,
-            DEPTO,
-            CASA,
-            BLOCK,
-            COD_CALLE_OLD,
-            COD_VIA,
-            FUENTE,
-            COD_LOCALIDAD,
-            COD_ENTIDAD,
-            COD_CPOBLADO,
-            REFERENCIA,
-            COD_UVECINAL,
-            COD_AH,
-            LOCALIDAD_RSH
+        query = f"""
+        SELECT {", ".join(COLUMNAS_APT_CHILE)}
         FROM apt_chile
         WHERE 
             COD_COMUNA_INE = ? 
-            AND NOMBRE_DIRECC ILIKE ? 
+            AND NOMBRE_DIRECC_NORM LIKE ? ESCAPE '\\'
             AND NUMERO = ?
         LIMIT 1
         """
 
         # Ejecutar la consulta
-        resultado = conn.execute(query, (cut, f"%{direccion_like}%", numero)).fetchone()
-
-        # Cerrar la conexión
-        conn.close()
+        resultado = conn.execute(query, (cut, direccion_like, numero)).fetchone()
 
         if resultado is not None:
-            # Mapear los resultados a AptChileResponse
-            apt_chile_responses = APTDireccion(
-                cod_direccion=resultado[0],
-                nombre_direcc=resultado[1],
-                numero=str(resultado[2]),  # Convierte a str
-                coordenada_x=str(resultado[3]),  # Convierte a str
-                coordenada_y=str(resultado[4]),  # Convierte a str
-                fecha_ingreso=resultado[5],
-                fecha_actualizacion=resultado[6],
-                fecha_georeferencia=resultado[7],
-                fecha_novigencia=resultado[8],
-                cod_vigencia=resultado[9],
-                flag_normalizado=resultado[10],
-                cod_comuna_ine=resultado[11],
-                cod_com_txt=resultado[12],
-                cod_calle=resultado[13],
-                letnum=resultado[14],
-                sitio=resultado[15],
-                depto=resultado[16],
-                casa=resultado[17],
-                block=resultado[18],
-                cod_calle_old=resultado[19],
-                cod_via=resultado[20],
-                fuente=resultado[21],
-                cod_localidad=resultado[22],
-                cod_entidad=resultado[23],
-                cod_cpoblado=resultado[24],
-                referencia=resultado[25],
-                cod_uvecinal=resultado[26],
-                cod_ah=resultado[27],
-                localidad_rsh=resultado[28]
-            )        
-            return apt_chile_responses
+            return PuntoAPT.desde_fila(resultado)
+        cache_negativo.registrar("apt_chile", clave)
         return None
+
+    def completar_punto(self, punto: PuntoAPT) -> PuntoAPT:
+        """
+        Agrega la fila completa de apt_chile a un punto del índice en memoria, que solo trae los
+        campos básicos, para que la traza tenga las mismas columnas que una búsqueda en DuckDB.
+        """
+        if punto.fila is None and punto.rowid is not None:
+            conn = obtener_cursor(self.database_apt_chile_path)
+            punto.fila = conn.execute(
+                f"SELECT {', '.join(COLUMNAS_APT_CHILE)} FROM apt_chile WHERE rowid = ?", [punto.rowid]
+            ).fetchone()
+        return punto
+
+    @medir_etapa("apt_chile_lote")
+    def buscar_direcciones_con_numero(self, consultas: List[Tuple[int, str, str]]) -> List[Optional[PuntoAPT]]:
+        """
+        Busca un lote de direcciones en apt_chile con una sola consulta: el lote se registra en
+        DuckDB y se cruza con apt_chile por (COD_COMUNA_INE, NUMERO), con el mismo filtro LIKE
+        de ``buscar_direccion_con_numero``. Si varias filas cumplen, se queda con la de nombre
+        más parecido (menor distancia de edición) y, a igual distancia, con la primera de la tabla.
+        Con el índice en memoria activo, solo las direcciones que no aciertan en él van a DuckDB;
+        las que están en el caché negativo no se buscan.
+
+        Args:
+            consultas: Lista de tuplas (cut, direccion, numero), en el orden de entrada.
+
+        Returns:
+            Lista con el PuntoAPT de cada consulta (o None si no se encontró), en el mismo orden.
+        """
+        resultados: List[Optional[PuntoAPT]] = [None] * len(consultas)
+        if APT_INDICE_MEMORIA:
+            indice = obtener_indice_apt()
+            resultados = [indice.buscar(cut, direccion, numero) for cut, direccion, numero in consultas]
+
+        lote = [
+            (posicion, int(cut), patron_like(direccion), normalizar_referencia(direccion), int(numero))
+            for posicion, (cut, direccion, numero) in enumerate(consultas)
+            if str(numero).isdigit()
+            and resultados[posicion] is None
+            and not cache_negativo.sin_resultado("apt_chile", (cut, direccion, numero))
+        ]
+        if not lote:
+            return resultados
+
+        conn = obtener_cursor(self.database_apt_chile_path)
+        conn.register("lote_apt", pd.DataFrame(lote, columns=["posicion", "cut", "patron", "direccion", "numero"]))
+        try:
+            filas = conn.execute(f"""
+            SELECT l.posicion, {", ".join("a." + columna for columna in COLUMNAS_APT_CHILE)}
+            FROM lote_apt l
+            JOIN apt_chile a ON a.COD_COMUNA_INE = l.cut AND a.NUMERO = l.numero
+            WHERE a.NOMBRE_DIRECC_NORM LIKE l.patron ESCAPE '\\'
+            QUALIFY row_number() OVER (
+                PARTITION BY l.posicion
+                ORDER BY levenshtein(a.NOMBRE_DIRECC_NORM, l.direccion), a.rowid
+            ) = 1
+            """).fetchall()
+        finally:
+            conn.unregister("lote_apt")
+
+        for fila in filas:
+            resultados[fila[0]] = PuntoAPT.desde_fila(fila[1:])
+        for posicion, *_ in lote:
+            if resultados[posicion] is None:
+                cache_negativo.registrar("apt_chile", consultas[posicion])
+        return resultados
@@ -0,0 +1,202 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from api.cache import cache_geolocalizacion, cache_negativo
+from api.conexiones_duckdb import gestor_duckdb, obtener_cursor
+from api.geopanda_util import obtener_almacen_comunas
+from api.indice_apt import APT_INDICE_MEMORIA, obtener_indice_apt, recargar_indice_apt
+from api.manager import retorna_geolocalizacion
+from api.payloads import RequestGetGeo
+from mapeador.config.PathConfig import (
+    cargar_configuracion,
+    obtener_ruta_apt_chile,
+    obtener_ruta_apt_localidades,
+    obtener_ruta_maestro_calles,
+)
+from mapeador.glosario import obtener_glosarios
+from mapeador.indice_calles import obtener_indice_maestro_calles, recargar_indice_maestro_calles
+
+# Direcciones de APT CHILE que se geolocalizan al arrancar, para ejercitar la cascada completa
+# (0 desactiva el calentamiento)
+GEO_CALENTAMIENTO = int(os.getenv("GEO_CALENTAMIENTO", "5"))
+
+# Cada cuántos segundos se revisa si construir_referencias.py reemplazó alguna base DuckDB, para
+# recargarlas sin esperar a POST /admin/referencias/recargar (0 desactiva la revisión)
+GEO_REVISAR_REFERENCIAS_S = float(os.getenv("GEO_REVISAR_REFERENCIAS_S", "60"))
+
+# Columnas que leen las consultas de cada base; recorrerlas deja sus páginas en la caché del sistema
+COLUMNAS_PRECARGA = {
+    "apt_chile": ["COD_COMUNA_INE", "NOMBRE_DIRECC_NORM", "NUMERO"],
+    "localidades": ["cod_comuna", "nombre_localidad_norm"],
+}
+
+
+# Etapas sin las cuales la API no puede atender peticiones: si alguna falla, /ready sigue en 503.
+# Las páginas de DuckDB y el calentamiento solo adelantan trabajo, así que su error no impide partir
+ETAPAS_REQUERIDAS = ["configuracion", "glosarios", "maestro_calles", "indice_apt", "comunas"]
+
+
+class EstadoArranque:
+    """Avance de la precarga: duración y error de cada etapa, si ya terminó y si quedó lista."""
+
+    def __init__(self):
+        self.terminado = False
+        self.listo = False
+        self.etapas: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def ejecutar(self, etapa: str, funcion: Callable[[], Any]) -> None:
+        """Ejecuta una etapa; un error se registra y la precarga sigue con las demás."""
+        inicio = time.perf_counter()
+        error = None
+        try:
+            funcion()
+        except Exception as e:
+            error = str(e)
+            print(f"Error en la etapa '{etapa}' del arranque: {e}")
+        with self._lock:
+            self.etapas[etapa] = {"duracion_ms": round((time.perf_counter() - inicio) * 1000, 1), "error": error}
+
+    def errores_requeridos(self, requeridas: List[str]) -> Dict[str, str]:
+        """Error de cada etapa requerida que falló o que no llegó a ejecutarse."""
+        with self._lock:
+            errores = {}
+            for etapa in requeridas:
+                datos = self.etapas.get(etapa)
+                if datos is None:
+                    errores[etapa] = "no ejecutada"
+                elif datos["error"] is not None:
+                    errores[etapa] = datos["error"]
+            return errores
+
+    def resumen(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "listo": self.listo,
+                "terminado": self.terminado,
+                "etapas": {etapa: dict(datos) for etapa, datos in self.etapas.items()},
+            }
+
+
+estado_arranque = EstadoArranque()
+
+
+def precargar_paginas(ruta: str, tabla: str, columnas: List[str]) -> None:
+    """Recorre las columnas indicadas para que el primer acceso real no lea del disco."""
+    cursor = obtener_cursor(ruta)
+    cursor.execute(f"SELECT {', '.join(f'max({columna})' for columna in columnas)} FROM {tabla}").fetchall()
+
+
+def direcciones_calentamiento(cantidad: int) -> List[RequestGetGeo]:
+    """Muestra de direcciones de APT CHILE con el nombre de su comuna y región según el maestro de calles."""
+    filas = obtener_cursor(obtener_ruta_apt_chile()).execute(
+        f"SELECT COD_COMUNA_INE, NOMBRE_DIRECC, NUMERO FROM apt_chile "
+        f"WHERE COD_COMUNA_INE IS NOT NULL AND NUMERO IS NOT NULL "
+        f"USING SAMPLE reservoir({int(cantidad)} ROWS) REPEATABLE (1)"
+    ).fetchall()
+    cursor_calles = obtener_cursor(obtener_ruta_maestro_calles())
+    direcciones = []
+    for cut, nombre, numero in filas:
+        comuna = cursor_calles.execute(
+            "SELECT COMUNA, REGION FROM maestro_calles WHERE CUT = ? LIMIT 1", [cut]
+        ).fetchone()
+        if comuna is not None:
+            direcciones.append(
+                RequestGetGeo(nombre_via=nombre, numero=str(numero), comuna=comuna[0], region=comuna[1])
+            )
+    return direcciones
+
+
+def calentar(cantidad: int) -> None:
+    for request in direcciones_calentamiento(cantidad):
+        retorna_geolocalizacion(request, ignorar_cache=True)
+
+
+def precargar(estado: Optional[EstadoArranque] = None, calentamiento: int = GEO_CALENTAMIENTO) -> EstadoArranque:
+    """
+    Carga todo lo que las peticiones cargarían en su primer uso: configuración, glosarios,
+    índice del maestro de calles, índice de APT CHILE, páginas de las bases DuckDB y polígonos
+    de comunas; luego geolocaliza algunas direcciones. Al terminar marca el estado como listo solo
+    si ninguna de las etapas de ETAPAS_REQUERIDAS falló; el error del resto no impide partir.
+    """
+    estado = estado or estado_arranque
+    estado.ejecutar("configuracion", cargar_configuracion)
+    estado.ejecutar("glosarios", obtener_glosarios)
+    estado.ejecutar("maestro_calles", obtener_indice_maestro_calles)
+    if APT_INDICE_MEMORIA:
+        estado.ejecutar("indice_apt", obtener_indice_apt)
+    estado.ejecutar("apt_chile", lambda: precargar_paginas(obtener_ruta_apt_chile(), "apt_chile", COLUMNAS_PRECARGA["apt_chile"]))
+    estado.ejecutar(
+        "localidades",
+        lambda: precargar_paginas(obtener_ruta_apt_localidades(), "localidades", COLUMNAS_PRECARGA["localidades"]),
+    )
+    estado.ejecutar("comunas", obtener_almacen_comunas)
+    if calentamiento > 0:
+        estado.ejecutar("calentamiento", lambda: calentar(calentamiento))
+    requeridas = [etapa for etapa in ETAPAS_REQUERIDAS if etapa != "indice_apt" or APT_INDICE_MEMORIA]
+    errores = estado.errores_requeridos(requeridas)
+    if errores:
+        print(f"La API no queda lista; fallaron etapas requeridas del arranque: {errores}")
+    estado.listo = not errores
+    estado.terminado = True
+    return estado
+
+
+def firma_referencias() -> Dict[str, Optional[Tuple[int, int]]]:
+    """
+    Inodo y fecha de modificación de cada base de referencia (None si no existe).
+    ``construir_referencias.py`` reemplaza el archivo completo, así que cambian en cada reconstrucción.
+    """
+    firma = {}
+    for ruta in (obtener_ruta_maestro_calles(), obtener_ruta_apt_chile(), obtener_ruta_apt_localidades()):
+        try:
+            estado = os.stat(ruta)
+            firma[ruta] = (estado.st_ino, estado.st_mtime_ns)
+        except OSError:
+            firma[ruta] = None
+    return firma
+
+
+# Firma de las bases abiertas, para notar cuándo se reconstruyen
+_firma_cargada: Optional[Dict[str, Optional[Tuple[int, int]]]] = None
+_lock_recarga = threading.Lock()
+
+
+def registrar_carga_referencias() -> None:
+    """Anota la firma de las bases recién abiertas al arrancar."""
+    global _firma_cargada
+    _firma_cargada = firma_referencias()
+
+
+def recargar_referencias() -> Dict[str, int]:
+    """
+    Vuelve a abrir las bases DuckDB de referencia tras reconstruirlas con
+    ``construir_referencias.py`` y rehace los índices en memoria. Descarta los resultados y las
+    búsquedas sin resultado obtenidos con las bases anteriores.
+
+    Las consultas DuckDB en curso al momento de cerrar las conexiones fallan.
+
+    :return: Entradas eliminadas de cada caché.
+    """
+    global _firma_cargada
+    with _lock_recarga:
+        _firma_cargada = firma_referencias()
+        gestor_duckdb.cerrar()
+        gestor_duckdb.abrir(obtener_ruta_maestro_calles(), obtener_ruta_apt_chile(), obtener_ruta_apt_localidades())
+        recargar_indice_maestro_calles()
+        if APT_INDICE_MEMORIA:
+            recargar_indice_apt()
+        return {"negativo": cache_negativo.invalidar(), "resultados": cache_geolocalizacion.invalidar()}
+
+
+def recargar_si_cambiaron() -> Optional[Dict[str, int]]:
+    """
+    Recarga las referencias si alguna base cambió desde que se abrió (``firma_referencias``).
+
+    :return: Entradas eliminadas de cada caché, o None si no hubo cambios.
+    """
+    if _firma_cargada is None or firma_referencias() == _firma_cargada:
+        return None
+    return recargar_referencias()
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+class CacheLRU:
+    """
+    Caché en memoria acotado por cantidad de entradas (desaloja la menos usada) y con
+    tiempo de vida por entrada. Es seguro para usarse desde varios hilos.
+    """
+
+    def __init__(self, maximo: int, ttl: float, reloj: Callable[[], float] = time.monotonic):
+        self.maximo = maximo
+        self.ttl = ttl
+        self._reloj = reloj
+        self._entradas: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expirados = 0
+        self.desalojos = 0
+
+    def buscar(self, clave: Hashable) -> Tuple[bool, Any]:
+        """
+        Busca una clave vigente.
+
+        :return: Tupla (encontrado, valor); el valor puede ser None si eso fue lo que se guardó.
+        """
+        if self.maximo <= 0:
+            return False, None
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return False, None
+            vence, valor = entrada
+            if vence <= self._reloj():
+                del self._entradas[clave]
+                self.expirados += 1
+                self.fallos += 1
+                return False, None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return True, valor
+
+    def guardar(self, clave: Hashable, valor: Any, ttl: Optional[float] = None) -> None:
+        """Guarda un valor, desalojando las entradas menos usadas si se supera el máximo."""
+        if self.maximo <= 0:
+            return
+        vence = self._reloj() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entradas[clave] = (vence, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+                self.desalojos += 1
+
+    def invalidar(self, clave: Optional[Hashable] = None) -> int:
+        """
+        Elimina una clave o, sin argumentos, todo el contenido.
+
+        :return: Cantidad de entradas eliminadas.
+        """
+        with self._lock:
+            if clave is None:
+                eliminadas = len(self._entradas)
+                self._entradas.clear()
+                return eliminadas
+            return 1 if self._entradas.pop(clave, None) is not None else 0
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """Contadores de uso del caché."""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                "entradas": len(self._entradas),
+                "maximo": self.maximo,
+                "ttl": self.ttl,
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expirados": self.expirados,
+                "desalojos": self.desalojos,
+                "tasa_aciertos": round(self.aciertos / consultas, 4) if consultas else 0.0,
+            }
+
+
+# Caché de resultados finales de geolocalización (GEO_CACHE_MAXIMO=0 lo desactiva)
+cache_geolocalizacion = CacheLRU(
+    maximo=int(os.getenv("GEO_CACHE_MAXIMO", "10000")),
+    ttl=float(os.getenv("GEO_CACHE_TTL", "3600")),
+)
+
+
+class CacheNegativo:
+    """
+    Búsquedas sin resultado por fuente de la cascada ("no hay coincidencia en la fuente X para
+    la clave K"), para que una dirección que se repite pase directo a la etapa siguiente.
+    Cada fuente tiene su propio CacheLRU, con el mismo máximo y TTL.
+    """
+
+    def __init__(self, fuentes, maximo: int, ttl: float):
+        self._caches: Dict[str, CacheLRU] = {fuente: CacheLRU(maximo=maximo, ttl=ttl) for fuente in fuentes}
+
+    def sin_resultado(self, fuente: str, clave: Hashable) -> bool:
+        """Indica si la clave ya se buscó en la fuente sin encontrar nada (dentro del TTL)."""
+        encontrado, _ = self._caches[fuente].buscar(clave)
+        return encontrado
+
+    def registrar(self, fuente: str, clave: Hashable) -> None:
+        """Registra que la búsqueda de la clave en la fuente no tuvo resultado."""
+        self._caches[fuente].guardar(clave, True)
+
+    def invalidar(self, fuente: Optional[str] = None) -> int:
+        """
+        Olvida las búsquedas sin resultado de una fuente o, sin argumentos, de todas.
+
+        :return: Cantidad de entradas eliminadas.
+        """
+        if fuente is not None:
+            return self._caches[fuente].invalidar()
+        return sum(cache.invalidar() for cache in self._caches.values())
+
+    def estadisticas(self) -> Dict[str, Dict[str, Any]]:
+        """Contadores de uso por fuente."""
+        return {fuente: cache.estadisticas() for fuente, cache in self._caches.items()}
+
+
+# Búsquedas sin resultado en APT CHILE y Servel (GEO_CACHE_NEGATIVO_MAXIMO=0 lo desactiva),
+# con un TTL propio, independiente del caché de resultados
+cache_negativo = CacheNegativo(
+    ["apt_chile", "apt_localidades", "servel_direccion_persona", "servel_localidades"],
+    maximo=int(os.getenv("GEO_CACHE_NEGATIVO_MAXIMO", "50000")),
+    ttl=float(os.getenv("GEO_CACHE_NEGATIVO_TTL", "900")),
+)
@@ -0,0 +1,130 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from mapeador.config.PathConfig import obtener_ruta_cache_proveedores
+
+# Tiempo de vida de las respuestas guardadas, en segundos (0 = no expiran)
+PROVEEDORES_CACHE_TTL = float(os.getenv("PROVEEDORES_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+class CacheProveedores:
+    """
+    Caché persistente (SQLite) de las respuestas crudas de los geocodificadores externos,
+    por proveedor y texto exacto de la consulta. Sobrevive a los reinicios, de modo que una
+    dirección ya pagada a Google no se vuelve a consultar.
+
+    También guarda las respuestas vacías (sin resultados), que se reutilizan igual que las demás.
+    """
+
+    def __init__(self, ruta: str, ttl: float = PROVEEDORES_CACHE_TTL):
+        self.ruta = ruta
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._estadisticas: Dict[str, Dict[str, int]] = {}
+        directorio = os.path.dirname(ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False, timeout=30)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            """
+            CREATE TABLE IF NOT EXISTS respuestas (
+                proveedor TEXT NOT NULL,
+                consulta TEXT NOT NULL,
+                respuesta TEXT,
+                guardado_en REAL NOT NULL,
+                PRIMARY KEY (proveedor, consulta)
+            )
+            """
+        )
+        self._conexion.commit()
+
+    def _contar(self, proveedor: str, contador: str) -> None:
+        estadisticas = self._estadisticas.setdefault(
+            proveedor, {"aciertos": 0, "fallos": 0, "expirados": 0, "guardados": 0}
+        )
+        estadisticas[contador] += 1
+
+    def buscar(self, proveedor: str, consulta: str) -> Tuple[bool, Any]:
+        """
+        Busca la respuesta guardada de un proveedor para la consulta exacta.
+
+        :return: Tupla (encontrado, respuesta); la respuesta puede ser vacía o None.
+        """
+        with self._lock:
+            try:
+                fila = self._conexion.execute(
+                    "SELECT respuesta, guardado_en FROM respuestas WHERE proveedor = ? AND consulta = ?",
+                    (proveedor, consulta),
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error al leer el caché de proveedores: {e}")
+                fila = None
+            if fila is None:
+                self._contar(proveedor, "fallos")
+                return False, None
+            if self.ttl > 0 and fila[1] + self.ttl <= time.time():
+                self._contar(proveedor, "expirados")
+                self._contar(proveedor, "fallos")
+                return False, None
+            self._contar(proveedor, "aciertos")
+        return True, json.loads(fila[0]) if fila[0] is not None else None
+
+    def guardar(self, proveedor: str, consulta: str, respuesta: Any) -> None:
+        """Guarda (o reemplaza) la respuesta cruda del proveedor para la consulta."""
+        contenido = json.dumps(respuesta, ensure_ascii=False) if respuesta is not None else None
+        with self._lock:
+            try:
+                self._conexion.execute(
+                    "INSERT OR REPLACE INTO respuestas (proveedor, consulta, respuesta, guardado_en) VALUES (?, ?, ?, ?)",
+                    (proveedor, consulta, contenido, time.time()),
+                )
+                self._conexion.commit()
+                self._contar(proveedor, "guardados")
+            except sqlite3.Error as e:
+                print(f"Error al guardar en el caché de proveedores: {e}")
+
+    def invalidar(self, proveedor: Optional[str] = None) -> int:
+        """
+        Elimina las respuestas de un proveedor o, sin argumentos, todas.
+
+        :return: Cantidad de respuestas eliminadas.
+        """
+        with self._lock:
+            if proveedor is None:
+                cursor = self._conexion.execute("DELETE FROM respuestas")
+            else:
+                cursor = self._conexion.execute("DELETE FROM respuestas WHERE proveedor = ?", (proveedor,))
+            self._conexion.commit()
+            return cursor.rowcount
+
+    def estadisticas(self) -> Dict[str, Dict[str, int]]:
+        """Contadores de uso por proveedor desde el inicio del proceso, más las entradas guardadas."""
+        with self._lock:
+            entradas = dict(
+                self._conexion.execute("SELECT proveedor, COUNT(*) FROM respuestas GROUP BY proveedor").fetchall()
+            )
+            resultado = {proveedor: dict(contadores) for proveedor, contadores in self._estadisticas.items()}
+        for proveedor, cantidad in entradas.items():
+            resultado.setdefault(proveedor, {"aciertos": 0, "fallos": 0, "expirados": 0, "guardados": 0})
+            resultado[proveedor]["entradas"] = cantidad
+        return resultado
+
+
+_cache_proveedores: Optional[CacheProveedores] = None
+_lock_cache = threading.Lock()
+
+
+def obtener_cache_proveedores() -> CacheProveedores:
+    """Retorna el caché persistente compartido, abriendo el archivo SQLite en el primer uso."""
+    global _cache_proveedores
+    if _cache_proveedores is None:
+        with _lock_cache:
+            if _cache_proveedores is None:
+                _cache_proveedores = CacheProveedores(obtener_ruta_cache_proveedores())
+    return _cache_proveedores
@@ -0,0 +1,161 @@
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from api.plazo import limitar_timeout, tiempo_restante
+
+# Estados HTTP que justifican reintentar la consulta
+ESTADOS_REINTENTABLES = {429, 500, 502, 503, 504}
+
+HTTP_CONFIG = {
+    "timeout_conexion": float(os.getenv("HTTP_TIMEOUT_CONEXION", "3.05")),
+    "timeout_lectura": float(os.getenv("HTTP_TIMEOUT_LECTURA", "10")),
+    "reintentos": int(os.getenv("HTTP_REINTENTOS", "2")),
+    "espera_base": float(os.getenv("HTTP_ESPERA_BASE", "0.5")),
+    # Espera máxima antes de un reintento; un Retry-After mayor hace desistir en vez de esperar
+    "espera_maxima": float(os.getenv("HTTP_ESPERA_MAXIMA", "10")),
+    "pool_maximo": int(os.getenv("HTTP_POOL_MAXIMO", "20")),
+}
+
+# Consultas por segundo permitidas por proveedor (Nominatim exige como máximo 1 por segundo)
+TASAS_PROVEEDORES = {
+    "nominatim": float(os.getenv("NOMINATIM_TASA", "1")),
+    "google_maps": float(os.getenv("GOOGLE_MAPS_TASA", "50")),
+}
+
+
+class LimitadorTasa:
+    """
+    Cubeta de fichas compartida por todos los hilos: entrega como máximo ``tasa`` fichas por
+    segundo, con ráfagas de hasta ``capacidad`` fichas.
+    """
+
+    def __init__(self, tasa: float, capacidad: float = 1.0, reloj=time.monotonic, dormir=time.sleep):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._reloj = reloj
+        self._dormir = dormir
+        self._fichas = capacidad
+        self._ultima = reloj()
+        self._lock = threading.Lock()
+
+    def adquirir(self, espera_maxima: Optional[float] = None) -> Optional[float]:
+        """
+        Toma una ficha, esperando lo necesario si la cubeta está vacía.
+
+        :param espera_maxima: Si la espera necesaria la supera, no se toma la ficha.
+        :return: Segundos que se esperó, o None si no se tomó la ficha.
+        """
+        if self.tasa <= 0:
+            return 0.0
+        with self._lock:
+            ahora = self._reloj()
+            self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultima) * self.tasa)
+            self._ultima = ahora
+            espera = (1 - self._fichas) / self.tasa if self._fichas < 1 else 0.0
+            if espera_maxima is not None and espera > espera_maxima:
+                return None
+            # La ficha se reserva de inmediato; si falta, la espera queda asignada a este hilo
+            self._fichas -= 1
+        if espera > 0:
+            self._dormir(espera)
+        return espera
+
+
+class ClienteHTTP:
+    """
+    Cliente HTTP de un proveedor externo: sesión con conexiones persistentes (keep-alive),
+    timeouts de conexión y lectura, limitador de tasa y reintentos acotados con espera exponencial.
+    Cada reintento también pasa por el limitador, de modo que la tasa nunca se supera.
+    """
+
+    def __init__(
+        self,
+        nombre: str,
+        tasa: float = 0.0,
+        timeout_conexion: float = HTTP_CONFIG["timeout_conexion"],
+        timeout_lectura: float = HTTP_CONFIG["timeout_lectura"],
+        reintentos: int = HTTP_CONFIG["reintentos"],
+        espera_base: float = HTTP_CONFIG["espera_base"],
+        espera_maxima: float = HTTP_CONFIG["espera_maxima"],
+        pool_maximo: int = HTTP_CONFIG["pool_maximo"],
+    ):
+        self.nombre = nombre
+        self.timeout = (timeout_conexion, timeout_lectura)
+        self.reintentos = reintentos
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.limitador = LimitadorTasa(tasa)
+        self.sesion = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maximo)
+        self.sesion.mount("http://", adaptador)
+        self.sesion.mount("https://", adaptador)
+
+    def _espera(self, intento: int, response: Optional[requests.Response] = None) -> float:
+        # Respetar Retry-After cuando el proveedor lo informa en segundos
+        if response is not None:
+            retry_after = response.headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                return float(retry_after)
+        return min(self.espera_base * (2 ** intento), self.espera_maxima)
+
+    def _alcanza(self, espera: float) -> bool:
+        """Indica si se puede esperar y volver a intentar: dentro de la espera máxima y del plazo."""
+        if espera > self.espera_maxima:
+            return False
+        restante = tiempo_restante()
+        return restante is None or espera < restante
+
+    def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None) -> requests.Response:
+        """
+        Realiza un GET con reintentos ante errores de red y estados 429/5xx.
+
+        Dentro de un plazo (``api.plazo``) los timeouts se recortan a lo que queda de él, y no se
+        espera al limitador ni se reintenta si eso lo excede. Tampoco se reintenta si el proveedor
+        pide (Retry-After) esperar más que ``espera_maxima``.
+
+        :return: La última respuesta obtenida (el llamador decide con ``raise_for_status``).
+        :raises requests.RequestException: Si todos los intentos fallan por error de red o timeout,
+            o si el plazo se agota antes de poder consultar.
+        """
+        for intento in range(self.reintentos + 1):
+            ultimo = intento == self.reintentos
+            if self.limitador.adquirir(tiempo_restante()) is None or tiempo_restante() == 0.0:
+                raise requests.Timeout(f"Plazo agotado antes de consultar {self.nombre}")
+            # requests no acepta timeouts de 0
+            timeout = (max(limitar_timeout(self.timeout[0]), 0.001), max(limitar_timeout(self.timeout[1]), 0.001))
+            try:
+                response = self.sesion.get(url, params=params, headers=headers, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                espera = self._espera(intento)
+                if ultimo or not self._alcanza(espera):
+                    raise
+                time.sleep(espera)
+                continue
+
+            if response.status_code in ESTADOS_REINTENTABLES and not ultimo:
+                espera = self._espera(intento, response)
+                if self._alcanza(espera):
+                    time.sleep(espera)
+                    continue
+            return response
+
+
+_clientes: Dict[str, ClienteHTTP] = {}
+_lock_clientes = threading.Lock()
+
+
+def obtener_cliente_http(nombre: str) -> ClienteHTTP:
+    """Retorna el cliente compartido del proveedor, creándolo con su tasa configurada en el primer uso."""
+    cliente = _clientes.get(nombre)
+    if cliente is None:
+        with _lock_clientes:
+            cliente = _clientes.get(nombre)
+            if cliente is None:
+                cliente = ClienteHTTP(nombre, tasa=TASAS_PROVEEDORES.get(nombre, 0.0))
+                _clientes[nombre] = cliente
+    return cliente
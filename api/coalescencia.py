@@ -0,0 +1,113 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+# Une las peticiones idénticas que llegan mientras la misma clave se está resolviendo
+# (GEO_COALESCER=0 lo desactiva)
+GEO_COALESCER = os.getenv("GEO_COALESCER", "1") == "1"
+
+
+class _Vuelo:
+    """Cálculo en curso de una clave: quienes esperan lo leen cuando termina."""
+
+    __slots__ = ("terminado", "resultado", "error")
+
+    def __init__(self):
+        self.terminado = threading.Event()
+        self.resultado = None
+        self.error = None
+
+
+class Coalescedor:
+    """
+    Ejecuta una sola vez las llamadas concurrentes con la misma clave: la primera calcula y
+    las que llegan mientras tanto esperan y reciben el mismo resultado (o la misma excepción).
+    No guarda nada una vez terminado el cálculo; para eso está el caché de resultados.
+
+    Una llamada que espera puede abandonar la espera pasado un tiempo, o rechazar el resultado
+    compartido; en ambos casos lo calcula ella misma.
+    """
+
+    def __init__(self, activo: bool = True):
+        self.activo = activo
+        self._en_curso: Dict[Hashable, _Vuelo] = {}
+        self._lock = threading.Lock()
+        self.ejecutadas = 0
+        self.compartidas = 0
+        self.abandonadas = 0
+        self.rechazadas = 0
+
+    def ejecutar(
+        self,
+        clave: Hashable,
+        funcion: Callable[[], Any],
+        espera: Optional[float] = None,
+        aceptar: Optional[Callable[[Any], bool]] = None,
+        copiar: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        """
+        Retorna ``funcion()``, o el resultado de la llamada con la misma clave que ya está en curso.
+
+        :param espera: Segundos que como máximo se espera a la llamada en curso (None = sin límite);
+            pasado ese tiempo se ejecuta ``funcion()`` aquí, sin compartir su resultado.
+        :param aceptar: Indica si el resultado de la llamada en curso sirve a quien esperaba; si no,
+            se vuelve a ejecutar (compartiendo esa nueva ejecución con las demás que lo rechacen).
+        :param copiar: Copia el resultado para cada llamada que lo recibe de otra; sin ella, todas
+            reciben el mismo objeto.
+        """
+        if not self.activo:
+            return funcion()
+
+        limite = None if espera is None else time.monotonic() + espera
+        while True:
+            with self._lock:
+                vuelo = self._en_curso.get(clave)
+                if vuelo is None:
+                    vuelo = self._en_curso[clave] = _Vuelo()
+                    self.ejecutadas += 1
+                    break
+
+            restante = None if limite is None else max(0.0, limite - time.monotonic())
+            if not vuelo.terminado.wait(restante):
+                with self._lock:
+                    self.abandonadas += 1
+                return funcion()
+            if vuelo.error is not None or aceptar is None or aceptar(vuelo.resultado):
+                with self._lock:
+                    self.compartidas += 1
+                if vuelo.error is not None:
+                    raise vuelo.error
+                return vuelo.resultado if copiar is None else copiar(vuelo.resultado)
+            with self._lock:
+                self.rechazadas += 1
+
+        try:
+            vuelo.resultado = funcion()
+            return vuelo.resultado
+        except BaseException as e:
+            vuelo.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._en_curso[clave]
+            vuelo.terminado.set()
+
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Llamadas ejecutadas, llamadas que se ahorraron esperando a otra, esperas abandonadas por
+        tiempo, resultados compartidos rechazados y claves en curso.
+        """
+        with self._lock:
+            return {
+                "activo": self.activo,
+                "en_curso": len(self._en_curso),
+                "ejecutadas": self.ejecutadas,
+                "compartidas": self.compartidas,
+                "abandonadas": self.abandonadas,
+                "rechazadas": self.rechazadas,
+            }
+
+
+# Coalescedor de la cascada de geolocalización, por clave de la petición (clave_geolocalizacion)
+coalescedor_geolocalizacion = Coalescedor(activo=GEO_COALESCER)
@@ -0,0 +1,41 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+
+# Hilos que ejecutan la cascada de geolocalización (DuckDB, SQLAlchemy, requests y GeoPandas
+# son síncronos). Conviene no superar el pool de Servel (DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW).
+GEO_MAX_TRABAJADORES = int(os.getenv("GEO_MAX_TRABAJADORES", "15"))
+
+_ejecutor: Optional[ThreadPoolExecutor] = None
+_lock_ejecutor = threading.Lock()
+
+
+def obtener_ejecutor() -> ThreadPoolExecutor:
+    """Retorna el pool de hilos compartido, creándolo en el primer uso."""
+    global _ejecutor
+    if _ejecutor is None:
+        with _lock_ejecutor:
+            if _ejecutor is None:
+                _ejecutor = ThreadPoolExecutor(max_workers=GEO_MAX_TRABAJADORES, thread_name_prefix="geo")
+    return _ejecutor
+
+
+def cerrar_ejecutor() -> None:
+    """Espera las tareas en curso y libera el pool de hilos."""
+    global _ejecutor
+    with _lock_ejecutor:
+        ejecutor, _ejecutor = _ejecutor, None
+    if ejecutor is not None:
+        ejecutor.shutdown(wait=True)
+
+
+async def ejecutar_en_pool(funcion: Callable[..., Any], *args, **kwargs) -> Any:
+    """
+    Ejecuta una función síncrona en el pool de hilos sin bloquear el event loop, de modo que
+    una consulta lenta a un proveedor no detenga al resto de las peticiones del worker.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(obtener_ejecutor(), functools.partial(funcion, *args, **kwargs))
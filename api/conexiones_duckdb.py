@@ -0,0 +1,99 @@
+import threading
+from typing import Dict, List
+
+import duckdb
+
+
+class GestorConexionesDuckDB:
+    """
+    Mantiene una única conexión de solo lectura por archivo DuckDB para todo el proceso
+    y entrega un cursor propio a cada hilo que lo solicita.
+
+    Abrir un archivo DuckDB implica leer su catálogo y calentar el buffer pool, por lo que
+    se hace una sola vez; los cursores (``conn.cursor()``) comparten esa base de datos y
+    son seguros para usarse de forma concurrente, uno por hilo.
+    """
+
+    def __init__(self):
+        self._conexiones: Dict[str, duckdb.DuckDBPyConnection] = {}
+        self._cursores: List[duckdb.DuckDBPyConnection] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._generacion = 0
+
+    def conexion(self, ruta: str) -> duckdb.DuckDBPyConnection:
+        """
+        Retorna la conexión compartida del archivo, abriéndola en modo solo lectura si aún no existe.
+
+        :param ruta: Ruta del archivo DuckDB.
+        :return: Conexión DuckDB de solo lectura.
+        """
+        conexion = self._conexiones.get(ruta)
+        if conexion is None:
+            with self._lock:
+                conexion = self._conexiones.get(ruta)
+                if conexion is None:
+                    conexion = duckdb.connect(ruta, read_only=True)
+                    self._conexiones[ruta] = conexion
+        return conexion
+
+    def cursor(self, ruta: str) -> duckdb.DuckDBPyConnection:
+        """
+        Retorna el cursor del hilo actual para el archivo indicado.
+
+        :param ruta: Ruta del archivo DuckDB.
+        :return: Cursor DuckDB reutilizable por el hilo que lo pidió.
+        """
+        cursores = getattr(self._local, "cursores", None)
+        if cursores is None or self._local.generacion != self._generacion:
+            cursores = {}
+            self._local.cursores = cursores
+            self._local.generacion = self._generacion
+
+        cursor = cursores.get(ruta)
+        if cursor is None:
+            cursor = self.conexion(ruta).cursor()
+            with self._lock:
+                self._cursores.append(cursor)
+            cursores[ruta] = cursor
+        return cursor
+
+    def abrir(self, *rutas: str) -> None:
+        """Abre por adelantado los archivos indicados; los que fallan se informan y se reintentan al primer uso."""
+        for ruta in rutas:
+            if not ruta:
+                continue
+            try:
+                self.conexion(ruta)
+            except Exception as e:
+                print(f"Error al abrir la base DuckDB '{ruta}': {e}")
+
+    def cerrar(self) -> None:
+        """Cierra todos los cursores y conexiones abiertas; los hilos obtendrán cursores nuevos al próximo uso."""
+        with self._lock:
+            for cursor in self._cursores:
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+            for conexion in self._conexiones.values():
+                try:
+                    conexion.close()
+                except Exception:
+                    pass
+            self._cursores = []
+            self._conexiones = {}
+            self._generacion += 1
+
+    def rutas_abiertas(self) -> List[str]:
+        """Lista los archivos DuckDB con conexión abierta."""
+        return list(self._conexiones.keys())
+
+
+# Gestor compartido por todo el proceso
+gestor_duckdb = GestorConexionesDuckDB()
+
+
+def obtener_cursor(ruta: str) -> duckdb.DuckDBPyConnection:
+    """Atajo para obtener el cursor del hilo actual desde el gestor compartido."""
+    return gestor_duckdb.cursor(ruta)
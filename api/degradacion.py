@@ -0,0 +1,34 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+# Etapas de la petición en curso que fallaron (error de conexión, de la base de datos, etc.) y
+# cuyo resultado se reemplazó por "sin resultado"
+_fallas: ContextVar[Optional[List[str]]] = ContextVar("fallas_peticion", default=None)
+
+
+@contextmanager
+def registrar_fallas(fallas: Optional[List[str]] = None):
+    """
+    Acumula en una lista las etapas que fallan dentro del bloque.
+
+    :param fallas: Lista a la que se agregan, por ejemplo la de una etapa previa de la misma petición.
+    """
+    fallas = [] if fallas is None else fallas
+    token = _fallas.set(fallas)
+    try:
+        yield fallas
+    finally:
+        _fallas.reset(token)
+
+
+def marcar_falla(etapa: str) -> None:
+    """Registra que la etapa falló; fuera de ``registrar_fallas`` no hace nada."""
+    fallas = _fallas.get()
+    if fallas is not None:
+        fallas.append(etapa)
+
+
+def fallas_peticion() -> List[str]:
+    """Etapas que fallaron hasta ahora en la petición en curso."""
+    return list(_fallas.get() or [])
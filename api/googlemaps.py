@@ -1,14 +1,23 @@
 import os
 import requests
 from typing import Dict, Any
+from api.cache_proveedores import obtener_cache_proveedores
+from api.cliente_http import obtener_cliente_http
+from api.degradacion import marcar_falla
+from api.metricas import CONSULTAS_PROVEEDORES, medir_etapa
 from api.payloads import InfoGeoDireccion
 
+# Estados de Google que son una respuesta definitiva y se pueden guardar en el caché
+ESTADOS_CACHEABLES = {"OK", "ZERO_RESULTS"}
+
 
 class GoogleMapsService:
     def __init__(self):
-        self.base_url = "https://maps.googleapis.com/maps/api/geocode/json"
+        self.base_url = os.getenv("GOOGLE_MAPS_URL", "https://maps.googleapis.com/maps/api/geocode/json")
         self.api_key = os.getenv("GOOGLE_API_KEY", "")
+        self.cliente = obtener_cliente_http("google_maps")
 
+    @medir_etapa("google_maps")
     def obtener_geolocalizacion(
         self, address: str, is_rural:bool
     ) -> Dict[str, Any]:
@@ -22,10 +31,17 @@ class GoogleMapsService:
         try:
             params = {"address": address + ", Chile", "key": self.api_key}
 
-            response = requests.get(self.base_url, params=params)
-            response.raise_for_status()  # Lanza una excepción si el estado HTTP indica error
+            # Respuesta guardada de una consulta anterior, para no volver a pagar el mismo geocode
+            cache = obtener_cache_proveedores()
+            encontrado, data = cache.buscar("google_maps", params["address"])
+
+            if not encontrado:
+                response = self.cliente.get(self.base_url, params=params)
+                response.raise_for_status()  # Lanza una excepción si el estado HTTP indica error
 
-            data = response.json()
+                data = response.json()
+                if data.get("status") in ESTADOS_CACHEABLES:
+                    cache.guardar("google_maps", params["address"], data)
 
             if data.get("status") == "OK":
                 # Filtrar resultados por location_type
@@ -37,6 +53,7 @@ class GoogleMapsService:
                 ]
 
                 if valid_results or is_rural:
+                    CONSULTAS_PROVEEDORES.incrementar(proveedor="google_maps", resultado="encontrado")
                     # Retornar el primer resultado válido filtrado
                     if valid_results:
                         result = valid_results[0]
@@ -49,9 +66,17 @@ class GoogleMapsService:
                             "error": "No se encontraron resultados con location_type válido (ROOFTOP o RANGE_INTERPOLATED)."
                         }
                     )
+                    CONSULTAS_PROVEEDORES.incrementar(proveedor="google_maps", resultado="sin_resultado")
                     return None
 
             else:
+                CONSULTAS_PROVEEDORES.incrementar(
+                    proveedor="google_maps",
+                    resultado="sin_resultado" if data.get("status") == "ZERO_RESULTS" else "error",
+                )
+                # OVER_QUERY_LIMIT, UNKNOWN_ERROR, etc.: otro intento puede encontrar la dirección
+                if data.get("status") != "ZERO_RESULTS":
+                    marcar_falla("google_maps")
                 print(
                     {
                         "error": f"No se pudo obtener la geolocalización: {data.get('status')}"
@@ -61,4 +86,6 @@ class GoogleMapsService:
 
         except requests.RequestException as e:
             print({"error": f"Error de conexión: {str(e)}"})
+            CONSULTAS_PROVEEDORES.incrementar(proveedor="google_maps", resultado="error")
+            marcar_falla("google_maps")
             return None
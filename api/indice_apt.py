@@ -0,0 +1,155 @@
+import os
+import sys
+import threading
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from api.conexiones_duckdb import obtener_cursor
+from api.registros import PuntoAPT
+from mapeador.config.PathConfig import obtener_ruta_apt_chile
+from mapeador.glosario import obtener_glosarios
+from mapeador.normalizacion import normalizar_referencia
+
+# Activa el índice en memoria de APT CHILE (APT_INDICE_MEMORIA=1); por defecto solo se usa DuckDB
+APT_INDICE_MEMORIA = os.getenv("APT_INDICE_MEMORIA", "0") == "1"
+
+
+class IndiceAPT:
+    """
+    Índice en memoria de los puntos de APT CHILE para los aciertos exactos por
+    (comuna, calle normalizada, número).
+
+    Todas las filas quedan en arreglos numpy contiguos ordenados por (comuna, calle, número);
+    un diccionario lleva cada (cut, calle) a su tramo de los arreglos y el número se busca
+    con ``searchsorted`` dentro del tramo. Cada calle se registra también sin su jerarquía
+    inicial ("CALLE FREIRE" -> "FREIRE"), salvo que ese alias sea ambiguo en la comuna.
+
+    Entrega un PuntoAPT reducido (nombre, número, coordenadas, comuna y rowid de la fila, para
+    leer la fila completa solo si la traza la necesita); las búsquedas que no aciertan siguen
+    por la consulta LIKE en DuckDB.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.numeros = np.empty(0, dtype=np.int64)
+        self.coordenadas_x = np.empty(0, dtype=np.float64)
+        self.coordenadas_y = np.empty(0, dtype=np.float64)
+        self.rowids = np.empty(0, dtype=np.int64)
+        self._tramos: Dict[Tuple[int, str], Tuple[int, int, str]] = {}
+
+    def cargar(self) -> "IndiceAPT":
+        """Lee apt_chile una sola vez y arma los tramos por (cut, calle normalizada)."""
+        cursor = obtener_cursor(self.ruta)
+        datos = cursor.execute(
+            """
+            SELECT COD_COMUNA_INE, NOMBRE_DIRECC_NORM, NOMBRE_DIRECC, NUMERO, COORDENADA_X, COORDENADA_Y,
+                rowid AS FILA
+            FROM apt_chile
+            WHERE COD_COMUNA_INE IS NOT NULL AND NUMERO IS NOT NULL AND NOMBRE_DIRECC_NORM IS NOT NULL
+            ORDER BY COD_COMUNA_INE, NOMBRE_DIRECC_NORM, NUMERO, rowid
+            """
+        ).fetchnumpy()
+
+        cuts = np.asarray(datos["COD_COMUNA_INE"], dtype=np.int64)
+        calles = datos["NOMBRE_DIRECC_NORM"]
+        nombres = datos["NOMBRE_DIRECC"]
+        self.numeros = np.asarray(datos["NUMERO"], dtype=np.int64)
+        self.coordenadas_x = np.asarray(datos["COORDENADA_X"], dtype=np.float64)
+        self.coordenadas_y = np.asarray(datos["COORDENADA_Y"], dtype=np.float64)
+        self.rowids = np.asarray(datos["FILA"], dtype=np.int64)
+
+        # Inicio de cada tramo: cambia la comuna o la calle
+        total = len(cuts)
+        if total:
+            cambios = np.flatnonzero((cuts[1:] != cuts[:-1]) | (calles[1:] != calles[:-1])) + 1
+            inicios = np.concatenate(([0], cambios))
+            fines = np.concatenate((cambios, [total]))
+        else:
+            inicios = fines = np.empty(0, dtype=np.int64)
+
+        jerarquias, _ = obtener_glosarios()
+        tramos: Dict[Tuple[int, str], Tuple[int, int, str]] = {}
+        alias: Dict[Tuple[int, str], Optional[Tuple[int, int, str]]] = {}
+        for inicio, fin in zip(inicios.tolist(), fines.tolist()):
+            cut = int(cuts[inicio])
+            calle = calles[inicio]
+            tramo = (inicio, fin, nombres[inicio])
+            tramos[(cut, calle)] = tramo
+
+            primera, _, resto = calle.partition(" ")
+            if resto and primera in jerarquias:
+                clave = (cut, resto)
+                # Dos calles con el mismo alias en la comuna: el alias no se usa
+                alias[clave] = tramo if clave not in alias else None
+
+        for clave, tramo in alias.items():
+            if tramo is not None and clave not in tramos:
+                tramos[clave] = tramo
+        self._tramos = tramos
+        return self
+
+    def buscar(self, cut: int, direccion: str, numero: str) -> Optional[PuntoAPT]:
+        """
+        Busca el punto exacto de la dirección.
+
+        :return: PuntoAPT reducido, o None si la calle o el número no están en el índice.
+        """
+        if not str(numero).isdigit():
+            return None
+        tramo = self._tramos.get((int(cut), normalizar_referencia(direccion)))
+        if tramo is None:
+            return None
+
+        inicio, fin, nombre = tramo
+        valor = int(numero)
+        posicion = inicio + int(np.searchsorted(self.numeros[inicio:fin], valor))
+        if posicion >= fin or self.numeros[posicion] != valor:
+            return None
+        return PuntoAPT(
+            nombre_direcc=nombre,
+            numero=valor,
+            coordenada_x=float(self.coordenadas_x[posicion]),
+            coordenada_y=float(self.coordenadas_y[posicion]),
+            cod_comuna_ine=int(cut),
+            rowid=int(self.rowids[posicion]),
+        )
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Tamaño del índice: filas, calles y memoria aproximada en bytes."""
+        memoria_arreglos = (
+            self.numeros.nbytes + self.coordenadas_x.nbytes + self.coordenadas_y.nbytes + self.rowids.nbytes
+        )
+        memoria_tramos = sys.getsizeof(self._tramos) + sum(
+            sys.getsizeof(clave) + sys.getsizeof(clave[1]) + sys.getsizeof(tramo) + sys.getsizeof(tramo[2])
+            for clave, tramo in self._tramos.items()
+        )
+        return {
+            "filas": len(self.numeros),
+            "calles": len(self._tramos),
+            "bytes_arreglos": memoria_arreglos,
+            "bytes_tramos": memoria_tramos,
+        }
+
+
+_indice: Optional[IndiceAPT] = None
+_lock_indice = threading.Lock()
+
+
+def obtener_indice_apt() -> IndiceAPT:
+    """Retorna el índice compartido de APT CHILE, construyéndolo en el primer uso."""
+    global _indice
+    if _indice is None:
+        with _lock_indice:
+            if _indice is None:
+                _indice = IndiceAPT(obtener_ruta_apt_chile()).cargar()
+    return _indice
+
+
+def recargar_indice_apt() -> IndiceAPT:
+    """Reconstruye el índice compartido, por ejemplo tras reconstruir apt_chile.duckdb."""
+    global _indice
+    nuevo = IndiceAPT(obtener_ruta_apt_chile()).cargar()
+    with _lock_indice:
+        _indice = nuevo
+    return nuevo
@@ -0,0 +1,241 @@
+import asyncio
+import codecs
+import json
+import os
+import tempfile
+from itertools import islice
+from typing import Any, AsyncIterator, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+
+from api.concurrencia import GEO_MAX_TRABAJADORES, obtener_ejecutor
+from api.manager import retorna_geolocalizacion, retorna_geolocalizaciones
+from api.payloads import RequestGetGeo
+from api.serializacion import a_json
+
+# Direcciones de un lote que se leen y geocodifican juntas (una ventana)
+GEO_LOTE_PARALELISMO = int(os.getenv("GEO_LOTE_PARALELISMO", str(GEO_MAX_TRABAJADORES)))
+
+# Tamaño del cuerpo que se mantiene en memoria antes de pasar a un archivo temporal
+GEO_LOTE_MEMORIA_MAXIMA = int(os.getenv("GEO_LOTE_MEMORIA_MAXIMA", str(1024 * 1024)))
+
+# Bytes del cuerpo que se leen por vez al decodificar una lista JSON
+GEO_LOTE_BLOQUE_LECTURA = 64 * 1024
+
+CAMPOS_REQUERIDOS = ["nombre_via", "comuna", "region"]
+
+ESPACIOS_JSON = " \t\r\n"
+CARACTERES_NUMERO = "0123456789.eE+-"
+
+
+async def recibir_cuerpo(request: Request):
+    """
+    Copia el cuerpo de la petición a un archivo temporal (en memoria mientras es pequeño),
+    para leerlo ítem a ítem mientras se envían los resultados. La escritura, que pasa a disco
+    sobre GEO_LOTE_MEMORIA_MAXIMA, se hace fuera del event loop.
+    """
+    archivo = tempfile.SpooledTemporaryFile(max_size=GEO_LOTE_MEMORIA_MAXIMA, mode="w+b")
+    async for fragmento in request.stream():
+        await run_in_threadpool(archivo.write, fragmento)
+    archivo.seek(0)
+    return archivo
+
+
+def leer_lista_json(archivo, bloque: int = GEO_LOTE_BLOQUE_LECTURA) -> Iterator[Any]:
+    """
+    Decodifica una lista JSON elemento a elemento, leyendo el archivo por bloques: en memoria
+    queda a lo más un bloque más el elemento en curso, sin importar el largo de la lista.
+
+    :raises ValueError: Si el cuerpo no es una lista JSON válida; los elementos anteriores al
+        error ya se entregaron.
+    """
+    decodificador = json.JSONDecoder()
+    texto = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    posicion = 0
+    agotado = False
+
+    def leer_bloque() -> bool:
+        # Descarta lo ya consumido y agrega el bloque siguiente; False al llegar al final
+        nonlocal buffer, posicion, agotado
+        if agotado:
+            return False
+        datos = archivo.read(bloque)
+        agotado = not datos
+        buffer = buffer[posicion:] + texto.decode(datos, final=agotado)
+        posicion = 0
+        return not agotado
+
+    def siguiente_caracter() -> str:
+        # Salta los espacios y retorna el primer carácter siguiente ("" al final del cuerpo)
+        nonlocal posicion
+        while True:
+            while posicion < len(buffer) and buffer[posicion] in ESPACIOS_JSON:
+                posicion += 1
+            if posicion < len(buffer) or not leer_bloque():
+                return buffer[posicion:posicion + 1]
+
+    if siguiente_caracter() != "[":
+        raise ValueError("El cuerpo debe ser una lista de direcciones o NDJSON")
+    posicion += 1
+    if siguiente_caracter() == "]":
+        return
+
+    while True:
+        siguiente_caracter()
+        while True:
+            try:
+                item, fin = decodificador.raw_decode(buffer, posicion)
+            except json.JSONDecodeError:
+                # El elemento puede estar cortado al final del bloque
+                if leer_bloque():
+                    continue
+                raise
+            # Un número cortado por el bloque ("12" de "12.5") continúa en el siguiente
+            if (
+                isinstance(item, (int, float))
+                and (fin == len(buffer) or buffer[fin] in CARACTERES_NUMERO)
+                and leer_bloque()
+            ):
+                continue
+            break
+        posicion = fin
+        yield item
+
+        separador = siguiente_caracter()
+        if separador == "]":
+            return
+        if separador != ",":
+            raise ValueError(f"Se esperaba ',' o ']' en la lista del lote y se encontró {separador!r}")
+        posicion += 1
+
+
+def leer_items(archivo, es_ndjson: bool) -> Iterator[Tuple[Any, Any]]:
+    """
+    Entrega los ítems del lote como pares (id, datos). Si el ítem trae un campo ``id`` se usa
+    ese; si no, su posición en el lote. Una línea inválida se entrega como excepción.
+
+    Tanto el NDJSON como la lista JSON se leen de a un ítem, a medida que el lote avanza.
+    """
+    if es_ndjson:
+        posicion = 0
+        for linea in archivo:
+            if not linea.strip():
+                continue
+            try:
+                item = json.loads(linea)
+            except ValueError as e:
+                yield posicion, e
+            else:
+                yield (item.pop("id", posicion) if isinstance(item, dict) else posicion), item
+            posicion += 1
+        return
+
+    for posicion, item in enumerate(leer_lista_json(archivo)):
+        yield (item.pop("id", posicion) if isinstance(item, dict) else posicion), item
+
+
+def leer_ventana(items: Iterator[Tuple[Any, Any]], cantidad: int) -> Tuple[List[Tuple[Any, Any]], Optional[ValueError]]:
+    """
+    Lee hasta ``cantidad`` ítems del lote. Si el cuerpo deja de ser válido, retorna los ítems
+    leídos hasta ahí junto con el error.
+    """
+    ventana = []
+    try:
+        ventana.extend(islice(items, cantidad))
+    except ValueError as e:
+        return ventana, e
+    return ventana, None
+
+
+def _validar_item(datos: Any) -> Tuple[Optional[RequestGetGeo], Optional[dict]]:
+    """Valida un ítem del lote: retorna (petición, None) o (None, salida con el error o la advertencia)."""
+    if isinstance(datos, Exception):
+        return None, {"error": f"Línea inválida: {datos}"}
+    try:
+        request = RequestGetGeo(**datos)
+    except (TypeError, ValidationError) as e:
+        return None, {"error": f"Dirección inválida: {e}"}
+
+    faltantes = [campo for campo in CAMPOS_REQUERIDOS if not getattr(request, campo)]
+    if faltantes:
+        return None, {"warnings": f"Faltan los siguientes campos requeridos: {', '.join(faltantes)}"}
+    return request, None
+
+
+def _geocodificar_request(request: RequestGetGeo) -> dict:
+    try:
+        return {"resultado": retorna_geolocalizacion(request)}
+    except Exception as e:
+        return {"error": f"Error al procesar la solicitud: {str(e)}"}
+
+
+def geocodificar_ventana(ventana: List[Tuple[Any, Any]]) -> bytes:
+    """
+    Valida y geocodifica una ventana del lote con ``retorna_geolocalizaciones`` (APT CHILE en
+    una sola consulta y el resto de la cascada repartido en el pool de hilos) y retorna sus
+    líneas NDJSON. Si la ventana completa falla, sus direcciones se geocodifican de a una para
+    que cada una informe su propio error.
+    """
+    salidas: List[Optional[dict]] = []
+    validas = []
+    for posicion, (_, datos) in enumerate(ventana):
+        request, salida = _validar_item(datos)
+        salidas.append(salida)
+        if request is not None:
+            validas.append((posicion, request))
+
+    if validas:
+        ejecutor = obtener_ejecutor()
+        try:
+            resultados = [
+                {"resultado": resultado}
+                for resultado in retorna_geolocalizaciones([request for _, request in validas], ejecutor)
+            ]
+        except Exception:
+            resultados = list(ejecutor.map(_geocodificar_request, [request for _, request in validas]))
+        for (posicion, _), salida in zip(validas, resultados):
+            salidas[posicion] = salida
+
+    return b"".join(_linea(id_item, salida) for (id_item, _), salida in zip(ventana, salidas))
+
+
+def _linea(id_item: Any, salida: dict) -> bytes:
+    return a_json({"id": id_item, **salida}) + b"\n"
+
+
+async def geocodificar_lote(
+    items: Iterator[Tuple[Any, Any]], paralelismo: int = GEO_LOTE_PARALELISMO, archivo: Optional[Any] = None
+) -> AsyncIterator[bytes]:
+    """
+    Geocodifica el lote por ventanas de ``paralelismo`` direcciones y entrega los resultados
+    como NDJSON en el orden de entrada. El cuerpo queda en un archivo temporal (en disco sobre
+    GEO_LOTE_MEMORIA_MAXIMA) y se decodifica de a una ventana, por lo que en memoria solo se
+    mantienen la ventana en curso y la siguiente, sin importar el tamaño del lote.
+
+    La lectura del cuerpo y la geocodificación corren en hilos, fuera del event loop; la
+    ventana siguiente se lee mientras se geocodifica la actual. Cada ventana pasa por
+    ``retorna_geolocalizaciones``, que consulta APT CHILE una sola vez para toda la ventana.
+    """
+    tarea = None
+    try:
+        ventana, error = await run_in_threadpool(leer_ventana, items, paralelismo)
+        while ventana:
+            # Fuera del pool de la cascada, que retorna_geolocalizaciones usa para repartir la ventana
+            tarea = asyncio.ensure_future(run_in_threadpool(geocodificar_ventana, ventana))
+            siguiente = []
+            if error is None:
+                siguiente, error = await run_in_threadpool(leer_ventana, items, paralelismo)
+            yield await tarea
+            tarea = None
+            ventana = siguiente
+        # Un cuerpo que deja de ser válido a mitad del lote se informa después de los ítems leídos
+        if error is not None:
+            yield _linea(None, {"error": f"Lote inválido: {error}"})
+    finally:
+        if tarea is not None:
+            tarea.cancel()
+        if archivo is not None:
+            archivo.close()
@@ -1,20 +1,36 @@
+import copy
 import re
+import time
+from concurrent.futures import Executor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
 from api.apt_chile import AptChile
+from api.cache import cache_geolocalizacion
+from api.coalescencia import coalescedor_geolocalizacion
+from api.degradacion import fallas_peticion, marcar_falla, registrar_fallas
 from api.geopanda_util import esta_en_comuna
+from api.metricas import (
+    DURACION_GEOLOCALIZACION,
+    PLAZOS_AGOTADOS,
+    medir_etapa,
+    registrar_tiempos,
+    tiempos_peticion,
+)
 from api.googlemaps import GoogleMapsService
 from api.nominatim import NominatimService
-from api.payloads import APTLocalidades, DatosCallejeros, RequestGetGeo, APTDireccion
+from api.payloads import RequestGetGeo
+from api.plazo import plazo, plazo_agotado, plazo_hasta, tiempo_restante, vencimiento_plazo
+from api.registros import DatosCalle, DireccionEnProceso
 from api.servel import (
     formatear_direccion,
     servel_direccion_persona,
     servel_localidades,
 )
 from mapeador.mapeador import (
-    InfoGeoDireccion,
     procesa_direccion_maestro_calle,
     procesar_direccion,
 )
-from fuzzywuzzy import fuzz
+from mapeador.puntaje import ratio_entero
 
 def convertir_a_float(valor, nombre_campo):
     try:
@@ -50,7 +66,8 @@ def procesar_numero(numero: str) -> str:
 
 
 
-def formatea_direcciones(direccion_original: InfoGeoDireccion):
+@medir_etapa("normalizacion")
+def formatea_direcciones(direccion_original: DireccionEnProceso):
     nombre_via_sin_procesar = direccion_original.nombre_via
 
     # Medir tiempo para formatear la dirección original
@@ -67,12 +84,12 @@ def formatea_direcciones(direccion_original: InfoGeoDireccion):
     # Asegurarse de que mejor_resultado no sea None, si lo es, asignar un valor predeterminado.
     if mejor_resultado is not None:
         mejor_resultado = (
-            direccion_procesada.copy()
+            direccion_procesada.copiar()
         )  # Copiar los datos de direccion_procesada, dado que no encontro datos en procesa_direccion_maestro_calle
         mejor_resultado.apt_score = 0  # Inicializar apt_score a 0 si no existe
 
-        # Comparar nombre_via con un umbral de similitud (usando fuzz.ratio)
-        comparativa = fuzz.ratio(nombre_via_sin_procesar, mejor_resultado.nombre_via)
+        # Comparar nombre_via con un umbral de similitud (la misma del maestro de calles)
+        comparativa = ratio_entero(nombre_via_sin_procesar, mejor_resultado.nombre_via)
 
         # Comparar nombre_via
         if (
@@ -130,15 +147,204 @@ def es_clasificacion_rural(nombre_via_original: str) -> bool:
 
 
 
-def retorna_geolocalizacion(request: RequestGetGeo):
+def clave_geolocalizacion(request: RequestGetGeo) -> tuple:
+    """
+    Clave de una petición: (nombre_via, numero, comuna, region, provincia, show), con el número
+    ya procesado. Dos peticiones con la misma clave producen el mismo resultado.
 
-    resumen = {}  # <-- El resumen
-    direccion_original = InfoGeoDireccion()
+    Los textos van tal como llegan: la cascada distingue mayúsculas y espacios (por ejemplo, al
+    comparar la vía del maestro de calles con la ingresada), así que normalizarlos aquí haría que
+    una variante recibiera el resultado calculado para otra.
+    """
+    return (
+        request.nombre_via,
+        procesar_numero(request.numero),
+        request.comuna,
+        request.region,
+        request.provincia,
+        request.show,
+    )
 
-    encontre_en_servel = False
-    encontre_en_apt = False
-    encontre_en_google = False
-    encontre_en_nominatim = False
+
+def copiar_resultado(resultado):
+    """Copia independiente de un resultado, para que quien lo recibe pueda modificarlo sin afectar a otros."""
+    return copy.deepcopy(resultado)
+
+
+def retorna_geolocalizacion(request: RequestGetGeo, ignorar_cache: bool = False):
+    """
+    Retorna la geolocalización de la dirección, reutilizando el resultado guardado en caché
+    si la misma petición (``clave_geolocalizacion``) ya se resolvió dentro del TTL.
+
+    La cascada se ejecuta sobre una copia de la petición, que no se modifica. Las peticiones con
+    la misma clave que llegan mientras la cascada está en curso esperan ese cálculo en vez de
+    repetirlo. Cada llamada recibe su propia copia del resultado, también cuando viene del caché
+    o de otra petición.
+
+    El plazo de la petición corre también mientras espera: si vence antes de que termine la
+    cascada en curso, entrega su propio mejor resultado (normalmente el centroide de la calle).
+    Un resultado cortado por plazo solo se comparte con peticiones cuyo plazo también venció;
+    las que aún tienen tiempo vuelven a ejecutar la cascada.
+
+    :param ignorar_cache: Ejecuta la cascada aunque la clave esté en caché o en curso (por
+        ejemplo, al perfilar la petición); el resultado nuevo se guarda igual, salvo que se haya
+        cortado por plazo o que alguna etapa haya fallado.
+    """
+    clave = clave_geolocalizacion(request)
+
+    def calcular():
+        resultado = calcula_geolocalizacion(request.model_copy())
+        if puede_guardarse(resultado):
+            cache_geolocalizacion.guardar(clave, copiar_resultado(resultado))
+        return resultado
+
+    with plazo(request.plazo_ms):
+        if ignorar_cache:
+            return calcular()
+        encontrado, resultado = cache_geolocalizacion.buscar(clave)
+        if encontrado:
+            return copiar_resultado(resultado)
+        return coalescedor_geolocalizacion.ejecutar(
+            clave,
+            calcular,
+            espera=tiempo_restante(),
+            aceptar=lambda compartido: not fue_cortado(compartido) or plazo_agotado(),
+            copiar=copiar_resultado,
+        )
+
+
+# Marca que indica que APT CHILE aún no se consultó para la dirección
+SIN_CONSULTAR = object()
+
+
+@dataclass(slots=True)
+class _PendienteLote:
+    """Estado de una dirección del lote entre la preparación y la etapa final de la cascada."""
+
+    posiciones: List[int]
+    clave: tuple
+    request: RequestGetGeo
+    vencimiento: Optional[float] = None
+    direccion: Optional[DireccionEnProceso] = None
+    tiempos: Dict[str, float] = field(default_factory=dict)
+    fallas: List[str] = field(default_factory=list)
+    apt: object = SIN_CONSULTAR
+    duracion: float = 0.0
+
+
+def retorna_geolocalizaciones(requests: List[RequestGetGeo], ejecutor: Optional[Executor] = None) -> list:
+    """
+    Geolocaliza un lote de direcciones con la misma cascada de ``retorna_geolocalizacion``, pero
+    APT CHILE se consulta una sola vez para todo el lote (``AptChile.buscar_direcciones_con_numero``)
+    en vez de una búsqueda por dirección. Cuando varias filas de APT CHILE cumplen el filtro, la
+    consulta en lote elige la de nombre más parecido y la búsqueda individual la primera que
+    encuentra, así que en esos casos el punto puede diferir.
+
+    Cada dirección tiene su propio plazo, tiempos y fallas, contados desde que empieza a
+    prepararse; las direcciones repetidas en el lote se calculan una sola vez. Si la consulta
+    en lote a APT CHILE falla, las direcciones siguen la cascada sin ese punto, como degradadas.
+
+    :param ejecutor: Si se entrega, la preparación y la etapa final (Servel, proveedores) se reparten en él.
+    :return: Resultados en el mismo orden de entrada.
+    """
+    resultados: list = [None] * len(requests)
+    por_clave: Dict[tuple, _PendienteLote] = {}
+    for posicion, request in enumerate(requests):
+        clave = clave_geolocalizacion(request)
+        if clave in por_clave:
+            por_clave[clave].posiciones.append(posicion)
+            continue
+        encontrado, resultado = cache_geolocalizacion.buscar(clave)
+        if encontrado:
+            resultados[posicion] = copiar_resultado(resultado)
+            continue
+        por_clave[clave] = _PendienteLote([posicion], clave, request.model_copy())
+    pendientes = list(por_clave.values())
+
+    def repartir(funcion):
+        list(ejecutor.map(funcion, pendientes) if ejecutor is not None else map(funcion, pendientes))
+
+    def preparar(pendiente: _PendienteLote):
+        inicio = time.perf_counter()
+        with plazo(pendiente.request.plazo_ms):
+            pendiente.vencimiento = vencimiento_plazo()
+            with registrar_tiempos(pendiente.tiempos), registrar_fallas(pendiente.fallas):
+                pendiente.direccion = preparar_direccion(pendiente.request)
+        pendiente.duracion += time.perf_counter() - inicio
+
+    repartir(preparar)
+
+    con_numero = [pendiente for pendiente in pendientes if pendiente.request.numero != ""]
+    try:
+        respuestas_apt = AptChile().buscar_direcciones_con_numero(
+            [
+                (int(direccion.datos_callejeros.cut or "0"), direccion.nombre_via, direccion.numero)
+                for direccion in (pendiente.direccion for pendiente in con_numero)
+            ]
+        )
+    except Exception as e:
+        print(f"Error al consultar APT CHILE en lote: {e}")
+        respuestas_apt = [None] * len(con_numero)
+        for pendiente in con_numero:
+            pendiente.fallas.append("apt_chile")
+    for pendiente, respuesta in zip(con_numero, respuestas_apt):
+        pendiente.apt = respuesta
+
+    def resolver(pendiente: _PendienteLote):
+        inicio = time.perf_counter()
+        with (
+            plazo_hasta(pendiente.vencimiento),
+            registrar_tiempos(pendiente.tiempos),
+            registrar_fallas(pendiente.fallas),
+        ):
+            resultado = resolver_geolocalizacion(pendiente.request, pendiente.direccion, pendiente.apt)
+        observar_duracion(resultado, pendiente.duracion + time.perf_counter() - inicio)
+        if puede_guardarse(resultado):
+            cache_geolocalizacion.guardar(pendiente.clave, copiar_resultado(resultado))
+        resultados[pendiente.posiciones[0]] = resultado
+        for posicion in pendiente.posiciones[1:]:
+            resultados[posicion] = copiar_resultado(resultado)
+
+    repartir(resolver)
+    return resultados
+
+
+def calcula_geolocalizacion(request: RequestGetGeo):
+    """Ejecuta la cascada completa de geolocalización, sin caché, dentro del plazo en curso (``api.plazo``)."""
+    inicio = time.perf_counter()
+    with registrar_tiempos(), registrar_fallas():
+        resultado = resolver_geolocalizacion(request, preparar_direccion(request))
+    observar_duracion(resultado, time.perf_counter() - inicio)
+    return resultado
+
+
+def fue_cortado(resultado) -> bool:
+    """Indica si la cascada del resultado se cortó por plazo."""
+    resumen = resultado.get("coords", resultado) if isinstance(resultado, dict) else {}
+    return bool(resumen.get("plazo_agotado"))
+
+
+def puede_guardarse(resultado) -> bool:
+    """
+    Indica si el resultado puede guardarse en caché: no, si la cascada se cortó por plazo o si
+    alguna etapa falló (``degradado``), porque otro intento puede encontrar un resultado mejor.
+    """
+    resumen = resultado.get("coords", resultado) if isinstance(resultado, dict) else {}
+    return not resumen.get("plazo_agotado") and not resumen.get("degradado")
+
+
+def observar_duracion(resultado: dict, duracion: float) -> None:
+    """Registra la duración de la cascada en el histograma del origen del resultado."""
+    resumen = resultado.get("coords", resultado) if isinstance(resultado, dict) else {}
+    DURACION_GEOLOCALIZACION.observar(duracion, origen=resumen.get("origen") or "sin_origen")
+
+
+def preparar_direccion(request: RequestGetGeo) -> DireccionEnProceso:
+    """
+    Primera etapa de la cascada: normaliza el número y formatea la dirección contra el
+    maestro de calles. La dirección resultante siempre trae datos callejeros.
+    """
+    direccion_original = DireccionEnProceso()
 
     nombre_via_original = request.nombre_via
 
@@ -151,7 +357,7 @@ def retorna_geolocalizacion(request: RequestGetGeo):
     direccion_original.nombre_via = request.nombre_via
     direccion_original.provincia = request.provincia
 
-    direccion_no_procesada = direccion_original.copy()
+    direccion_no_procesada = direccion_original.copiar()
 
     direccion_procesada = direccion_no_procesada
     direccion_procesada.apt_score = 0
@@ -159,7 +365,7 @@ def retorna_geolocalizacion(request: RequestGetGeo):
     
     direccion_procesada = formatea_direcciones(direccion_original)
         
-    exactitud_nombre_via = fuzz.ratio(
+    exactitud_nombre_via = ratio_entero(
         # Este es el caso cuando no hay forma de encontrar en el meastro de calles un formato adecuado
         direccion_procesada.nombre_via.upper(),
         nombre_via_original,
@@ -168,25 +374,81 @@ def retorna_geolocalizacion(request: RequestGetGeo):
     datos_callejeros = direccion_procesada.datos_callejeros
 
     if datos_callejeros is None:
-        datos_callejeros = DatosCallejeros()
+        datos_callejeros = DatosCalle()
         datos_callejeros.cut_r = ""
         datos_callejeros.cut = ""
 
     # Cuando nos va mal con el Callejero
     if exactitud_nombre_via < 50:
-        direccion_procesada = direccion_no_procesada.copy()
+        direccion_procesada = direccion_no_procesada.copiar()
 
     # Guardo datos callejeros
     direccion_procesada.datos_callejeros = datos_callejeros
+    return direccion_procesada
+
+
+def cortar_por_plazo(etapa: str) -> bool:
+    """Indica si el plazo de la petición se agotó; si es así, cuenta la etapa como omitida o cortada."""
+    if plazo_agotado():
+        PLAZOS_AGOTADOS.incrementar(etapa=etapa)
+        return True
+    return False
+
+
+def resumen_apt(direccion_procesada: DireccionEnProceso) -> dict:
+    """Resumen del punto encontrado en APT CHILE o en LOCALIDADES."""
+    if direccion_procesada.origen == "APT CHILE":
+        return {
+            "origen": direccion_procesada.origen,
+            "direccion": direccion_procesada.direccion_formateada,
+            "latitud": direccion_procesada.apt.coordenada_y,
+            "longitud": direccion_procesada.apt.coordenada_x,
+        }
+    return {
+        "origen": direccion_procesada.origen,
+        "direccion": direccion_procesada.direccion_formateada,
+        "latitud": direccion_procesada.apt_localidades.latitud,
+        "longitud": direccion_procesada.apt_localidades.longitud,
+    }
+
+
+def resolver_geolocalizacion(
+    request: RequestGetGeo, direccion_procesada: DireccionEnProceso, apt_chile_response=SIN_CONSULTAR
+):
+    """
+    Segunda etapa de la cascada: APT, Servel, proveedores externos y validación espacial.
+
+    Las etapas que no alcanzan a ejecutarse dentro del plazo de la petición (``api.plazo``) se
+    omiten: se entrega el mejor resultado obtenido hasta ese momento (el punto de APT aunque su
+    puntaje no sea 100, o el de Nominatim aunque no traiga el número) o, si no hay ninguno, el
+    centroide de la calle en el maestro de calles. El resumen lleva entonces ``plazo_agotado``.
+
+    Si alguna etapa falló (Servel, un proveedor, la validación de comuna) y se tomó como "sin
+    resultado", el resumen lleva ``degradado``.
+
+    :param apt_chile_response: Resultado de APT CHILE ya obtenido en lote (PuntoAPT o None);
+        si no se entrega, se consulta aquí.
+    """
+    resumen = {}  # <-- El resumen
+
+    encontre_en_servel = False
+    encontre_en_apt = False
+    encontre_en_google = False
+    encontre_en_nominatim = False
+    # Alguna etapa se omitió o se cortó por plazo
+    cortado = False
+
+    datos_callejeros = direccion_procesada.datos_callejeros
 
     apt_chile = AptChile()
 
     if request.numero != "":
-        apt_chile_response = apt_chile.buscar_direccion_con_numero(
-            int(direccion_procesada.datos_callejeros.cut or "0"),
-            direccion_procesada.nombre_via,
-            direccion_procesada.numero,
-        )
+        if apt_chile_response is SIN_CONSULTAR:
+            apt_chile_response = apt_chile.buscar_direccion_con_numero(
+                int(direccion_procesada.datos_callejeros.cut or "0"),
+                direccion_procesada.nombre_via,
+                direccion_procesada.numero,
+            )
         if apt_chile_response is not None:
             encontre_en_apt = True
             direccion_procesada.origen = "APT CHILE"
@@ -203,24 +465,16 @@ def retorna_geolocalizacion(request: RequestGetGeo):
 
     # Si tienen un puntaje igual a 100, son la respuesta correcta si no les falta calle
     if direccion_procesada.apt_score == 100 and encontre_en_apt:
-        if direccion_procesada.origen == "APT CHILE":
-            resumen = {
-                "origen": direccion_procesada.origen,
-                "direccion": direccion_procesada.direccion_formateada,
-                "latitud": direccion_procesada.apt.coordenada_y,
-                "longitud": direccion_procesada.apt.coordenada_x,
-            }
-        if direccion_procesada.origen == "APT LOCALIDADES":
-            resumen = {
-                "origen": direccion_procesada.origen,
-                "direccion": direccion_procesada.direccion_formateada,
-                "latitud": direccion_procesada.apt_localidades.latitud,
-                "longitud": direccion_procesada.apt_localidades.longitud,
-            }
+        resumen = resumen_apt(direccion_procesada)
     else:
 
         # continuamos la busqueda de la direccion
-        if request.numero != "":
+        if cortar_por_plazo("servel"):
+            cortado = True
+            # Sin plazo para Servel, el punto de APT (si lo hubo) es el mejor resultado
+            if encontre_en_apt:
+                resumen = resumen_apt(direccion_procesada)
+        elif request.numero != "":
             # nombre_via: str, numero: str, comuna: str, region: str, cut_comuna: str, cut_r: str
             direccion_persona = servel_direccion_persona(
                 nombre_via=direccion_procesada.nombre_via,
@@ -290,10 +544,16 @@ def retorna_geolocalizacion(request: RequestGetGeo):
 
         is_rural = (direccion_procesada.numero == "" or  es_clasificacion_rural(direccion_para_apis_externas))
 
-        nominatim_service = NominatimService()
-        nominatim_response = nominatim_service.obtener_geolocalizacion(
-            direccion_para_apis_externas
-        )
+        nominatim_response = None
+        if cortar_por_plazo("nominatim"):
+            cortado = True
+        else:
+            nominatim_service = NominatimService()
+            nominatim_response = nominatim_service.obtener_geolocalizacion(
+                direccion_para_apis_externas
+            )
+            if nominatim_response is None and cortar_por_plazo("nominatim"):
+                cortado = True
         if nominatim_response is not None:
             direccion_procesada.nominatim = nominatim_response
             
@@ -311,15 +571,21 @@ def retorna_geolocalizacion(request: RequestGetGeo):
                     encontre_en_nominatim = True
 
         if not encontre_en_nominatim:
-            google_maps_service = GoogleMapsService()
-            response_api_google_maps = google_maps_service.obtener_geolocalizacion(
-                direccion_para_apis_externas, is_rural
-            )
+            response_api_google_maps = None
+            if cortar_por_plazo("google_maps"):
+                cortado = True
+            else:
+                google_maps_service = GoogleMapsService()
+                response_api_google_maps = google_maps_service.obtener_geolocalizacion(
+                    direccion_para_apis_externas, is_rural
+                )
+                if response_api_google_maps is None and cortar_por_plazo("google_maps"):
+                    cortado = True
             if response_api_google_maps is not None:
                 direccion_procesada.google_maps = response_api_google_maps
                 direccion_google = response_api_google_maps["formatted_address"]
 
-                validando_google = fuzz.ratio(
+                validando_google = ratio_entero(
                     direccion_google.lower(), direccion_para_apis_externas.lower()
                 )
 
@@ -343,6 +609,16 @@ def retorna_geolocalizacion(request: RequestGetGeo):
                     }
                     encontre_en_google = True
 
+            # Sin plazo para Google Maps, la respuesta de Nominatim sin el número es el mejor resultado
+            if cortado and not encontre_en_google and nominatim_response is not None:
+                resumen = {
+                    "direccion": nominatim_response.get("display_name", ""),
+                    "latitud": nominatim_response.get("lat"),
+                    "longitud": nominatim_response.get("lon"),
+                    "origen": "Nominatim",
+                }
+                encontre_en_nominatim = True
+
         if not encontre_en_google and not encontre_en_nominatim:
             if datos_callejeros is not None:
                 lat = datos_callejeros.cen_lat
@@ -355,6 +631,9 @@ def retorna_geolocalizacion(request: RequestGetGeo):
                 "origen": "DIRECCION NO ENCONTRADA",
             }
 
+    if cortado:
+        resumen["plazo_agotado"] = True
+
     # inicia como si no tuviera lat y lon, dado que eso se calcula despues
     comuna = {"Error": "no existe lat y lon a calcular"}
     try:
@@ -371,8 +650,22 @@ def retorna_geolocalizacion(request: RequestGetGeo):
 
     except Exception as e:
         comuna = {"Error": e}
+        marcar_falla("validacion_comuna")
+
+    if fallas_peticion():
+        resumen["degradado"] = True
     if request.show == "coords":
         resumen["geopanda"] = comuna
         return resumen
 
-    return {"coords": resumen, "geopanda": comuna, "traza": direccion_procesada}
+    # Tiempos por etapa de esta petición (en ms), si se están registrando
+    tiempos = tiempos_peticion()
+    if tiempos is not None:
+        direccion_procesada.tiempos_ms = dict(tiempos)
+    if request.show == "resumen":
+        return {"coords": resumen, "geopanda": comuna, "traza": direccion_procesada.a_resumen()}
+    # La traza completa lleva la fila entera de APT CHILE, también cuando el punto vino del índice en memoria
+    if direccion_procesada.apt is not None:
+        apt_chile.completar_punto(direccion_procesada.apt)
+    # Los modelos pydantic de la traza se construyen solo aquí, en el borde de la API
+    return {"coords": resumen, "geopanda": comuna, "traza": direccion_procesada.a_modelo()}
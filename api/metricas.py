@@ -0,0 +1,275 @@
+import bisect
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from api.cache import cache_geolocalizacion, cache_negativo
+from api.cache_proveedores import obtener_cache_proveedores
+from api.coalescencia import coalescedor_geolocalizacion
+
+# Límites (en segundos) de los buckets de los histogramas de duración
+LIMITES_DURACION = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escapar(valor: str) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas_texto(nombres: Sequence[str], valores: Sequence[str], extra: str = "") -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class Contador:
+    """Contador monótono con etiquetas, seguro para usarse desde varios hilos."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._valores: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, cantidad: float = 1.0, **etiquetas: str) -> None:
+        clave = tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0.0) + cantidad
+
+    def valores(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._valores)
+
+    def exponer(self) -> List[str]:
+        return [
+            f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}"
+            for clave, valor in sorted(self.valores().items())
+        ]
+
+
+class Histograma:
+    """Histograma acumulativo con buckets fijos y etiquetas, seguro para usarse desde varios hilos."""
+
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), limites: Sequence[float] = LIMITES_DURACION):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.limites = tuple(sorted(limites))
+        # Por combinación de etiquetas: [conteo por bucket (el último es +Inf)..., suma]
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **etiquetas: str) -> None:
+        clave = tuple(str(etiquetas[nombre]) for nombre in self.etiquetas)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0.0] * (len(self.limites) + 2)
+            serie[bisect.bisect_left(self.limites, valor)] += 1
+            serie[-1] += valor
+
+    def sumas(self) -> Dict[Tuple[str, ...], float]:
+        """Suma de los valores observados por combinación de etiquetas."""
+        with self._lock:
+            return {clave: serie[-1] for clave, serie in self._series.items()}
+
+    def exponer(self) -> List[str]:
+        with self._lock:
+            series = {clave: list(serie) for clave, serie in self._series.items()}
+        lineas = []
+        for clave, serie in sorted(series.items()):
+            acumulado = 0.0
+            for limite, cantidad in zip(self.limites + (float("inf"),), serie[:-1]):
+                acumulado += cantidad
+                etiquetas = _etiquetas_texto(self.etiquetas, clave, f'le="{_numero(limite)}"')
+                lineas.append(f"{self.nombre}_bucket{etiquetas} {_numero(acumulado)}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas_texto(self.etiquetas, clave)} {_numero(serie[-1])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas_texto(self.etiquetas, clave)} {_numero(acumulado)}")
+        return lineas
+
+
+class MetricaCalculada:
+    """
+    Métrica cuyos valores se leen al momento de exponerlas, desde contadores que ya lleva
+    otro componente (por ejemplo, las estadísticas de los cachés).
+    """
+
+    def __init__(self, nombre: str, ayuda: str, tipo: str, etiquetas: Sequence[str],
+                 funcion: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.tipo = tipo
+        self.etiquetas = tuple(etiquetas)
+        self.funcion = funcion
+
+    def exponer(self) -> List[str]:
+        try:
+            valores = self.funcion()
+        except Exception as e:
+            print(f"Error al calcular la métrica '{self.nombre}': {e}")
+            return []
+        return [
+            f"{self.nombre}{_etiquetas_texto(self.etiquetas, clave)} {_numero(valor)}"
+            for clave, valor in sorted(valores.items())
+        ]
+
+
+class RegistroMetricas:
+    """Conjunto de métricas del proceso, expuestas en el formato de texto de Prometheus."""
+
+    def __init__(self):
+        self._metricas = []
+        self._lock = threading.Lock()
+
+    def registrar(self, metrica):
+        with self._lock:
+            self._metricas.append(metrica)
+        return metrica
+
+    def exponer(self) -> str:
+        with self._lock:
+            metricas = list(self._metricas)
+        lineas = []
+        for metrica in metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.exponer())
+        return "\n".join(lineas) + "\n"
+
+
+registro_metricas = RegistroMetricas()
+
+DURACION_ETAPAS = registro_metricas.registrar(Histograma(
+    "geo_etapa_duracion_segundos", "Duración de cada etapa de la cascada de geolocalización.", ["etapa"]
+))
+DURACION_GEOLOCALIZACION = registro_metricas.registrar(Histograma(
+    "geo_geolocalizacion_duracion_segundos",
+    "Duración de la cascada completa (sin aciertos del caché de resultados), por origen del resultado.",
+    ["origen"],
+))
+CONSULTAS_PROVEEDORES = registro_metricas.registrar(Contador(
+    "geo_proveedor_consultas_total",
+    "Consultas a los proveedores externos por resultado (encontrado, sin_resultado, error).",
+    ["proveedor", "resultado"],
+))
+
+PLAZOS_AGOTADOS = registro_metricas.registrar(Contador(
+    "geo_plazo_agotado_total",
+    "Etapas de la cascada que se omitieron o cortaron porque se agotó el plazo de la petición.",
+    ["etapa"],
+))
+
+
+def _consultas_caches() -> Dict[Tuple[str, ...], float]:
+    estadisticas = cache_geolocalizacion.estadisticas()
+    valores = {
+        ("resultados", "acierto"): estadisticas["aciertos"],
+        ("resultados", "fallo"): estadisticas["fallos"],
+    }
+    for proveedor, contadores in obtener_cache_proveedores().estadisticas().items():
+        valores[(proveedor, "acierto")] = contadores["aciertos"]
+        valores[(proveedor, "fallo")] = contadores["fallos"]
+    for fuente, contadores in cache_negativo.estadisticas().items():
+        valores[(f"negativo_{fuente}", "acierto")] = contadores["aciertos"]
+        valores[(f"negativo_{fuente}", "fallo")] = contadores["fallos"]
+    return valores
+
+
+def _entradas_caches() -> Dict[Tuple[str, ...], float]:
+    valores = {("resultados",): cache_geolocalizacion.estadisticas()["entradas"]}
+    for proveedor, contadores in obtener_cache_proveedores().estadisticas().items():
+        valores[(proveedor,)] = contadores.get("entradas", 0)
+    for fuente, contadores in cache_negativo.estadisticas().items():
+        valores[(f"negativo_{fuente}",)] = contadores["entradas"]
+    return valores
+
+
+registro_metricas.registrar(MetricaCalculada(
+    "geo_cache_consultas_total",
+    "Búsquedas en el caché de resultados, en el caché persistente de cada proveedor y en el caché negativo de cada fuente.",
+    "counter",
+    ["cache", "resultado"],
+    _consultas_caches,
+))
+registro_metricas.registrar(MetricaCalculada(
+    "geo_cache_entradas", "Entradas guardadas en cada caché.", "gauge", ["cache"], _entradas_caches
+))
+
+
+def _coalescencia() -> Dict[Tuple[str, ...], float]:
+    estadisticas = coalescedor_geolocalizacion.estadisticas()
+    return {
+        ("ejecutada",): estadisticas["ejecutadas"],
+        ("compartida",): estadisticas["compartidas"],
+        ("abandonada",): estadisticas["abandonadas"],
+        ("rechazada",): estadisticas["rechazadas"],
+    }
+
+
+registro_metricas.registrar(MetricaCalculada(
+    "geo_coalescencia_total",
+    "Cascadas ejecutadas, peticiones que esperaron una cascada idéntica en curso (llamadas ahorradas) "
+    "y esperas abandonadas por plazo o con el resultado rechazado.",
+    "counter",
+    ["resultado"],
+    _coalescencia,
+))
+
+
+# Tiempos por etapa de la petición en curso (en ms), para incluirlos en la traza
+_tiempos_peticion: ContextVar[Optional[Dict[str, float]]] = ContextVar("tiempos_peticion", default=None)
+
+
+@contextmanager
+def registrar_tiempos(tiempos: Optional[Dict[str, float]] = None):
+    """
+    Acumula en un diccionario los tiempos (ms) de las etapas medidas dentro del bloque.
+
+    :param tiempos: Diccionario al que se suman, por ejemplo el de una etapa previa de la misma petición.
+    """
+    tiempos = {} if tiempos is None else tiempos
+    token = _tiempos_peticion.set(tiempos)
+    try:
+        yield tiempos
+    finally:
+        _tiempos_peticion.reset(token)
+
+
+def tiempos_peticion() -> Optional[Dict[str, float]]:
+    """Tiempos por etapa acumulados hasta ahora en la petición en curso, o None fuera de ``registrar_tiempos``."""
+    return _tiempos_peticion.get()
+
+
+def medir_etapa(etapa: str):
+    """Decorador que registra la duración de cada llamada en el histograma de la etapa."""
+
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                duracion = time.perf_counter() - inicio
+                DURACION_ETAPAS.observar(duracion, etapa=etapa)
+                tiempos = _tiempos_peticion.get()
+                if tiempos is not None:
+                    tiempos[etapa] = round(tiempos.get(etapa, 0.0) + duracion * 1000, 3)
+
+        return medida
+
+    return decorador
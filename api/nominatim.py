@@ -1,11 +1,18 @@
+import os
 import requests
 from typing import Dict, Any
+from api.cache_proveedores import obtener_cache_proveedores
+from api.cliente_http import obtener_cliente_http
+from api.degradacion import marcar_falla
+from api.metricas import CONSULTAS_PROVEEDORES, medir_etapa
 
 class NominatimService:
     def __init__(self):
-        self.base_url = "https://nominatim.openstreetmap.org/search"
+        self.base_url = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
         self.headers = {"User-Agent": "MiApp/1.0 (contacto@miapp.com)"}
+        self.cliente = obtener_cliente_http("nominatim")
 
+    @medir_etapa("nominatim")
     def obtener_geolocalizacion(self, address: str) -> Dict[str, Any]:
         """
         Consulta la API de Nominatim para obtener las coordenadas geográficas de una dirección.
@@ -20,22 +27,34 @@ class NominatimService:
                 "limit": 1
             }
 
-            response = requests.get(self.base_url, params=params, headers=self.headers)
-            response.raise_for_status()  # Lanza una excepción si el estado HTTP indica error
+            # Respuesta guardada de una consulta anterior (incluye las que no tuvieron resultados)
+            cache = obtener_cache_proveedores()
+            encontrado, data = cache.buscar("nominatim", params["q"])
 
-            data = response.json()
+            if not encontrado:
+                response = self.cliente.get(self.base_url, params=params, headers=self.headers)
+                response.raise_for_status()  # Lanza una excepción si el estado HTTP indica error
+
+                data = response.json()
+                cache.guardar("nominatim", params["q"], data)
 
             if not data:
                 #{"error": "No se encontraron resultados para la dirección proporcionada."}
+                CONSULTAS_PROVEEDORES.incrementar(proveedor="nominatim", resultado="sin_resultado")
                 return None
 
             result = data[0]
+            CONSULTAS_PROVEEDORES.incrementar(proveedor="nominatim", resultado="encontrado")
             # Retornar el primer resultado encontrado
             return result
 
         except requests.RequestException as e:            
             print (f"Error de conexión: {str(e)}")
+            CONSULTAS_PROVEEDORES.incrementar(proveedor="nominatim", resultado="error")
+            marcar_falla("nominatim")
             return None
         except ValueError as e:
             print (f"Error de conexión: {str(e)}")
+            CONSULTAS_PROVEEDORES.incrementar(proveedor="nominatim", resultado="error")
+            marcar_falla("nominatim")
             return None
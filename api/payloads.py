@@ -153,6 +153,7 @@ class InfoGeoDireccion(BaseModel):
     servel_localidades : Optional[ServelLocalidades] =None
     google_maps : Optional[Dict[str, Any]] = None
     nominatim : Optional[Dict[str, Any]] = None
+    tiempos_ms : Optional[Dict[str, float]] = None
     
 class InfoData(BaseModel):
     esquema: str = ""
@@ -171,3 +172,5 @@ class RequestGetGeo(BaseModel):
     provincia: str = ""  
     info: InfoData = InfoData()
     show:str="coords"
+    # Plazo de la cascada en ms; None usa GEO_PLAZO_MS y 0 la deja sin plazo
+    plazo_ms: Optional[float] = None
@@ -0,0 +1,56 @@
+import cProfile
+import io
+import os
+import pstats
+import time
+import uuid
+from typing import Any, Callable, Dict, Tuple
+
+# Permite perfilar peticiones individuales (GEO_PERFILADOR=1); desactivado no tiene costo
+GEO_PERFILADOR = os.getenv("GEO_PERFILADOR", "0") == "1"
+
+# Directorio donde se escriben los perfiles (.prof, legibles con pstats, snakeviz o flameprof)
+GEO_PERFILADOR_DIRECTORIO = os.getenv("GEO_PERFILADOR_DIRECTORIO", "./perfiles")
+
+# Funciones que se incluyen en el resumen, ordenadas por tiempo acumulado
+GEO_PERFILADOR_LINEAS = int(os.getenv("GEO_PERFILADOR_LINEAS", "30"))
+
+VALORES_ACTIVOS = {"1", "true", "si", "sí"}
+
+
+def solicita_perfil(encabezados, parametros) -> bool:
+    """Indica si la petición pide perfilarse con el encabezado ``X-Perfilar`` o el parámetro ``perfilar``."""
+    valor = encabezados.get("x-perfilar") or parametros.get("perfilar") or ""
+    return valor.strip().lower() in VALORES_ACTIVOS
+
+
+def perfilar(funcion: Callable[..., Any], *args, **kwargs) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Ejecuta la función bajo cProfile en el hilo actual, guarda el perfil en
+    GEO_PERFILADOR_DIRECTORIO y retorna el resultado junto con un resumen.
+
+    :return: Tupla (resultado, perfil) con la ruta del archivo .prof, la duración y las
+        funciones con mayor tiempo acumulado.
+    """
+    perfil = cProfile.Profile()
+    inicio = time.perf_counter()
+    perfil.enable()
+    try:
+        resultado = funcion(*args, **kwargs)
+    finally:
+        perfil.disable()
+    duracion = time.perf_counter() - inicio
+
+    os.makedirs(GEO_PERFILADOR_DIRECTORIO, exist_ok=True)
+    archivo = os.path.join(
+        GEO_PERFILADOR_DIRECTORIO, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.prof"
+    )
+    perfil.dump_stats(archivo)
+
+    salida = io.StringIO()
+    pstats.Stats(perfil, stream=salida).strip_dirs().sort_stats("cumulative").print_stats(GEO_PERFILADOR_LINEAS)
+    return resultado, {
+        "archivo": os.path.abspath(archivo),
+        "duracion_ms": round(duracion * 1000, 3),
+        "resumen": salida.getvalue(),
+    }
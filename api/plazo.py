@@ -0,0 +1,62 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Plazo por defecto de la cascada de una petición, en ms (0 = sin plazo, el comportamiento de
+# siempre); cada petición puede fijar el suyo con plazo_ms
+GEO_PLAZO_MS = float(os.getenv("GEO_PLAZO_MS", "0"))
+
+# Instante (time.monotonic) en que vence el plazo de la petición en curso
+_vencimiento: ContextVar[Optional[float]] = ContextVar("vencimiento_plazo", default=None)
+
+
+@contextmanager
+def plazo(milisegundos: Optional[float] = None):
+    """
+    Fija el plazo de las etapas que se ejecutan dentro del bloque, contado desde ahora.
+
+    :param milisegundos: Plazo en ms; None usa GEO_PLAZO_MS y un valor <= 0 deja el bloque sin plazo.
+    """
+    if milisegundos is None:
+        milisegundos = GEO_PLAZO_MS
+    with plazo_hasta(time.monotonic() + milisegundos / 1000 if milisegundos > 0 else None):
+        yield
+
+
+@contextmanager
+def plazo_hasta(vencimiento: Optional[float]):
+    """
+    Fija como plazo del bloque un vencimiento ya calculado (``vencimiento_plazo``), para
+    continuar en otro momento o en otro hilo el plazo de una misma petición.
+    """
+    token = _vencimiento.set(vencimiento)
+    try:
+        yield
+    finally:
+        _vencimiento.reset(token)
+
+
+def vencimiento_plazo() -> Optional[float]:
+    """Instante (time.monotonic) en que vence el plazo en curso, o None si no hay plazo."""
+    return _vencimiento.get()
+
+
+def tiempo_restante() -> Optional[float]:
+    """Segundos que quedan del plazo en curso (0 si ya venció), o None si no hay plazo."""
+    vencimiento = _vencimiento.get()
+    if vencimiento is None:
+        return None
+    return max(0.0, vencimiento - time.monotonic())
+
+
+def plazo_agotado() -> bool:
+    """Indica si el plazo de la petición en curso ya venció."""
+    return tiempo_restante() == 0.0
+
+
+def limitar_timeout(timeout: float) -> float:
+    """Recorta un timeout (en segundos) a lo que queda del plazo en curso."""
+    restante = tiempo_restante()
+    return timeout if restante is None else min(timeout, restante)
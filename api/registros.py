@@ -0,0 +1,228 @@
+"""
+Registros internos de la cascada de geolocalización.
+
+Durante la cascada la dirección y los puntos encontrados viajan como dataclasses con
+``__slots__`` (o como la fila cruda de la consulta), sin validación ni copias de pydantic.
+Los modelos de ``api.payloads`` se construyen solo en el borde, al armar la traza completa de
+la respuesta (``show`` distinto de "coords" y de "resumen").
+"""
+from dataclasses import dataclass, replace
+from typing import Any, Dict, Optional
+
+from api.payloads import (
+    APTDireccion,
+    APTLocalidades,
+    DatosCallejeros,
+    InfoGeoDireccion,
+    ServelDireccionPersona,
+    ServelLocalidades,
+)
+
+
+def fila_a_apt_direccion(resultado) -> APTDireccion:
+    """Mapea una fila con las columnas de COLUMNAS_APT_CHILE a APTDireccion."""
+    return APTDireccion(
+        cod_direccion=resultado[0],
+        nombre_direcc=resultado[1],
+        numero=str(resultado[2]),  # Convierte a str
+        coordenada_x=str(resultado[3]),  # Convierte a str
+        coordenada_y=str(resultado[4]),  # Convierte a str
+        fecha_ingreso=resultado[5],
+        fecha_actualizacion=resultado[6],
+        fecha_georeferencia=resultado[7],
+        fecha_novigencia=resultado[8],
+        cod_vigencia=resultado[9],
+        flag_normalizado=resultado[10],
+        cod_comuna_ine=resultado[11],
+        cod_com_txt=resultado[12],
+        cod_calle=resultado[13],
+        letnum=resultado[14],
+        sitio=resultado[15],
+        depto=resultado[16],
+        casa=resultado[17],
+        block=resultado[18],
+        cod_calle_old=resultado[19],
+        cod_via=resultado[20],
+        fuente=resultado[21],
+        cod_localidad=resultado[22],
+        cod_entidad=resultado[23],
+        cod_cpoblado=resultado[24],
+        referencia=resultado[25],
+        cod_uvecinal=resultado[26],
+        cod_ah=resultado[27],
+        localidad_rsh=resultado[28]
+    )
+
+
+def fila_a_apt_localidades(resultado) -> APTLocalidades:
+    """Mapea una fila de la consulta de ``AptChile.buscar_direccion_sin_numero`` a APTLocalidades."""
+    return APTLocalidades(
+        id_localid=int(resultado[0]) if resultado[0] is not None else None,
+        cod_comuna=str(resultado[1]) if resultado[1] is not None else "",
+        comuna=str(resultado[2]) if resultado[2] is not None else "",
+        cod_r=str(resultado[3]) if resultado[3] is not None else "",
+        region=str(resultado[4]) if resultado[4] is not None else "",
+        nombre_localidad=str(resultado[5]) if resultado[5] is not None else "",
+        longitud=float(resultado[6]) if resultado[6] is not None else None,
+        latitud=float(resultado[7]) if resultado[7] is not None else None,
+        tipo=str(resultado[8]) if resultado[8] is not None else "",
+        estado=str(resultado[9]) if resultado[9] is not None else "",
+        circuns=str(resultado[10]) if resultado[10] is not None else "",
+        codigo_cir=str(resultado[11]) if resultado[11] is not None else "",
+        glosacircu=str(resultado[12]) if resultado[12] is not None else "",
+        principal=str(resultado[13]) if resultado[13] is not None else "",
+        revisado=str(resultado[14]) if resultado[14] is not None else "",
+        created_user=str(resultado[15]) if resultado[15] is not None else None,
+        created_date=str(resultado[16]) if resultado[16] is not None else None,
+        last_edited_user=str(resultado[17]) if resultado[17] is not None else None,
+        last_edited_date=str(resultado[18]) if resultado[18] is not None else None,
+        globalid=str(resultado[19]) if resultado[19] is not None else "",
+    )
+
+
+@dataclass(slots=True)
+class PuntoAPT:
+    """
+    Punto de APT CHILE encontrado. ``fila`` guarda la fila completa (columnas de
+    COLUMNAS_APT_CHILE) cuando viene de DuckDB; el índice en memoria entrega solo los campos
+    básicos y el ``rowid``, con el que ``AptChile.completar_punto`` lee la fila para la traza.
+    """
+
+    nombre_direcc: str
+    numero: Any
+    coordenada_x: Any
+    coordenada_y: Any
+    cod_comuna_ine: Optional[int]
+    fila: Optional[tuple] = None
+    rowid: Optional[int] = None
+
+    @classmethod
+    def desde_fila(cls, fila: tuple) -> "PuntoAPT":
+        return cls(fila[1], fila[2], fila[3], fila[4], fila[11], fila)
+
+    def a_modelo(self) -> APTDireccion:
+        if self.fila is not None:
+            return fila_a_apt_direccion(self.fila)
+        return APTDireccion(
+            nombre_direcc=self.nombre_direcc,
+            numero=str(self.numero),
+            coordenada_x=str(self.coordenada_x),
+            coordenada_y=str(self.coordenada_y),
+            cod_comuna_ine=self.cod_comuna_ine,
+        )
+
+
+@dataclass(slots=True)
+class LocalidadAPT:
+    """Localidad encontrada en LOCALIDADES, con la fila cruda de la consulta."""
+
+    latitud: Optional[float]
+    longitud: Optional[float]
+    fila: tuple
+
+    @classmethod
+    def desde_fila(cls, fila: tuple) -> "LocalidadAPT":
+        return cls(
+            float(fila[7]) if fila[7] is not None else None,
+            float(fila[6]) if fila[6] is not None else None,
+            fila,
+        )
+
+    def a_modelo(self) -> APTLocalidades:
+        return fila_a_apt_localidades(self.fila)
+
+
+@dataclass(slots=True)
+class DatosCalle:
+    """Datos de la calle elegida en el maestro de calles (equivale a DatosCallejeros)."""
+
+    jerarquia: Optional[str] = ""
+    cut: Optional[str] = ""
+    cut_r: Optional[str] = ""
+    cen_lat: Any = ""
+    cen_lon: Any = ""
+
+    def a_modelo(self) -> DatosCallejeros:
+        # Sin validar, igual que cuando los campos se asignaban sobre el modelo
+        return DatosCallejeros.model_construct(
+            jerarquia=self.jerarquia, cut=self.cut, cut_r=self.cut_r, cen_lat=self.cen_lat, cen_lon=self.cen_lon
+        )
+
+
+@dataclass(slots=True)
+class DireccionEnProceso:
+    """Dirección que recorre la cascada (equivale a InfoGeoDireccion)."""
+
+    origen: Optional[str] = ""
+    apt_score: Optional[int] = 0
+    nombre_via: Optional[str] = ""
+    numero: Optional[str] = ""
+    provincia: Optional[str] = ""
+    comuna: Optional[str] = ""
+    region: Optional[str] = ""
+    direccion_formateada: Optional[str] = ""
+    jerarquia: Optional[str] = ""
+    datos_callejeros: Optional[DatosCalle] = None
+    apt: Optional[PuntoAPT] = None
+    apt_localidades: Optional[LocalidadAPT] = None
+    # Filas de SQLAlchemy de las consultas de Servel
+    servel_direccion_persona: Any = None
+    servel_localidades: Any = None
+    google_maps: Optional[Dict[str, Any]] = None
+    nominatim: Optional[Dict[str, Any]] = None
+    tiempos_ms: Optional[Dict[str, float]] = None
+
+    def copiar(self) -> "DireccionEnProceso":
+        """Copia superficial, como ``BaseModel.copy()``: los registros anidados se comparten."""
+        return replace(self)
+
+    def a_modelo(self) -> InfoGeoDireccion:
+        """Construye el InfoGeoDireccion de la traza."""
+        return InfoGeoDireccion.model_construct(
+            origen=self.origen,
+            apt_score=self.apt_score,
+            nombre_via=self.nombre_via,
+            numero=self.numero,
+            provincia=self.provincia,
+            comuna=self.comuna,
+            region=self.region,
+            direccion_formateada=self.direccion_formateada,
+            jerarquia=self.jerarquia,
+            datos_callejeros=self.datos_callejeros.a_modelo() if self.datos_callejeros is not None else None,
+            apt=self.apt.a_modelo() if self.apt is not None else None,
+            apt_localidades=self.apt_localidades.a_modelo() if self.apt_localidades is not None else None,
+            servel_direccion_persona=(
+                ServelDireccionPersona(**self.servel_direccion_persona._asdict())
+                if self.servel_direccion_persona is not None
+                else None
+            ),
+            servel_localidades=(
+                ServelLocalidades(**self.servel_localidades._asdict())
+                if self.servel_localidades is not None
+                else None
+            ),
+            google_maps=self.google_maps,
+            nominatim=self.nominatim,
+            tiempos_ms=self.tiempos_ms,
+        )
+
+    def a_resumen(self) -> Dict[str, Any]:
+        """
+        Traza reducida (``show="resumen"``): solo los campos que leen los sistemas que consumen
+        la API, sin las filas de APT y Servel ni las respuestas de los proveedores.
+        """
+        datos_callejeros = self.datos_callejeros
+        return {
+            "origen": self.origen,
+            "apt_score": self.apt_score,
+            "nombre_via": self.nombre_via,
+            "numero": self.numero,
+            "provincia": self.provincia,
+            "comuna": self.comuna,
+            "region": self.region,
+            "direccion_formateada": self.direccion_formateada,
+            "jerarquia": self.jerarquia,
+            "cut": datos_callejeros.cut if datos_callejeros is not None else None,
+            "cut_r": datos_callejeros.cut_r if datos_callejeros is not None else None,
+            "tiempos_ms": self.tiempos_ms,
+        }
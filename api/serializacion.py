@@ -0,0 +1,38 @@
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.encoders import decimal_encoder, jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+
+OPCIONES_ORJSON = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _convertir(valor: Any) -> Any:
+    """Convierte lo que orjson no serializa por sí mismo (se llama solo para esos valores)."""
+    if isinstance(valor, BaseModel):
+        return valor.model_dump()
+    if isinstance(valor, Row):
+        return valor._asdict()
+    if isinstance(valor, Decimal):
+        return decimal_encoder(valor)
+    if isinstance(valor, Exception):
+        return str(valor)
+    return jsonable_encoder(valor)
+
+
+def a_json(contenido: Any) -> bytes:
+    """Serializa el contenido a JSON (UTF-8) con orjson, incluidos los modelos pydantic de la traza."""
+    return orjson.dumps(contenido, default=_convertir, option=OPCIONES_ORJSON)
+
+
+class RespuestaJSON(JSONResponse):
+    """
+    Respuesta JSON serializada con orjson. Retornarla directamente desde el endpoint evita
+    el paso por ``jsonable_encoder`` de FastAPI, que recorre toda la traza en Python.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return a_json(content)
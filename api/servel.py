@@ -1,15 +1,21 @@
 import os
-from typing import Optional
+import re
+from typing import Dict, List, Optional
 
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import create_engine, NullPool
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.sql import text
 from contextlib import contextmanager
-from datetime import datetime
-import time
 
-from api.payloads import ServelDireccionPersona, ServelLocalidades
+from functools import lru_cache
+
+from api.cache import cache_negativo
+from api.degradacion import marcar_falla
+from api.metricas import medir_etapa
+from api.plazo import tiempo_restante
+from mapeador.puntaje import ratio_entero
 
 DB_CONFIG_SERVEL = {
     "dbname": os.getenv("DB_NAME_SERVEL", "prototipo_servel"),
@@ -20,13 +26,105 @@ DB_CONFIG_SERVEL = {
 }
 
 
-# Crear el motor de conexión
-DATABASE_SERVEL_URL = f"postgresql://{DB_CONFIG_SERVEL['user']}:{DB_CONFIG_SERVEL['password']}@{DB_CONFIG_SERVEL['host']}:{DB_CONFIG_SERVEL['port']}/{DB_CONFIG_SERVEL['dbname']}"
-engine = create_engine(DATABASE_SERVEL_URL, poolclass=NullPool)
+# Configuración del pool de conexiones compartido por todo el proceso
+DB_POOL_SERVEL = {
+    "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+    "max_overflow": int(os.getenv("DB_POOL_MAX_OVERFLOW", "10")),
+    "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+    "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "30")),
+}
+
+# Usar sentencias preparadas en el servidor para las consultas pesadas
+DB_SENTENCIAS_PREPARADAS = os.getenv("DB_SENTENCIAS_PREPARADAS", "1") == "1"
+
+# Modo de la consulta de direccion_persona:
+#   "original": joins con OR SIMILARITY sobre regiones y comunas
+#   "indexado": CUT resuelto en Python, filtro por (cut_comuna, numero) y operador % de pg_trgm
+#               (requiere los índices de database/scripts/servel_indices.sql)
+SERVEL_MODO_CONSULTA = os.getenv("SERVEL_MODO_CONSULTA", "original")
+
+# Similitud mínima para resolver una comuna por nombre (equivale al SIMILARITY > 0.9 original)
+SIMILITUD_COMUNA_SERVEL = 90
+
+
+# Crear el motor de conexión (DB_URL_SERVEL reemplaza la URL completa, por ejemplo en los benchmarks)
+DATABASE_SERVEL_URL = os.getenv("DB_URL_SERVEL") or f"postgresql://{DB_CONFIG_SERVEL['user']}:{DB_CONFIG_SERVEL['password']}@{DB_CONFIG_SERVEL['host']}:{DB_CONFIG_SERVEL['port']}/{DB_CONFIG_SERVEL['dbname']}"
+engine = create_engine(DATABASE_SERVEL_URL, **DB_POOL_SERVEL)
 
 # Crear una sesión de base de datos
 SessionServel = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-from contextlib import contextmanager
+
+
+class SentenciaPreparada:
+    """
+    Consulta SQL con parámetros ``:nombre`` que se prepara una vez por conexión en el servidor
+    (``PREPARE``) y luego se ejecuta con ``EXECUTE``, para que Postgres no la vuelva a planificar.
+    """
+
+    def __init__(self, nombre: str, sql: str, parametros: List[str]):
+        self.nombre = nombre
+        self.sql = sql.strip().rstrip(";")
+        self.parametros = parametros
+        posiciones = {parametro: f"${i}" for i, parametro in enumerate(parametros, start=1)}
+        self.prepare = f"PREPARE {nombre} AS " + re.sub(
+            r"(?<!:):(\w+)", lambda m: posiciones[m.group(1)], self.sql
+        )
+        self.consulta = text(self.sql)
+        self.execute = text(f"EXECUTE {nombre}(" + ", ".join(f":{p}" for p in parametros) + ")")
+
+    def ejecutar(self, session, valores: Dict):
+        """
+        Ejecuta la consulta, preparada si la conexión la tiene disponible o como texto en caso contrario.
+        Dentro de un plazo (``api.plazo``), Postgres la cancela cuando se agota.
+        """
+        limitar_a_plazo(session)
+        if DB_SENTENCIAS_PREPARADAS and self.nombre in session.connection().connection.info.get("sentencias_preparadas", ()):
+            return session.execute(self.execute, valores)
+        return session.execute(self.consulta, valores)
+
+    def explicar(self, session, valores: Dict, analizar: bool = False) -> str:
+        """Retorna el plan de ejecución (``EXPLAIN``) de la consulta con los valores indicados."""
+        opciones = "(ANALYZE, BUFFERS)" if analizar else ""
+        filas = session.execute(text(f"EXPLAIN {opciones} {self.sql}"), valores).fetchall()
+        return "\n".join(fila[0] for fila in filas)
+
+
+SENTENCIAS_PREPARADAS: Dict[str, SentenciaPreparada] = {}
+
+
+def limitar_a_plazo(session) -> None:
+    """Fija el statement_timeout de la transacción en lo que queda del plazo en curso (solo Postgres)."""
+    restante = tiempo_restante()
+    if restante is None or engine.dialect.name != "postgresql":
+        return
+    # SET no admite parámetros; el valor es un entero calculado aquí
+    session.execute(text(f"SET LOCAL statement_timeout = {max(1, int(restante * 1000))}"))
+
+
+@event.listens_for(engine, "connect")
+def preparar_sentencias(dbapi_connection, connection_record):
+    """
+    Prepara las consultas pesadas en cada conexión nueva del pool. Una sentencia que no se
+    puede preparar (por ejemplo, si falta pg_trgm) se sigue ejecutando como texto.
+    """
+    if not DB_SENTENCIAS_PREPARADAS:
+        return
+    preparadas = set()
+    cursor = dbapi_connection.cursor()
+    try:
+        for sentencia in SENTENCIAS_PREPARADAS.values():
+            try:
+                cursor.execute(sentencia.prepare)
+                dbapi_connection.commit()
+                preparadas.add(sentencia.nombre)
+            except Exception as e:
+                dbapi_connection.rollback()
+                print(f"Error al preparar la sentencia '{sentencia.nombre}' de Servel: {e}")
+    finally:
+        cursor.close()
+    connection_record.info["sentencias_preparadas"] = preparadas
+
 
 @contextmanager
 def get_servel_session():
@@ -38,8 +136,203 @@ def get_servel_session():
         yield session
     finally:
         session.close()
-        
-def servel_direccion_persona(nombre_via: str, numero: str, comuna: str, region: str, cut_comuna: str, cut_r: str):
+
+
+SENTENCIA_DIRECCION_PERSONA = SentenciaPreparada(
+    "servel_direccion_persona",
+    """
+     SELECT
+        dp.id,
+        ((SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via)) +
+        SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) +
+        SIMILARITY(UPPER(r.region), UPPER(:region))) / 3) * 100 AS score_total,
+        SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via)) as score,
+        c.comuna,
+        c.provincia,
+        r.region,
+        r.cut_reg,
+        c.cut_com,
+        c.provincia,
+        dp.tipo_via,
+        dp.nombre_via,
+        dp.numero,
+        dp.resto,
+        dp.referencia,
+        dp.localidad,
+        dp.cut_region,
+        dp.cut_provincia,
+        dp.cut_comuna,
+        dp.tipo_geo_id,
+        dp.revisado_id,
+        dp.obs_analista,
+        dp.geo_id,
+        dp.tipo_padron_id,
+        dp.orden_edicion_id,
+        dp.prioridad_id,
+        dp.control_id,
+        dp.latitud,
+        dp.longitud,
+        dp.geom,
+        dp.created_by,
+        dp.created_at,
+        dp.updated_by,
+        dp.updated_at,
+        dp.deleted_by,
+        dp.deleted_at
+    FROM
+        direccion_persona dp
+    INNER JOIN
+        regiones AS r 
+        ON ((r.cut_reg = dp.cut_region or r.cut_reg=:cut_reg) OR SIMILARITY(UPPER(r.region), UPPER(:region)) > 0.9)
+    INNER JOIN
+        comunas AS c 
+        ON ((c.cut_com = dp.cut_comuna or c.cut_com=:cut_com) OR SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) > 0.9)
+    WHERE
+        dp.numero = :numero 
+        AND SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via))>0.6
+    ORDER BY
+        score DESC,
+        dp.created_at DESC,
+        dp.updated_at DESC
+    LIMIT 1
+    """,
+    ["nombre_via", "numero", "comuna", "region", "cut_com", "cut_reg"],
+)
+SENTENCIAS_PREPARADAS[SENTENCIA_DIRECCION_PERSONA.nombre] = SENTENCIA_DIRECCION_PERSONA
+
+
+SENTENCIA_DIRECCION_PERSONA_INDEXADA = SentenciaPreparada(
+    "servel_direccion_persona_indexada",
+    """
+    SELECT
+        dp.id,
+        ((SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via)) +
+        SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) +
+        SIMILARITY(UPPER(r.region), UPPER(:region))) / 3) * 100 AS score_total,
+        SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via)) as score,
+        c.comuna,
+        c.provincia,
+        r.region,
+        r.cut_reg,
+        c.cut_com,
+        c.provincia,
+        dp.tipo_via,
+        dp.nombre_via,
+        dp.numero,
+        dp.resto,
+        dp.referencia,
+        dp.localidad,
+        dp.cut_region,
+        dp.cut_provincia,
+        dp.cut_comuna,
+        dp.tipo_geo_id,
+        dp.revisado_id,
+        dp.obs_analista,
+        dp.geo_id,
+        dp.tipo_padron_id,
+        dp.orden_edicion_id,
+        dp.prioridad_id,
+        dp.control_id,
+        dp.latitud,
+        dp.longitud,
+        dp.geom,
+        dp.created_by,
+        dp.created_at,
+        dp.updated_by,
+        dp.updated_at,
+        dp.deleted_by,
+        dp.deleted_at
+    FROM
+        direccion_persona dp
+    INNER JOIN
+        comunas AS c
+        ON c.cut_com = dp.cut_comuna
+    INNER JOIN
+        regiones AS r
+        ON r.cut_reg = dp.cut_region
+    WHERE
+        dp.cut_comuna = :cut_com
+        AND dp.numero = :numero
+        AND UPPER(dp.nombre_via) % UPPER(:nombre_via)
+        AND SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via))>0.6
+    ORDER BY
+        score DESC,
+        dp.created_at DESC,
+        dp.updated_at DESC
+    LIMIT 1
+    """,
+    ["nombre_via", "numero", "comuna", "region", "cut_com"],
+)
+SENTENCIAS_PREPARADAS[SENTENCIA_DIRECCION_PERSONA_INDEXADA.nombre] = SENTENCIA_DIRECCION_PERSONA_INDEXADA
+
+
+# Catálogo de comunas de Servel (cut_com -> comuna), cargado una sola vez
+_comunas_servel: Optional[Dict[str, str]] = None
+
+
+def obtener_comunas_servel() -> Dict[str, str]:
+    """Retorna el catálogo de comunas de Servel, consultándolo en el primer uso."""
+    global _comunas_servel
+    if _comunas_servel is None:
+        with get_servel_session() as session:
+            filas = session.execute(text("SELECT cut_com, comuna FROM comunas")).fetchall()
+        _comunas_servel = {str(fila[0]): (fila[1] or "").upper() for fila in filas}
+    return _comunas_servel
+
+
+@lru_cache(maxsize=4096)
+def resolver_cut_comuna_servel(cut_comuna: Optional[str], comuna: Optional[str]) -> Optional[str]:
+    """
+    Resuelve el código de comuna tal como está en Servel: primero por el CUT recibido (con y
+    sin cero a la izquierda) y luego por el nombre de la comuna.
+
+    Returns:
+        str | None: cut_com de Servel o None si no se pudo resolver.
+    """
+    comunas = obtener_comunas_servel()
+    if cut_comuna and cut_comuna != "0":
+        for candidato in (cut_comuna, cut_comuna.zfill(5), cut_comuna.lstrip("0")):
+            if candidato in comunas:
+                return candidato
+
+    if comuna:
+        comuna = comuna.strip().upper()
+        mejor_cut = None
+        mejor_similitud = 0
+        for cut_com, nombre in comunas.items():
+            similitud = ratio_entero(nombre, comuna)
+            if similitud > mejor_similitud and similitud >= SIMILITUD_COMUNA_SERVEL:
+                mejor_cut = cut_com
+                mejor_similitud = similitud
+        return mejor_cut
+    return None
+
+
+def _consulta_direccion_persona(nombre_via: str, numero: str, comuna: str, region: str, cut_comuna: str, cut_r: str, modo: str):
+    """Selecciona la sentencia y los valores de direccion_persona según el modo de consulta."""
+    if modo == "indexado":
+        cut_servel = resolver_cut_comuna_servel(cut_comuna, comuna)
+        if cut_servel is not None:
+            return SENTENCIA_DIRECCION_PERSONA_INDEXADA, {
+                "nombre_via": nombre_via,
+                "numero": numero,
+                "comuna": comuna,
+                "region": region,
+                "cut_com": cut_servel,
+            }
+
+    return SENTENCIA_DIRECCION_PERSONA, {
+        "nombre_via": nombre_via,
+        "numero": numero,
+        "comuna": comuna,
+        "region": region,
+        "cut_com": cut_comuna,
+        "cut_reg": cut_r,
+    }
+
+
+@medir_etapa("servel_direccion_persona")
+def servel_direccion_persona(nombre_via: str, numero: str, comuna: str, region: str, cut_comuna: str, cut_r: str) -> Optional[Row]:
     """
     Consulta para obtener información de una dirección en función de los parámetros especificados.
 
@@ -52,110 +345,63 @@ def servel_direccion_persona(nombre_via: str, numero: str, comuna: str, region:
         cut_r (str): Código único territorial de la región.
 
     Returns:
-        DireccionPersonaResponse | None: Resultado de la consulta como objeto o None si no hay coincidencias.
+        Row | None: Fila de la consulta (con los campos de ServelDireccionPersona) o None si no hay coincidencias.
     """
-    query = text(
-        """
-         SELECT
-            dp.id,
-            ((SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via)) +
-            SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) +
-            SIMILARITY(UPPER(r.region), UPPER(:region))) / 3) * 100 AS score_total,
-            SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via)) as score,
-            c.comuna,
-            c.provincia,
-            r.region,
-            r.cut_reg,
-            c.cut_com,
-            c.provincia,
-            dp.tipo_via,
-            dp.nombre_via,
-            dp.numero,
-            dp.resto,
-            dp.referencia,
-            dp.localidad,
-            dp.cut_region,
-            dp.cut_provincia,
-            dp.cut_comuna,
-            dp.tipo_geo_id,
-            dp.revisado_id,
-            dp.obs_analista,
-            dp.geo_id,
-            dp.tipo_padron_id,
-            dp.orden_edicion_id,
-            dp.prioridad_id,
-            dp.control_id,
-            dp.latitud,
-            dp.longitud,
-            dp.geom,
-            dp.created_by,
-            dp.created_at,
-            dp.updated_by,
-            dp.updated_at,
-            dp.deleted_by,
-            dp.deleted_at
-        FROM
-            direccion_persona dp
-        INNER JOIN
-            regiones AS r 
-            ON ((r.cut_reg = dp.cut_region or r.cut_reg=:cut_reg) OR SIMILARITY(UPPER(r.region), UPPER(:region)) > 0.9)
-        INNER JOIN
-            comunas AS c 
-            ON ((c.cut_com = dp.cut_comuna or c.cut_com=:cut_com) OR SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) > 0.9)
-        WHERE
-            dp.numero = :numero 
-            AND SIMILARITY(UPPER(dp.nombre_via), UPPER(:nombre_via))>0.6
-        ORDER BY
-            score DESC,
-            dp.created_at DESC,
-            dp.updated_at DESC
-        LIMIT 1;
-
-
-
-        """
-    )
+    # Búsqueda que ya se hizo sin resultado dentro del TTL del caché negativo
+    clave = (nombre_via, numero, comuna, region, cut_comuna, cut_r, SERVEL_MODO_CONSULTA)
+    if cache_negativo.sin_resultado("servel_direccion_persona", clave):
+        return None
 
     try:
         # Ejecutar la consulta
         with get_servel_session() as session:  # Reemplaza con tu función para manejar sesiones
             try:
-                result = session.execute(
-                    query,
-                    {
-                        "nombre_via": nombre_via,
-                        "numero": numero,
-                        "comuna": comuna,
-                        "region": region,
-                        "cut_com": cut_comuna,
-                        "cut_reg": cut_r,
-                    },
-                ).fetchone()
+                sentencia, valores = _consulta_direccion_persona(
+                    nombre_via, numero, comuna, region, cut_comuna, cut_r, SERVEL_MODO_CONSULTA
+                )
+                result = sentencia.ejecutar(session, valores).fetchone()
             except SQLAlchemyError as e:
                 raise Exception(f"Error ejecutando la consulta SQL: {str(e)}")
 
-        # Convertir el resultado a un objeto de respuesta si existe
-        if result:
-            try:
-                return ServelDireccionPersona(**dict(result._asdict()))
-            except AttributeError as e:
-                raise Exception(f"Error al convertir el resultado a un objeto de respuesta: {str(e)}")
-        else:
-            return None
+        # Solo una consulta exitosa sin filas se recuerda; los errores se reintentan
+        if result is None:
+            cache_negativo.registrar("servel_direccion_persona", clave)
+
+        # La fila se entrega tal cual; el ServelDireccionPersona se arma solo para la traza
+        return result
 
     except Exception as e:
         # Captura cualquier error general y lo muestra
         print(f"Error en 'servel_direccion_persona': {str(e)}")
+        marcar_falla("servel_direccion_persona")
         return None
 
 
-def formatear_direccion(direccion: ServelDireccionPersona) -> str:
+def explicar_direccion_persona(nombre_via: str, numero: str, comuna: str, region: str, cut_comuna: str, cut_r: str,
+                               analizar: bool = False) -> Dict[str, str]:
+    """
+    Obtiene el plan de ejecución de la consulta de direccion_persona en ambos modos, para comparar
+    el join original con la variante indexada.
+
+    Returns:
+        dict: Plan por modo ("original", "indexado").
+    """
+    planes = {}
+    with get_servel_session() as session:
+        for modo in ("original", "indexado"):
+            sentencia, valores = _consulta_direccion_persona(nombre_via, numero, comuna, region, cut_comuna, cut_r, modo)
+            planes[modo] = sentencia.explicar(session, valores, analizar)
+            session.rollback()
+    return planes
+
+
+def formatear_direccion(direccion: Row) -> str:
     """
     Formatea la dirección en un formato legible: 
     nombre_via + numero + provincia + comuna + region.
     
     Args:
-        direccion (DireccionPersonaResponse): Objeto con los detalles de la dirección.
+        direccion (Row): Fila de direccion_persona con los detalles de la dirección.
         
     Returns:
         str: Dirección formateada.
@@ -169,57 +415,67 @@ def formatear_direccion(direccion: ServelDireccionPersona) -> str:
 
 
 
+SENTENCIA_LOCALIDADES = SentenciaPreparada(
+    "servel_localidades",
+    """
+    SELECT
+        SIMILARITY(UPPER(l.nombre), UPPER(:nombre_via)) AS score,
+        l.nombre AS localidad_nombre,
+        l.comuna AS localidad_comuna,
+        l.region AS localidad_region,
+        l.id,
+        l.geom,
+        l.objectid,
+        l.id_localid,
+        l.cod_comuna,
+        c.comuna AS comuna_nombre,
+        r.region AS region_nombre,
+        l.glosa_re,
+        l.longitud,
+        l.latitud,
+        l.tipo,
+        l.estado,
+        l.circuns,
+        l.codigo_cir,
+        l.glosacircu,
+        l.principal,
+        l.revisado,
+        l.created_user,
+        l.last_edited_user,
+        l.globalid 
+    FROM
+        localidades l
+    INNER JOIN
+        regiones r 
+        ON (CAST(r.cut_reg AS INTEGER) = l.region OR CAST(:cut_reg AS INTEGER) = l.region OR SIMILARITY(UPPER(r.region), UPPER(:region)) > 0.9)
+    INNER JOIN
+        comunas c 
+        ON (CAST(c.cut_com AS INTEGER) = l.cod_comuna OR CAST(:cut_com AS INTEGER) = l.cod_comuna OR SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) > 0.9)
+    where
+    	SIMILARITY(UPPER(l.nombre), UPPER(:nombre_via))>0.9
+    ORDER BY
+        l.created_date
+    LIMIT 1
+    """,
+    ["nombre_via", "cut_reg", "region", "cut_com", "comuna"],
+)
+SENTENCIAS_PREPARADAS[SENTENCIA_LOCALIDADES.nombre] = SENTENCIA_LOCALIDADES
+
+
+@medir_etapa("servel_localidades")
 def servel_localidades(nombre_via: str, cut_r: Optional[int] = None, region: Optional[str] = None, 
-                         cut_comuna: Optional[int] = None, comuna: Optional[str] = None) -> Optional[ServelLocalidades]:
-    query = text(
-        """
-        SELECT
-            SIMILARITY(UPPER(l.nombre), UPPER(:nombre_via)) AS score,
-            l.nombre AS localidad_nombre,
-            l.comuna AS localidad_comuna,
-            l.region AS localidad_region,
-            l.id,
-            l.geom,
-            l.objectid,
-            l.id_localid,
-            l.cod_comuna,
-            c.comuna AS comuna_nombre,
-            r.region AS region_nombre,
-            l.glosa_re,
-            l.longitud,
-            l.latitud,
-            l.tipo,
-            l.estado,
-            l.circuns,
-            l.codigo_cir,
-            l.glosacircu,
-            l.principal,
-            l.revisado,
-            l.created_user,
-            l.last_edited_user,
-            l.globalid 
-        FROM
-            localidades l
-        INNER JOIN
-            regiones r 
-            ON (CAST(r.cut_reg AS INTEGER) = l.region OR CAST(:cut_reg AS INTEGER) = l.region OR SIMILARITY(UPPER(r.region), UPPER(:region)) > 0.9)
-        INNER JOIN
-            comunas c 
-            ON (CAST(c.cut_com AS INTEGER) = l.cod_comuna OR CAST(:cut_com AS INTEGER) = l.cod_comuna OR SIMILARITY(UPPER(c.comuna), UPPER(:comuna)) > 0.9)
-        where
-        	SIMILARITY(UPPER(l.nombre), UPPER(:nombre_via))>0.9
-        ORDER BY
-            l.created_date
-        LIMIT 1
-        """
-    )
+                         cut_comuna: Optional[int] = None, comuna: Optional[str] = None) -> Optional[Row]:
+    # Búsqueda que ya se hizo sin resultado dentro del TTL del caché negativo
+    clave = (nombre_via, cut_r, region, cut_comuna, comuna)
+    if cache_negativo.sin_resultado("servel_localidades", clave):
+        return None
 
     try:
         # Ejecutar la consulta
         with get_servel_session() as session:
             try:
-                result = session.execute(
-                    query, {
+                result = SENTENCIA_LOCALIDADES.ejecutar(
+                    session, {
                         "nombre_via": nombre_via, 
                         "cut_reg": cut_r, 
                         "region": region, 
@@ -230,14 +486,16 @@ def servel_localidades(nombre_via: str, cut_r: Optional[int] = None, region: Opt
             except SQLAlchemyError as e:
                 raise Exception(f"Error ejecutando la consulta SQL: {str(e)}")
 
-        # Convertir el resultado a la clase ServelLocalidades
-        if result:
-            return ServelLocalidades(**dict(result._mapping))
-        else:
-            return None
+        # Solo una consulta exitosa sin filas se recuerda; los errores se reintentan
+        if result is None:
+            cache_negativo.registrar("servel_localidades", clave)
+
+        # La fila se entrega tal cual; el ServelLocalidades se arma solo para la traza
+        return result
 
     except Exception as e:
         # Captura cualquier error general y lo muestra
         print(f"Error en 'servel_localidades': {str(e)}")
+        marcar_falla("servel_localidades")
         return None
 
@@ -0,0 +1,257 @@
+"""
+Benchmark de la geolocalización tal como la llama la API (``retorna_geolocalizacion``: caché
+de resultados, coalescencia de peticiones idénticas y cascada completa) sobre el entorno local
+de ``benchmarks/entorno.py``: bases DuckDB sintéticas, Servel en SQLite y servidores HTTP
+locales en lugar de Nominatim y Google Maps. No requiere red ni Postgres.
+
+Salvo con ``--con-cache``, el caché de resultados y el caché negativo quedan desactivados, de
+modo que cada dirección recorre la cascada; las direcciones repetidas que coinciden en el
+tiempo igual se unen en una sola cascada (GEO_COALESCER=0 lo evita).
+
+Reporta, para un corpus mixto de direcciones (urbanas, mal escritas, sin número, rurales y
+externas):
+    - latencia de punta a punta p50/p95/p99, total y por categoría;
+    - latencia por etapa (normalización, APT, Servel, proveedores, validación espacial);
+    - rendimiento (direcciones/s) con la concurrencia indicada;
+    - cantidad de resultados por origen.
+
+Con ``--json`` guarda los resultados y con ``--comparar`` muestra la diferencia contra una
+ejecución anterior, para medir el efecto de un cambio.
+
+Uso:
+    python -m benchmarks.bench_cascada --direcciones 500 --concurrencia 4
+    python -m benchmarks.bench_cascada --json base.json
+    python -m benchmarks.bench_cascada --comparar base.json
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.entorno import ServidorProveedores, construir_entorno, registrar_funciones_sqlite
+
+# Funciones de api.manager que se miden como etapas: (nombre de la etapa, objeto, atributo)
+ETAPAS = [
+    ("normalizacion", "manager", "formatea_direcciones"),
+    ("apt_chile", "AptChile", "buscar_direccion_con_numero"),
+    ("apt_localidades", "AptChile", "buscar_direccion_sin_numero"),
+    ("servel_direccion_persona", "manager", "servel_direccion_persona"),
+    ("servel_localidades", "manager", "servel_localidades"),
+    ("nominatim", "NominatimService", "obtener_geolocalizacion"),
+    ("google_maps", "GoogleMapsService", "obtener_geolocalizacion"),
+    ("validacion_comuna", "manager", "esta_en_comuna"),
+]
+
+
+class Cronometro:
+    """Acumula las duraciones por etapa desde todos los hilos."""
+
+    def __init__(self):
+        self.duraciones = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def medir(self, etapa, funcion):
+        def medida(*args, **kwargs):
+            inicio = time.perf_counter()
+            try:
+                return funcion(*args, **kwargs)
+            finally:
+                duracion = time.perf_counter() - inicio
+                with self._lock:
+                    self.duraciones[etapa].append(duracion)
+
+        return medida
+
+    def reiniciar(self):
+        with self._lock:
+            self.duraciones.clear()
+
+
+def configurar_entorno(entorno, servidor, args):
+    """Variables de entorno que leen los módulos de api al importarse."""
+    os.environ["GEO_CONFIG"] = entorno.ruta_config
+    os.environ["DB_URL_SERVEL"] = args.servel_url or f"sqlite:///{entorno.ruta_servel}"
+    os.environ["NOMINATIM_URL"] = f"{servidor.url}/nominatim"
+    os.environ["GOOGLE_MAPS_URL"] = f"{servidor.url}/google"
+    os.environ["NOMINATIM_TASA"] = "0"
+    os.environ["GOOGLE_MAPS_TASA"] = "0"
+    os.environ["HTTP_REINTENTOS"] = "0"
+    if not args.servel_url:
+        # SQLite no tiene PREPARE ni el operador % de pg_trgm
+        os.environ["DB_SENTENCIAS_PREPARADAS"] = "0"
+        os.environ["SERVEL_MODO_CONSULTA"] = "original"
+    if not args.con_cache:
+        os.environ["GEO_CACHE_MAXIMO"] = "0"
+        os.environ["GEO_CACHE_NEGATIVO_MAXIMO"] = "0"
+    os.environ["GEO_PLAZO_MS"] = str(args.plazo_ms)
+
+
+def instrumentar(cronometro):
+    from api import manager
+
+    objetos = {
+        "manager": manager,
+        "AptChile": manager.AptChile,
+        "NominatimService": manager.NominatimService,
+        "GoogleMapsService": manager.GoogleMapsService,
+    }
+    for etapa, objeto, atributo in ETAPAS:
+        destino = objetos[objeto]
+        setattr(destino, atributo, cronometro.medir(etapa, getattr(destino, atributo)))
+
+
+def percentiles(valores):
+    if not valores:
+        return {"n": 0, "p50": 0.0, "p95": 0.0, "p99": 0.0, "total": 0.0}
+    milisegundos = np.array(valores) * 1000
+    p50, p95, p99 = np.percentile(milisegundos, [50, 95, 99])
+    return {"n": len(valores), "p50": p50, "p95": p95, "p99": p99, "total": float(milisegundos.sum())}
+
+
+def ejecutar(corpus, concurrencia, cronometro):
+    from api.manager import retorna_geolocalizacion
+    from api.payloads import RequestGetGeo
+
+    def geolocalizar(direccion):
+        request = RequestGetGeo(
+            nombre_via=direccion["nombre_via"],
+            numero=direccion["numero"],
+            comuna=direccion["comuna"],
+            region=direccion["region"],
+            show="coords",
+        )
+        inicio = time.perf_counter()
+        try:
+            resultado = retorna_geolocalizacion(request)
+        except Exception as e:
+            resultado = {"error": str(e)}
+        return time.perf_counter() - inicio, resultado
+
+    cronometro.reiniciar()
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrencia) as ejecutor:
+        mediciones = list(ejecutor.map(geolocalizar, corpus))
+    duracion = time.perf_counter() - inicio
+
+    por_categoria = defaultdict(list)
+    origenes = Counter()
+    for direccion, (tiempo, resultado) in zip(corpus, mediciones):
+        por_categoria[direccion["categoria"]].append(tiempo)
+        if isinstance(resultado, dict) and "error" in resultado:
+            origenes["error"] += 1
+        else:
+            origenes[(resultado or {}).get("origen") or "sin resultado"] += 1
+
+    return {
+        "direcciones": len(corpus),
+        "concurrencia": concurrencia,
+        "duracion_s": duracion,
+        "direcciones_por_s": len(corpus) / duracion if duracion else 0.0,
+        "punta_a_punta": percentiles([tiempo for tiempo, _ in mediciones]),
+        "categorias": {categoria: percentiles(tiempos) for categoria, tiempos in sorted(por_categoria.items())},
+        "etapas": {etapa: percentiles(cronometro.duraciones.get(etapa, [])) for etapa, _, _ in ETAPAS},
+        "origenes": dict(origenes.most_common()),
+    }
+
+
+def imprimir_tabla(titulo, filas, base=None):
+    print(f"\n{titulo}")
+    print(f"{'':>26} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'total ms':>10}")
+    for nombre, medida in filas.items():
+        linea = (
+            f"{nombre:>26} {medida['n']:>6} {medida['p50']:>9.2f} {medida['p95']:>9.2f} "
+            f"{medida['p99']:>9.2f} {medida['total']:>10.1f}"
+        )
+        anterior = (base or {}).get(nombre)
+        if anterior and anterior["p50"]:
+            linea += f"   p50 {(medida['p50'] / anterior['p50'] - 1) * 100:+.1f}%  p95 {(medida['p95'] / anterior['p95'] - 1) * 100:+.1f}%"
+        print(linea)
+
+
+def imprimir(resultados, base=None):
+    print(f"\nArranque (primera dirección, carga de bases e índices): {resultados['arranque_ms']:.1f} ms")
+    linea = (
+        f"Direcciones: {resultados['direcciones']}  concurrencia: {resultados['concurrencia']}  "
+        f"duración: {resultados['duracion_s']:.2f} s  rendimiento: {resultados['direcciones_por_s']:.1f} dir/s"
+    )
+    if base:
+        linea += f"  ({(resultados['direcciones_por_s'] / base['direcciones_por_s'] - 1) * 100:+.1f}%)"
+    print(linea)
+    imprimir_tabla("Punta a punta", {"total": resultados["punta_a_punta"]}, base and {"total": base["punta_a_punta"]})
+    imprimir_tabla("Por categoría", resultados["categorias"], base and base["categorias"])
+    imprimir_tabla("Por etapa", resultados["etapas"], base and base["etapas"])
+    print("\nOrígenes:")
+    for origen, cantidad in resultados["origenes"].items():
+        print(f"{origen:>26} {cantidad:>6}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--direcciones", type=int, default=500, help="Tamaño del corpus")
+    parser.add_argument("--concurrencia", type=int, default=1, help="Hilos que geolocalizan en paralelo")
+    parser.add_argument("--calles", type=int, default=150, help="Calles sintéticas por comuna")
+    parser.add_argument("--semilla", type=int, default=7, help="Semilla del corpus y de las bases")
+    parser.add_argument("--latencia-proveedores", type=float, default=20.0,
+                        help="Latencia simulada de Nominatim y Google Maps, en ms")
+    parser.add_argument("--con-cache", action="store_true",
+                        help="Mantiene activos el caché de resultados finales y el caché negativo")
+    parser.add_argument("--plazo-ms", type=float, default=0,
+                        help="Plazo de la cascada por dirección, en ms (0 = sin plazo)")
+    parser.add_argument("--servel-url", help="URL SQLAlchemy de un Postgres de Servel en vez de SQLite")
+    parser.add_argument("--directorio", help="Directorio donde dejar las bases generadas (por defecto, uno temporal)")
+    parser.add_argument("--json", help="Guarda los resultados en este archivo")
+    parser.add_argument("--comparar", help="Resultados JSON de una ejecución anterior para comparar")
+    args = parser.parse_args()
+
+    directorio = args.directorio or tempfile.mkdtemp(prefix="bench_cascada_")
+    inicio = time.perf_counter()
+    entorno = construir_entorno(directorio, args.direcciones, args.calles, args.semilla)
+    print(f"Entorno generado en {directorio} ({time.perf_counter() - inicio:.1f} s)")
+    print("Corpus:", dict(Counter(direccion["categoria"] for direccion in entorno.corpus).most_common()))
+
+    servidor = ServidorProveedores(args.latencia_proveedores).iniciar()
+    configurar_entorno(entorno, servidor, args)
+
+    # Los módulos de api se importan después de configurar el entorno
+    from sqlalchemy import event
+
+    from api import servel
+    from api.geopanda_util import refrescar_comunas
+
+    if servel.engine.dialect.name == "sqlite":
+        event.listen(servel.engine, "connect", registrar_funciones_sqlite)
+    refrescar_comunas(entorno.poligonos())
+
+    cronometro = Cronometro()
+    instrumentar(cronometro)
+    try:
+        inicio = time.perf_counter()
+        ejecutar(entorno.corpus[:1], 1, cronometro)
+        arranque = time.perf_counter() - inicio
+        resultados = ejecutar(entorno.corpus, args.concurrencia, cronometro)
+    finally:
+        servidor.detener()
+    resultados["arranque_ms"] = arranque * 1000
+    resultados["consultas_proveedores"] = dict(servidor.consultas)
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, "r", encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(resultados, base)
+    print(f"\nConsultas HTTP a los proveedores: {resultados['consultas_proveedores']}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False, default=float)
+        print(f"Resultados guardados en {args.json}")
+
+
+if __name__ == "__main__":
+    main()
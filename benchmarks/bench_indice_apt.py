@@ -0,0 +1,93 @@
+"""
+Benchmark del índice en memoria de APT CHILE (``api.indice_apt``) contra la consulta LIKE
+en DuckDB, sobre la base configurada en ``mapeador/config/config.json`` (para cifras
+representativas, la base nacional construida con ``construir_referencias.py``).
+
+Reporta el tiempo de construcción, la memoria que ocupa el índice y la latencia de
+búsqueda (p50/p95/p99) de aciertos y fallos.
+
+Uso:
+    python -m benchmarks.bench_indice_apt --consultas 2000
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+import numpy as np
+
+import api.apt_chile as modulo_apt_chile
+from api.conexiones_duckdb import obtener_cursor
+from api.indice_apt import IndiceAPT
+from mapeador.config.PathConfig import obtener_ruta_apt_chile
+
+
+def muestrear_consultas(cantidad: int, semilla: int = 13):
+    """Direcciones existentes (la mitad sin jerarquía inicial) y la misma cantidad con un número inexistente."""
+    cursor = obtener_cursor(obtener_ruta_apt_chile())
+    filas = cursor.execute(
+        f"SELECT COD_COMUNA_INE, NOMBRE_DIRECC, NUMERO FROM apt_chile "
+        f"USING SAMPLE reservoir({int(cantidad)} ROWS) REPEATABLE ({int(semilla)})"
+    ).fetchall()
+    azar = random.Random(semilla)
+    aciertos = []
+    for cut, nombre, numero in filas:
+        palabras = nombre.split()
+        if len(palabras) > 1 and azar.random() < 0.5:
+            nombre = " ".join(palabras[1:])
+        aciertos.append((cut, nombre, str(numero)))
+    fallos = [(cut, nombre, str(int(numero) + 100000)) for cut, nombre, numero in aciertos]
+    return aciertos, fallos
+
+
+def medir(funcion, consultas):
+    tiempos = []
+    encontrados = 0
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        encontrado = funcion(*consulta)
+        tiempos.append(time.perf_counter() - inicio)
+        encontrados += encontrado is not None
+    return np.array(tiempos) * 1e6, encontrados
+
+
+def imprimir(nombre, tiempos, encontrados, total):
+    p50, p95, p99 = np.percentile(tiempos, [50, 95, 99])
+    print(f"{nombre:>28}: p50 {p50:9.1f} us  p95 {p95:9.1f} us  p99 {p99:9.1f} us  encontrados {encontrados}/{total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--consultas", type=int, default=2000, help="Cantidad de direcciones de la muestra")
+    args = parser.parse_args()
+
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    indice = IndiceAPT(obtener_ruta_apt_chile()).cargar()
+    tiempo_construccion = time.perf_counter() - inicio
+    memoria_actual, memoria_pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    estadisticas = indice.estadisticas()
+    print(f"Filas: {estadisticas['filas']}  Calles (con alias): {estadisticas['calles']}")
+    print(f"Construcción: {tiempo_construccion:.2f} s")
+    print(f"Memoria retenida: {memoria_actual / 2**20:.1f} MiB (pico durante la carga {memoria_pico / 2**20:.1f} MiB)")
+    print(
+        f"  arreglos numpy {estadisticas['bytes_arreglos'] / 2**20:.1f} MiB, "
+        f"tramos {estadisticas['bytes_tramos'] / 2**20:.1f} MiB"
+    )
+
+    aciertos, fallos = muestrear_consultas(args.consultas)
+    apt_chile = modulo_apt_chile.AptChile()
+    # Solo la consulta LIKE, sin pasar por el índice aunque APT_INDICE_MEMORIA esté activo
+    modulo_apt_chile.APT_INDICE_MEMORIA = False
+
+    for etiqueta, consultas in (("aciertos", aciertos), ("fallos", fallos)):
+        tiempos, encontrados = medir(indice.buscar, consultas)
+        imprimir(f"índice en memoria ({etiqueta})", tiempos, encontrados, len(consultas))
+        tiempos, encontrados = medir(apt_chile.buscar_direccion_con_numero, consultas)
+        imprimir(f"DuckDB LIKE ({etiqueta})", tiempos, encontrados, len(consultas))
+
+
+if __name__ == "__main__":
+    main()
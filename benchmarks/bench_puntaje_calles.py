@@ -0,0 +1,130 @@
+"""
+Benchmark del puntaje del maestro de calles: recorrido fila a fila con ``fuzz.ratio``
+versus el motor vectorizado de ``mapeador.puntaje`` sobre un conjunto de candidatas del
+tamaño de una región completa.
+
+Uso:
+    python -m benchmarks.bench_puntaje_calles --filas 60000 --consultas 20
+"""
+import argparse
+import random
+import time
+
+from fuzzywuzzy import fuzz
+
+from mapeador.puntaje import ColumnasCalles, mejor_candidato, ratio_entero
+
+COLUMNAS = ["CUT", "CUT_R", "REGION", "PROVINCIA", "COMUNA", "NOMBRE_VIA", "JERARQUIA", "CEN_LAT", "CEN_LON"]
+
+COMUNAS_RM = [
+    "SANTIAGO", "CERRILLOS", "CERRO NAVIA", "CONCHALI", "EL BOSQUE", "ESTACION CENTRAL", "HUECHURABA",
+    "INDEPENDENCIA", "LA CISTERNA", "LA FLORIDA", "LA GRANJA", "LA PINTANA", "LA REINA", "LAS CONDES",
+    "LO BARNECHEA", "LO ESPEJO", "LO PRADO", "MACUL", "MAIPU", "ÑUÑOA", "PEDRO AGUIRRE CERDA",
+    "PEÑALOLEN", "PROVIDENCIA", "PUDAHUEL", "QUILICURA", "QUINTA NORMAL", "RECOLETA", "RENCA",
+    "SAN JOAQUIN", "SAN MIGUEL", "SAN RAMON", "VITACURA", "PUENTE ALTO", "SAN BERNARDO",
+]
+PALABRAS = [
+    "LOS", "LAS", "EL", "LA", "SAN", "SANTA", "AROMOS", "ACACIAS", "PINOS", "ALAMOS", "CARRERA",
+    "OHIGGINS", "PRAT", "FREIRE", "BAQUEDANO", "MATTA", "VALDIVIA", "PEDRO", "JOSE", "MIGUEL",
+    "GENERAL", "CAPITAN", "PROFESOR", "DOCTOR", "ESPERANZA", "LIBERTAD", "INDEPENDENCIA", "ANDES",
+]
+JERARQUIAS = ["CALLE", "AVENIDA", "PASAJE", "CAMINO", "PASAJE PEATONAL"]
+
+
+def generar_region(cantidad: int, semilla: int = 7):
+    azar = random.Random(semilla)
+    filas = []
+    for i in range(cantidad):
+        cut = 13101 + (i % len(COMUNAS_RM))
+        nombre = " ".join(azar.choice(PALABRAS) for _ in range(azar.randint(1, 4)))
+        filas.append((
+            cut, 13, "METROPOLITANA DE SANTIAGO", "SANTIAGO", COMUNAS_RM[i % len(COMUNAS_RM)],
+            nombre, azar.choice(JERARQUIAS), -33.4 - azar.random(), -70.6 - azar.random(),
+        ))
+    return filas
+
+
+def generar_consultas(filas, cantidad: int, semilla: int = 11):
+    azar = random.Random(semilla)
+    consultas = []
+    for _ in range(cantidad):
+        fila = azar.choice(filas)
+        nombre = list(fila[5])
+        # Un error de escritura en la mitad de las consultas
+        if azar.random() < 0.5 and len(nombre) > 3:
+            nombre[azar.randrange(len(nombre))] = azar.choice("AEIOURSTN")
+        consultas.append((fila[6], fila[4], fila[2], "".join(nombre)))
+    return consultas
+
+
+def recorrido_fila_a_fila(filas, jerarquia, comuna, region, nombre_via, ratio):
+    """Reproduce el recorrido original de ``procesa_direccion_maestro_calle``."""
+    mejor_similitud = 0
+    mejor_fila = None
+    for fila in filas:
+        jerarquia_similitud = ratio(fila[COLUMNAS.index("JERARQUIA")].upper(), jerarquia) if fila[COLUMNAS.index("JERARQUIA")] else 0
+        comuna_similitud = ratio(fila[COLUMNAS.index("COMUNA")].upper(), comuna) if fila[COLUMNAS.index("COMUNA")] else 0
+        region_similitud = ratio(fila[COLUMNAS.index("REGION")].upper(), region) if fila[COLUMNAS.index("REGION")] else 0
+        nombre_via_similitud = ratio(fila[COLUMNAS.index("NOMBRE_VIA")].upper(), nombre_via) if fila[COLUMNAS.index("NOMBRE_VIA")] else 0
+
+        puntaje_total = (
+            ((jerarquia_similitud > 70) * jerarquia_similitud)
+            + (comuna_similitud >= 70) * comuna_similitud
+            + (region_similitud >= 70) * region_similitud
+            + (nombre_via_similitud >= 50) * nombre_via_similitud
+        )
+        if puntaje_total > mejor_similitud:
+            mejor_similitud = puntaje_total
+            mejor_fila = fila
+    return mejor_fila, mejor_similitud
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filas", type=int, default=60000, help="Cantidad de calles candidatas")
+    parser.add_argument("--consultas", type=int, default=20, help="Cantidad de direcciones a puntuar")
+    parser.add_argument("--sin-fuzzywuzzy", action="store_true", help="Omite el recorrido con fuzzywuzzy (lento sin python-Levenshtein)")
+    args = parser.parse_args()
+
+    filas = generar_region(args.filas)
+    consultas = generar_consultas(filas, args.consultas)
+
+    inicio = time.perf_counter()
+    columnas = ColumnasCalles(filas, COLUMNAS)
+    tiempo_preparacion = time.perf_counter() - inicio
+
+    tiempos = {"vectorizado": 0.0, "fila_a_fila_lcs": 0.0, "fila_a_fila_fuzzywuzzy": 0.0}
+    diferencias_lcs = 0
+    diferencias_fuzzywuzzy = 0
+
+    for jerarquia, comuna, region, nombre_via in consultas:
+        inicio = time.perf_counter()
+        fila_vectorizada, puntaje_vectorizado = mejor_candidato([(filas, columnas)], jerarquia, comuna, region, nombre_via)
+        tiempos["vectorizado"] += time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        fila_lcs, puntaje_lcs = recorrido_fila_a_fila(filas, jerarquia, comuna, region, nombre_via, ratio_entero)
+        tiempos["fila_a_fila_lcs"] += time.perf_counter() - inicio
+        diferencias_lcs += (fila_lcs, puntaje_lcs) != (fila_vectorizada, puntaje_vectorizado)
+
+        if not args.sin_fuzzywuzzy:
+            inicio = time.perf_counter()
+            fila_fw, puntaje_fw = recorrido_fila_a_fila(filas, jerarquia, comuna, region, nombre_via, fuzz.ratio)
+            tiempos["fila_a_fila_fuzzywuzzy"] += time.perf_counter() - inicio
+            diferencias_fuzzywuzzy += (fila_fw, puntaje_fw) != (fila_vectorizada, puntaje_vectorizado)
+
+    print(f"Candidatas: {args.filas}  Consultas: {args.consultas}")
+    print(f"Preparación de columnas (una vez por partición): {tiempo_preparacion * 1000:.1f} ms")
+    for nombre, total in tiempos.items():
+        if total:
+            print(f"{nombre:>24}: {total / args.consultas * 1000:9.2f} ms por consulta")
+    print(f"{'aceleración vs lcs':>24}: {tiempos['fila_a_fila_lcs'] / tiempos['vectorizado']:9.1f}x")
+    if tiempos["fila_a_fila_fuzzywuzzy"]:
+        print(f"{'aceleración vs fuzzywuzzy':>24}: {tiempos['fila_a_fila_fuzzywuzzy'] / tiempos['vectorizado']:9.1f}x")
+    print(f"Resultados distintos (referencia LCS): {diferencias_lcs}")
+    if not args.sin_fuzzywuzzy:
+        print(f"Resultados distintos (fuzzywuzzy instalado): {diferencias_fuzzywuzzy}")
+
+
+if __name__ == "__main__":
+    main()
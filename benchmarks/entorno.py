@@ -0,0 +1,458 @@
+"""
+Entorno local para medir la cascada de geolocalización sin Servel, Nominatim ni Google:
+
+    - un corpus sintético de direcciones chilenas (urbanas, rurales, sin número, mal escritas
+      y conocidas solo por los proveedores externos);
+    - las bases DuckDB de referencia generadas con ``construir_referencias.py`` a partir de
+      CSV sintéticos;
+    - una base SQLite con las tablas de Servel y una función ``similarity`` de trigramas
+      equivalente a la de pg_trgm;
+    - servidores HTTP locales que responden como Nominatim y Google Maps;
+    - polígonos de comunas en memoria para ``refrescar_comunas``.
+"""
+import csv
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from database.scripts.construir_referencias import REFERENCIAS, construir
+
+RAIZ_PROYECTO = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+# (cut, comuna, provincia, cut_region, region)
+COMUNAS = [
+    (13101, "SANTIAGO", "SANTIAGO", 13, "METROPOLITANA DE SANTIAGO"),
+    (13120, "ÑUÑOA", "SANTIAGO", 13, "METROPOLITANA DE SANTIAGO"),
+    (13122, "PEÑALOLÉN", "SANTIAGO", 13, "METROPOLITANA DE SANTIAGO"),
+    (13119, "MAIPÚ", "SANTIAGO", 13, "METROPOLITANA DE SANTIAGO"),
+    (13114, "LAS CONDES", "SANTIAGO", 13, "METROPOLITANA DE SANTIAGO"),
+    (13201, "PUENTE ALTO", "CORDILLERA", 13, "METROPOLITANA DE SANTIAGO"),
+    (5101, "VALPARAÍSO", "VALPARAÍSO", 5, "VALPARAÍSO"),
+    (5109, "VIÑA DEL MAR", "VALPARAÍSO", 5, "VALPARAÍSO"),
+    (8101, "CONCEPCIÓN", "CONCEPCIÓN", 8, "BIOBÍO"),
+    (8110, "TALCAHUANO", "CONCEPCIÓN", 8, "BIOBÍO"),
+    (9101, "TEMUCO", "CAUTÍN", 9, "LA ARAUCANÍA"),
+    (9112, "PADRE LAS CASAS", "CAUTÍN", 9, "LA ARAUCANÍA"),
+]
+
+PREFIJOS = ["", "", "LOS", "LAS", "EL", "LA", "SAN", "SANTA", "GENERAL", "PROFESOR", "DOCTOR", "CAPITÁN"]
+NOMBRES = [
+    "AROMOS", "ACACIAS", "ÁLAMOS", "PINOS", "CARRERA", "O'HIGGINS", "PRAT", "FREIRE", "BAQUEDANO",
+    "MATTA", "VALDIVIA", "MARTÍN", "MIGUEL", "JOSÉ MIGUEL INFANTE", "ESPERANZA", "LIBERTAD",
+    "INDEPENDENCIA", "ANDES", "COPIHUES", "ARAUCO", "LAUTARO", "CAUPOLICÁN", "GABRIELA MISTRAL",
+    "PABLO NERUDA", "BLANCO ENCALADA", "IRARRÁZAVAL", "GRECIA", "MACUL", "TOBALABA", "VICUÑA MACKENNA",
+    "PEDRO DE VALDIVIA", "LOS LEONES", "PORTUGAL", "ESPAÑA", "BRASIL", "ARGENTINA", "BOLÍVAR", "MAIPÚ",
+]
+JERARQUIAS = ["CALLE", "CALLE", "CALLE", "AVENIDA", "PASAJE", "CAMINO"]
+ABREVIACIONES = {"AVENIDA": "AV.", "PASAJE": "PJE", "CALLE": "CALLE", "CAMINO": "CAM"}
+# Nombres sin palabras en común con las calles, para que el maestro de calles no los confunda con
+# una calle parecida. Las de posición par están en LOCALIDADES de APT (y como camino en el maestro
+# de calles, que es lo que les da puntaje 100); las impares, en las localidades de Servel.
+LOCALIDADES = ["HUELQUÉN", "LONGOTOMA", "COLLIGUAY", "PICHIDANGUI", "CHAMPA", "RUNGUE", "TILTIL"]
+RURALES = ["PARCELA {n} SECTOR {l}", "FUNDO {l}", "KM {n} RUTA 68", "HIJUELA {n} {l}", "LOTE {n} {l}"]
+
+# Proporción de cada tipo de dirección en el corpus
+CATEGORIAS = {
+    "urbana_apt": 0.40,
+    "urbana_servel": 0.20,
+    "mal_escrita": 0.15,
+    "sin_numero": 0.10,
+    "rural": 0.10,
+    "externa": 0.05,
+}
+
+
+def caja_comuna(posicion: int):
+    """Rectángulo (lon_min, lat_min, lon_max, lat_max) de la comuna en una grilla de 0.1°."""
+    lat = -33.0 - (posicion // 4) * 0.1
+    lon = -71.0 + (posicion % 4) * 0.1
+    return lon, lat - 0.1, lon + 0.1, lat
+
+
+def punto_en(caja, azar: random.Random):
+    lon_min, lat_min, lon_max, lat_max = caja
+    margen = 0.005
+    return (
+        azar.uniform(lat_min + margen, lat_max - margen),
+        azar.uniform(lon_min + margen, lon_max - margen),
+    )
+
+
+@dataclass
+class Calle:
+    cut: int
+    jerarquia: str
+    nombre: str
+    fuente: str  # "apt", "servel", "externa" o "localidad" (solo en el maestro de calles)
+    cen_lat: float
+    cen_lon: float
+    numeros: List[int] = field(default_factory=list)
+
+
+@dataclass
+class Entorno:
+    directorio: str
+    ruta_config: str
+    ruta_servel: str
+    corpus: List[Dict[str, str]]
+
+    def poligonos(self):
+        """GeoDataFrame de comunas (cut_com, comuna, geom) para ``refrescar_comunas``."""
+        import geopandas as gpd
+        from shapely.geometry import box
+
+        return gpd.GeoDataFrame(
+            {
+                "cut_com": [str(cut).zfill(5) for cut, *_ in COMUNAS],
+                "comuna": [comuna for _, comuna, *_ in COMUNAS],
+                "geom": [box(*caja_comuna(posicion)) for posicion in range(len(COMUNAS))],
+            },
+            geometry="geom",
+        )
+
+
+def generar_calles(calles_por_comuna: int, azar: random.Random) -> List[Calle]:
+    calles = []
+    for posicion, (cut, *_resto) in enumerate(COMUNAS):
+        caja = caja_comuna(posicion)
+        nombres = set()
+        while len(nombres) < calles_por_comuna:
+            nombre = " ".join(p for p in (azar.choice(PREFIJOS), azar.choice(NOMBRES)) if p)
+            if len(nombres) >= len(PREFIJOS) * len(NOMBRES) // 2:
+                nombre = f"{nombre} {len(nombres)}"
+            nombres.add(nombre)
+        for nombre in sorted(nombres):
+            sorteo = azar.random()
+            fuente = "apt" if sorteo < 0.6 else "servel" if sorteo < 0.85 else "externa"
+            cen_lat, cen_lon = punto_en(caja, azar)
+            numeros = list(range(100, 100 + 50 * azar.randint(8, 30), 50))
+            calles.append(Calle(cut, azar.choice(JERARQUIAS), nombre, fuente, cen_lat, cen_lon, numeros))
+        for localidad in LOCALIDADES[::2]:
+            cen_lat, cen_lon = punto_en(caja, azar)
+            calles.append(Calle(cut, "CAMINO", localidad, "localidad", cen_lat, cen_lon))
+    return calles
+
+
+def _escribir_csv(ruta: str, columnas: List[str], filas) -> None:
+    with open(ruta, "w", newline="", encoding="utf-8") as f:
+        escritor = csv.writer(f)
+        escritor.writerow(columnas)
+        escritor.writerows(filas)
+
+
+def escribir_referencias(directorio: str, calles: List[Calle], azar: random.Random) -> Dict[str, str]:
+    """Escribe los CSV sintéticos y construye las bases DuckDB con ``construir_referencias``."""
+    comunas = {cut: (posicion, comuna, provincia, cut_r, region) for posicion, (cut, comuna, provincia, cut_r, region) in enumerate(COMUNAS)}
+    carpeta_csv = os.path.join(directorio, "csv")
+    os.makedirs(carpeta_csv, exist_ok=True)
+
+    _escribir_csv(
+        os.path.join(carpeta_csv, REFERENCIAS["maestro_calles"]["csv"]),
+        ["CUT", "CUT_R", "REGION", "PROVINCIA", "COMUNA", "NOMBRE_VIA", "JERARQUIA", "CEN_LAT", "CEN_LON"],
+        (
+            (c.cut, comunas[c.cut][3], comunas[c.cut][4], comunas[c.cut][2], comunas[c.cut][1],
+             c.nombre, c.jerarquia, c.cen_lat, c.cen_lon)
+            for c in calles
+        ),
+    )
+
+    filas_apt = []
+    for calle in calles:
+        if calle.fuente != "apt":
+            continue
+        for numero in calle.numeros:
+            filas_apt.append(
+                [f"D{len(filas_apt) + 1}", f"{calle.jerarquia} {calle.nombre}", numero,
+                 calle.cen_lon + azar.uniform(-0.002, 0.002), calle.cen_lat + azar.uniform(-0.002, 0.002)]
+                + [None] * 6 + [calle.cut] + [None] * 17
+            )
+    _escribir_csv(
+        os.path.join(carpeta_csv, REFERENCIAS["apt_chile"]["csv"]),
+        ["COD_DIRECCION", "NOMBRE_DIRECC", "NUMERO", "COORDENADA_X", "COORDENADA_Y", "FECHA_INGRESO",
+         "FECHA_ACTUALIZACION", "FECHA_GEOREFERENCIA", "FECHA_NOVIGENCIA", "COD_VIGENCIA", "FLAG_NORMALIZADO",
+         "COD_COMUNA_INE", "COD_COM_TXT", "COD_CALLE", "LETNUM", "SITIO", "DEPTO", "CASA", "BLOCK",
+         "COD_CALLE_OLD", "COD_VIA", "FUENTE", "COD_LOCALIDAD", "COD_ENTIDAD", "COD_CPOBLADO", "REFERENCIA",
+         "COD_UVECINAL", "COD_AH", "LOCALIDAD_RSH"],
+        filas_apt,
+    )
+
+    filas_localidades = []
+    for cut, (posicion, comuna, _, cut_r, region) in comunas.items():
+        for orden, localidad in enumerate(LOCALIDADES[::2]):
+            lat, lon = punto_en(caja_comuna(posicion), azar)
+            filas_localidades.append(
+                [len(filas_localidades) + 1, cut, comuna, cut_r, region, localidad, lon, lat, "RURAL", "VIGENTE"]
+                + [None] * 9 + [f"G{cut}{orden}"]
+            )
+    _escribir_csv(
+        os.path.join(carpeta_csv, REFERENCIAS["localidades"]["csv"]),
+        ["id_localid", "cod_comuna", "comuna", "cod_r", "region", "nombre_localidad", "longitud", "latitud",
+         "tipo", "estado", "circuns", "codigo_cir", "glosacircu", "principal", "revisado", "created_user",
+         "created_date", "last_edited_user", "last_edited_date", "globalid"],
+        filas_localidades,
+    )
+
+    rutas = {}
+    for tabla, definicion in REFERENCIAS.items():
+        rutas[tabla] = os.path.join(directorio, f"{tabla}.duckdb")
+        construir(tabla, os.path.join(carpeta_csv, definicion["csv"]), rutas[tabla])
+    return rutas
+
+
+def escribir_servel(ruta: str, calles: List[Calle], azar: random.Random) -> None:
+    """Crea la base SQLite con las tablas de Servel que consulta ``api.servel``."""
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    conexion = sqlite3.connect(ruta)
+    conexion.executescript(
+        """
+        CREATE TABLE regiones (cut_reg TEXT, region TEXT);
+        CREATE TABLE comunas (cut_com TEXT, comuna TEXT, provincia TEXT, cut_reg TEXT);
+        CREATE TABLE direccion_persona (
+            id INTEGER PRIMARY KEY, tipo_via TEXT, nombre_via TEXT, numero TEXT, resto TEXT, referencia TEXT,
+            localidad TEXT, cut_region TEXT, cut_provincia TEXT, cut_comuna TEXT, tipo_geo_id INTEGER,
+            revisado_id INTEGER, obs_analista TEXT, geo_id INTEGER, tipo_padron_id INTEGER,
+            orden_edicion_id INTEGER, prioridad_id INTEGER, control_id INTEGER, latitud REAL, longitud REAL,
+            geom TEXT, created_by TEXT, created_at TEXT, updated_by TEXT, updated_at TEXT, deleted_by TEXT,
+            deleted_at TEXT
+        );
+        CREATE TABLE localidades (
+            id INTEGER PRIMARY KEY, nombre TEXT, comuna TEXT, region INTEGER, geom TEXT, objectid INTEGER,
+            id_localid INTEGER, cod_comuna INTEGER, glosa_re TEXT, longitud REAL, latitud REAL, tipo TEXT,
+            estado TEXT, circuns TEXT, codigo_cir INTEGER, glosacircu TEXT, principal TEXT, revisado TEXT,
+            created_user TEXT, last_edited_user TEXT, globalid TEXT, created_date TEXT
+        );
+        CREATE INDEX idx_direccion_persona_numero ON direccion_persona (numero);
+        """
+    )
+    regiones = sorted({(cut_r, region) for _, _, _, cut_r, region in COMUNAS})
+    conexion.executemany("INSERT INTO regiones VALUES (?, ?)", [(str(cut_r), region) for cut_r, region in regiones])
+    conexion.executemany(
+        "INSERT INTO comunas VALUES (?, ?, ?, ?)",
+        [(str(cut), comuna, provincia, str(cut_r)) for cut, comuna, provincia, cut_r, _ in COMUNAS],
+    )
+    cut_region = {cut: cut_r for cut, _, _, cut_r, _ in COMUNAS}
+    conexion.executemany(
+        "INSERT INTO direccion_persona (tipo_via, nombre_via, numero, cut_region, cut_comuna, latitud, longitud, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (calle.jerarquia, calle.nombre, str(numero), str(cut_region[calle.cut]), str(calle.cut),
+             calle.cen_lat + azar.uniform(-0.002, 0.002), calle.cen_lon + azar.uniform(-0.002, 0.002),
+             "2024-01-01T00:00:00")
+            for calle in calles
+            if calle.fuente == "servel"
+            for numero in calle.numeros
+        ],
+    )
+    filas_localidades = []
+    for posicion, (cut, comuna, _, cut_r, _) in enumerate(COMUNAS):
+        for localidad in LOCALIDADES[1::2]:
+            lat, lon = punto_en(caja_comuna(posicion), azar)
+            filas_localidades.append((localidad, comuna, cut_r, cut, lon, lat, "RURAL", "2024-01-01T00:00:00"))
+    conexion.executemany(
+        "INSERT INTO localidades (nombre, comuna, region, cod_comuna, longitud, latitud, tipo, created_date) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        filas_localidades,
+    )
+    conexion.commit()
+    conexion.close()
+
+
+def _trigramas(texto: str) -> set:
+    trigramas = set()
+    palabra = []
+    for caracter in (texto or "").lower() + " ":
+        if caracter.isalnum():
+            palabra.append(caracter)
+        elif palabra:
+            relleno = "  " + "".join(palabra) + " "
+            trigramas.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+            palabra = []
+    return trigramas
+
+
+def similitud_trigramas(a: Optional[str], b: Optional[str]) -> float:
+    """Equivalente a ``similarity`` de pg_trgm: trigramas compartidos sobre trigramas totales."""
+    if a is None or b is None:
+        return 0.0
+    trigramas_a, trigramas_b = _trigramas(a), _trigramas(b)
+    union = len(trigramas_a | trigramas_b)
+    return len(trigramas_a & trigramas_b) / union if union else 0.0
+
+
+def registrar_funciones_sqlite(dbapi_connection, connection_record) -> None:
+    """Evento ``connect`` del motor de Servel: agrega ``similarity`` a cada conexión SQLite."""
+    dbapi_connection.create_function("similarity", 2, similitud_trigramas, deterministic=True)
+
+
+def _con_error(texto: str, azar: random.Random) -> str:
+    """Introduce un error de escritura: cambia, omite o duplica una letra."""
+    letras = list(texto)
+    posiciones = [i for i, letra in enumerate(letras) if letra.isalpha()]
+    if not posiciones:
+        return texto
+    i = azar.choice(posiciones)
+    operacion = azar.random()
+    if operacion < 0.4:
+        letras[i] = azar.choice("AEIOURSTNL")
+    elif operacion < 0.7:
+        del letras[i]
+    else:
+        letras.insert(i, letras[i])
+    return "".join(letras)
+
+
+def _variante_comuna(comuna: str, azar: random.Random) -> str:
+    """La comuna como la escribiría una persona: con o sin tildes, a veces en minúsculas."""
+    if azar.random() < 0.5:
+        comuna = comuna.translate(str.maketrans("ÁÉÍÓÚ", "AEIOU"))
+    return comuna.lower() if azar.random() < 0.2 else comuna
+
+
+def generar_corpus(calles: List[Calle], cantidad: int, azar: random.Random) -> List[Dict[str, str]]:
+    datos_comuna = {cut: (comuna, region) for cut, comuna, _, _, region in COMUNAS}
+    por_fuente: Dict[str, List[Calle]] = {}
+    for calle in calles:
+        por_fuente.setdefault(calle.fuente, []).append(calle)
+
+    categorias = list(CATEGORIAS)
+    pesos = list(CATEGORIAS.values())
+    corpus = []
+    for _ in range(cantidad):
+        categoria = azar.choices(categorias, pesos)[0]
+        fuente = {"urbana_servel": "servel", "externa": "externa"}.get(categoria, "apt")
+        calle = azar.choice(por_fuente[fuente])
+        comuna, region = datos_comuna[calle.cut]
+        numero = str(azar.choice(calle.numeros))
+        nombre_via = calle.nombre
+        if azar.random() < 0.3:
+            nombre_via = f"{ABREVIACIONES[calle.jerarquia]} {nombre_via}"
+
+        if categoria == "mal_escrita":
+            nombre_via = _con_error(nombre_via, azar)
+        elif categoria == "sin_numero":
+            nombre_via = azar.choice(LOCALIDADES)
+            numero = azar.choice(["S/N", "SN", "", "SIN NUMERO"])
+        elif categoria == "rural":
+            nombre_via = azar.choice(RURALES).format(n=azar.randint(1, 60), l=azar.choice(LOCALIDADES))
+            numero = azar.choice(["", "S/N", str(azar.randint(1, 300))])
+
+        corpus.append({
+            "categoria": categoria,
+            "nombre_via": nombre_via,
+            "numero": numero,
+            "comuna": _variante_comuna(comuna, azar),
+            "region": region,
+        })
+    return corpus
+
+
+def construir_entorno(directorio: str, direcciones: int, calles_por_comuna: int = 150, semilla: int = 7) -> Entorno:
+    """Genera en ``directorio`` las bases de referencia, la base de Servel, el corpus y un config.json."""
+    azar = random.Random(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    calles = generar_calles(calles_por_comuna, azar)
+    rutas = escribir_referencias(directorio, calles, azar)
+    ruta_servel = os.path.join(directorio, "servel.sqlite")
+    escribir_servel(ruta_servel, calles, azar)
+
+    ruta_config = os.path.join(directorio, "config.json")
+    with open(ruta_config, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "MAESTROCALLES": rutas["maestro_calles"],
+                "APT": rutas["apt_chile"],
+                "LOCALIDADES": rutas["localidades"],
+                "JERARQUIAS": os.path.join(RAIZ_PROYECTO, "mapeador", "jerarquias.json"),
+                "ABREVIACIONES": os.path.join(RAIZ_PROYECTO, "mapeador", "abreviaciones.json"),
+                "CACHE_PROVEEDORES": os.path.join(directorio, "cache_proveedores.sqlite"),
+            },
+            f,
+            indent=2,
+        )
+    return Entorno(directorio, ruta_config, ruta_servel, generar_corpus(calles, direcciones, azar))
+
+
+def _coordenadas(texto: str):
+    """Coordenadas estables derivadas del texto consultado, dentro de la grilla de comunas."""
+    resumen = int(hashlib.md5(texto.encode("utf-8")).hexdigest(), 16)
+    return -33.0 - (resumen % 3000) / 10000, -71.0 + (resumen // 3000 % 4000) / 10000, resumen
+
+
+class ServidorProveedores:
+    """
+    Servidor HTTP local que responde como Nominatim (``/nominatim``) y Google Maps (``/google``),
+    con una latencia fija por respuesta. Nominatim encuentra dos de cada tres direcciones;
+    Google encuentra todas.
+    """
+
+    def __init__(self, latencia_ms: float = 0.0):
+        self.latencia = latencia_ms / 1000
+        self.consultas = {"nominatim": 0, "google": 0}
+        servidor = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                parametros = {clave: valores[0] for clave, valores in parse_qs(url.query).items()}
+                if servidor.latencia:
+                    time.sleep(servidor.latencia)
+                if url.path == "/nominatim":
+                    servidor.consultas["nominatim"] += 1
+                    consulta = parametros.get("q", "")
+                    lat, lon, resumen = _coordenadas(consulta)
+                    cuerpo = [] if resumen % 3 == 0 else [
+                        {"display_name": consulta, "lat": str(lat), "lon": str(lon), "class": "building"}
+                    ]
+                elif url.path == "/google":
+                    servidor.consultas["google"] += 1
+                    direccion = parametros.get("address", "")
+                    lat, lon, _ = _coordenadas(direccion)
+                    cuerpo = {
+                        "status": "OK",
+                        "results": [{
+                            "formatted_address": direccion,
+                            "geometry": {"location": {"lat": lat, "lng": lon}, "location_type": "ROOFTOP"},
+                        }],
+                    }
+                else:
+                    self.send_error(404)
+                    return
+                contenido = json.dumps(cuerpo).encode("utf-8")
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(contenido)))
+                    self.end_headers()
+                    self.wfile.write(contenido)
+                except (BrokenPipeError, ConnectionResetError):
+                    # El cliente ya se fue porque se le agotó el plazo
+                    pass
+
+            def log_message(self, formato, *args):
+                pass
+
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), Manejador)
+        self._servidor.daemon_threads = True
+        self._hilo = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, puerto = self._servidor.server_address[:2]
+        return f"http://{host}:{puerto}"
+
+    def iniciar(self) -> "ServidorProveedores":
+        self._hilo.start()
+        return self
+
+    def detener(self) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
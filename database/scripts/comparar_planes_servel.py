@@ -0,0 +1,28 @@
+import argparse
+import os
+import sys
+
+# Permite ejecutar el script desde la raíz del proyecto: python database/scripts/comparar_planes_servel.py
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from api.servel import explicar_direccion_persona
+
+parser = argparse.ArgumentParser(
+    description="Compara el plan de ejecución de direccion_persona entre el modo original y el indexado."
+)
+parser.add_argument("--nombre-via", required=True)
+parser.add_argument("--numero", required=True)
+parser.add_argument("--comuna", required=True)
+parser.add_argument("--region", required=True)
+parser.add_argument("--cut-comuna", default="0")
+parser.add_argument("--cut-region", default="0")
+parser.add_argument("--analizar", action="store_true", help="Usa EXPLAIN ANALYZE (ejecuta la consulta)")
+args = parser.parse_args()
+
+planes = explicar_direccion_persona(
+    args.nombre_via, args.numero, args.comuna, args.region, args.cut_comuna, args.cut_region, args.analizar
+)
+for modo, plan in planes.items():
+    print(f"===== {modo} =====")
+    print(plan)
+    print()
@@ -0,0 +1,127 @@
+"""
+Construye las bases DuckDB de referencia (maestro de calles, APT CHILE y LOCALIDADES) a
+partir de los CSV originales.
+
+Cada base queda con:
+    - columnas ``*_NORM`` precalculadas (mayúsculas, sin tildes, espacios simples), que son
+      las que usan las consultas en vez de ``upper()``/``ILIKE``;
+    - códigos CUT de comuna como enteros;
+    - filas ordenadas por comuna, para que DuckDB descarte por sus mínimos y máximos
+      (zonemaps) los bloques de otras comunas.
+
+Por defecto no se crean índices ART sobre el código de comuna: cada comuna agrupa miles de
+filas y DuckDB responde más lento recorriendo el índice que leyendo los bloques ordenados.
+Con ``--indices`` se crean de todos modos sobre las columnas de búsqueda de cada tabla,
+para medir con los datos reales si convienen (``benchmarks.bench_cascada``).
+
+La base se escribe en un archivo temporal y reemplaza a la anterior solo si se construyó
+completa, por lo que el comando puede repetirse sin riesgo.
+
+Uso (desde la raíz del proyecto):
+    python database/scripts/construir_referencias.py --csv ./csv_data
+    python database/scripts/construir_referencias.py --csv ./csv_data --solo apt_chile
+    python database/scripts/construir_referencias.py --csv ./csv_data --indices
+"""
+import argparse
+import os
+import sys
+import time
+
+import duckdb
+
+# Permite ejecutar el script desde la raíz del proyecto
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+from mapeador.config.PathConfig import (
+    obtener_ruta_apt_chile,
+    obtener_ruta_apt_localidades,
+    obtener_ruta_maestro_calles,
+)
+from mapeador.normalizacion import expresion_normalizacion as norm
+
+REFERENCIAS = {
+    "maestro_calles": {
+        "csv": "MAESTROCALLES_CHILE_INE2024.csv",
+        "destino": obtener_ruta_maestro_calles,
+        "consulta": f"""
+            SELECT * REPLACE (TRY_CAST(CUT AS INTEGER) AS CUT, TRY_CAST(CUT_R AS INTEGER) AS CUT_R),
+                {norm("NOMBRE_VIA")} AS NOMBRE_VIA_NORM,
+                {norm("COMUNA")} AS COMUNA_NORM,
+                {norm("REGION")} AS REGION_NORM
+            FROM read_csv_auto(?)
+            ORDER BY CUT, NOMBRE_VIA_NORM
+        """,
+        "indices": [["CUT"]],
+    },
+    "apt_chile": {
+        "csv": "APT_CHILE.csv",
+        "destino": obtener_ruta_apt_chile,
+        "consulta": f"""
+            SELECT * REPLACE (
+                    TRY_CAST(COD_COMUNA_INE AS INTEGER) AS COD_COMUNA_INE,
+                    TRY_CAST(NUMERO AS BIGINT) AS NUMERO
+                ),
+                {norm("NOMBRE_DIRECC")} AS NOMBRE_DIRECC_NORM
+            FROM read_csv_auto(?)
+            ORDER BY COD_COMUNA_INE, NUMERO
+        """,
+        "indices": [["COD_COMUNA_INE", "NUMERO"]],
+    },
+    "localidades": {
+        "csv": "LOCALIDADES_UR_RU.csv",
+        "destino": obtener_ruta_apt_localidades,
+        "consulta": f"""
+            SELECT * REPLACE (TRY_CAST(cod_comuna AS INTEGER) AS cod_comuna),
+                {norm("nombre_localidad")} AS nombre_localidad_norm
+            FROM read_csv_auto(?)
+            ORDER BY cod_comuna, nombre_localidad_norm
+        """,
+        "indices": [["cod_comuna"]],
+    },
+}
+
+
+def construir(tabla: str, ruta_csv: str, destino: str, indices: bool = False) -> int:
+    """
+    Construye la base de una tabla en un archivo temporal y la deja en ``destino``.
+
+    :param indices: Crea además los índices ART de las columnas de búsqueda de la tabla.
+    """
+    definicion = REFERENCIAS[tabla]
+    temporal = destino + ".tmp"
+    if os.path.exists(temporal):
+        os.remove(temporal)
+
+    conexion = duckdb.connect(temporal)
+    try:
+        conexion.execute(f"CREATE TABLE {tabla} AS {definicion['consulta']}", [ruta_csv])
+        filas = conexion.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+        if indices:
+            for columnas in definicion["indices"]:
+                nombre = f"idx_{tabla}_{'_'.join(columnas)}".lower()
+                conexion.execute(f"CREATE INDEX {nombre} ON {tabla} ({', '.join(columnas)})")
+        conexion.execute("CHECKPOINT")
+    finally:
+        conexion.close()
+
+    os.replace(temporal, destino)
+    return filas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Construye las bases DuckDB de referencia desde los CSV originales.")
+    parser.add_argument("--csv", default="./csv_data", help="Directorio con los CSV originales")
+    parser.add_argument("--solo", choices=list(REFERENCIAS), action="append", help="Construye solo estas tablas")
+    parser.add_argument("--indices", action="store_true", help="Crea índices ART sobre las columnas de búsqueda")
+    args = parser.parse_args()
+
+    for tabla in args.solo or list(REFERENCIAS):
+        ruta_csv = os.path.join(args.csv, REFERENCIAS[tabla]["csv"])
+        destino = REFERENCIAS[tabla]["destino"]()
+        inicio = time.perf_counter()
+        filas = construir(tabla, ruta_csv, destino, args.indices)
+        print(f"{tabla}: {filas} filas -> {destino} ({time.perf_counter() - inicio:.1f} s)")
+
+
+if __name__ == "__main__":
+    main()
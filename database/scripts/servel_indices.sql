@@ -0,0 +1,28 @@
+-- Índices para el modo de consulta "indexado" de direccion_persona (SERVEL_MODO_CONSULTA=indexado).
+--
+-- La consulta indexada filtra por (cut_comuna, numero) y compara el nombre de la vía con el
+-- operador % de pg_trgm; sin estos índices Postgres vuelve a recorrer la tabla completa.
+--
+-- Ejecutar fuera de una transacción (CREATE INDEX CONCURRENTLY no bloquea escrituras):
+--     psql -h <host> -p <puerto> -U <usuario> -d prototipo_servel -f database/scripts/servel_indices.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Filtro principal: comuna y número exacto
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_direccion_persona_cut_comuna_numero
+    ON direccion_persona (cut_comuna, numero);
+
+-- Similitud del nombre de la vía: UPPER(nombre_via) % UPPER(:nombre_via)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_direccion_persona_nombre_via_trgm
+    ON direccion_persona USING gin (UPPER(nombre_via) gin_trgm_ops);
+
+-- Joins por igualdad con los catálogos
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_comunas_cut_com
+    ON comunas (cut_com);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_regiones_cut_reg
+    ON regiones (cut_reg);
+
+ANALYZE direccion_persona;
+ANALYZE comunas;
+ANALYZE regiones;
@@ -0,0 +1,294 @@
+"""
+Geocodificación masiva de un archivo CSV o Parquet con la misma cascada de la API.
+
+El archivo se lee por bloques, cada bloque se geocodifica en un proceso del pool (cada
+proceso abre sus propias bases DuckDB) y su resultado se escribe como una parte en el
+directorio de salida. El avance queda registrado en ``_progreso.json``: si la ejecución
+se interrumpe, al volver a lanzarla con los mismos argumentos se retoma desde los bloques
+pendientes.
+
+El archivo de entrada debe tener las columnas nombre_via, numero, comuna y region
+(provincia es opcional); el resto de las columnas se copia tal cual a la salida.
+
+Uso:
+    python geocodificar.py direcciones.csv salida/ --procesos 4 --tamano-bloque 1000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Tuple
+
+import duckdb
+import pandas as pd
+
+COLUMNAS_REQUERIDAS = ["nombre_via", "numero", "comuna", "region"]
+ARCHIVO_PROGRESO = "_progreso.json"
+
+# Tipos fijos de las columnas agregadas, para que todas las partes tengan el mismo esquema
+COLUMNAS_RESULTADO = {
+    "origen": "VARCHAR",
+    "direccion": "VARCHAR",
+    "latitud": "DOUBLE",
+    "longitud": "DOUBLE",
+    "geopanda_resultado": "VARCHAR",
+    "geopanda_comuna": "VARCHAR",
+    "error": "VARCHAR",
+}
+
+# Hilos por proceso: la cascada pasa la mayor parte del tiempo esperando a Servel y a los proveedores
+_hilos_trabajador = 1
+
+
+def inicializar_trabajador(hilos: int, procesos: int) -> None:
+    """
+    Abre en el proceso trabajador sus propias conexiones DuckDB de solo lectura y reparte entre
+    los procesos la tasa de cada proveedor: cada proceso tiene su propio limitador, así que sin
+    repartirla el conjunto haría hasta ``procesos`` veces las consultas por segundo permitidas.
+    """
+    global _hilos_trabajador
+    from api.cliente_http import TASAS_PROVEEDORES
+    from api.conexiones_duckdb import gestor_duckdb
+    from mapeador.config.PathConfig import (
+        obtener_ruta_apt_chile,
+        obtener_ruta_apt_localidades,
+        obtener_ruta_maestro_calles,
+    )
+
+    _hilos_trabajador = hilos
+    # Antes de crear los clientes HTTP, que toman la tasa al construirse
+    for proveedor, tasa in TASAS_PROVEEDORES.items():
+        TASAS_PROVEEDORES[proveedor] = tasa / max(procesos, 1)
+    gestor_duckdb.abrir(obtener_ruta_maestro_calles(), obtener_ruta_apt_chile(), obtener_ruta_apt_localidades())
+
+
+def _construir_request(fila: Dict[str, Any]):
+    from api.payloads import RequestGetGeo
+
+    return RequestGetGeo(
+        nombre_via=str(fila.get("nombre_via") or ""),
+        numero=str(fila.get("numero") or ""),
+        comuna=str(fila.get("comuna") or ""),
+        region=str(fila.get("region") or ""),
+        provincia=str(fila.get("provincia") or ""),
+        show="coords",
+    )
+
+
+def _salida(resumen: Dict[str, Any]) -> Dict[str, Any]:
+    salida = dict.fromkeys(COLUMNAS_RESULTADO)
+    salida.update(
+        origen=resumen.get("origen"),
+        direccion=resumen.get("direccion"),
+        latitud=resumen.get("latitud"),
+        longitud=resumen.get("longitud"),
+    )
+    geopanda = resumen.get("geopanda")
+    if isinstance(geopanda, dict):
+        salida["geopanda_resultado"] = geopanda.get("resultado")
+        salida["geopanda_comuna"] = geopanda.get("comuna")
+    return salida
+
+
+def _geocodificar_fila(fila: Dict[str, Any]) -> Dict[str, Any]:
+    from api.manager import retorna_geolocalizacion
+
+    try:
+        return _salida(retorna_geolocalizacion(_construir_request(fila)))
+    except Exception as e:
+        salida = dict.fromkeys(COLUMNAS_RESULTADO)
+        salida["error"] = str(e)
+        return salida
+
+
+def _geocodificar_registros(registros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Geocodifica el bloque con ``retorna_geolocalizaciones``, que resuelve APT CHILE con una
+    sola consulta para todo el bloque. Si el lote falla, se reintenta fila a fila para
+    informar el error solo en las filas que lo provocan.
+    """
+    from api.manager import retorna_geolocalizaciones
+
+    hilos = ThreadPoolExecutor(max_workers=_hilos_trabajador) if _hilos_trabajador > 1 else None
+    try:
+        try:
+            requests = [_construir_request(registro) for registro in registros]
+            return [_salida(resumen) for resumen in retorna_geolocalizaciones(requests, hilos)]
+        except Exception as e:
+            print(f"Error al geocodificar el bloque en lote, se procesa fila a fila: {e}")
+            if hilos is not None:
+                return list(hilos.map(_geocodificar_fila, registros))
+            return [_geocodificar_fila(registro) for registro in registros]
+    finally:
+        if hilos is not None:
+            hilos.shutdown()
+
+
+def _literal(texto: str) -> str:
+    """Literal de texto SQL, con las comillas simples escapadas."""
+    return "'" + texto.replace("'", "''") + "'"
+
+
+def _escribir_parte(df: pd.DataFrame, ruta: str, formato: str) -> None:
+    """Escribe la parte con DuckDB en un archivo temporal y la renombra, para no dejar partes a medias."""
+    temporal = ruta + ".tmp"
+    conexion = duckdb.connect()
+    try:
+        conexion.register("resultado", df)
+        opciones = "FORMAT PARQUET" if formato == "parquet" else "FORMAT CSV, HEADER"
+        conversiones = ", ".join(f'CAST("{columna}" AS {tipo}) AS "{columna}"' for columna, tipo in COLUMNAS_RESULTADO.items())
+        conexion.execute(f"COPY (SELECT * REPLACE ({conversiones}) FROM resultado) TO {_literal(temporal)} ({opciones})")
+    finally:
+        conexion.close()
+    os.replace(temporal, ruta)
+
+
+def geocodificar_bloque(
+    numero: int, columnas: List[str], filas: List[tuple], ruta_parte: str, formato: str
+) -> Tuple[int, int, Dict[str, float]]:
+    """
+    Geocodifica un bloque de filas y escribe su parte.
+
+    :return: Tupla (numero de bloque, filas procesadas, segundos por etapa). Las etapas de la
+        cascada son las de ``medir_etapa``, sumadas entre los hilos del proceso.
+    """
+    from api.metricas import DURACION_ETAPAS
+
+    registros = [dict(zip(columnas, fila)) for fila in filas]
+
+    # El proceso geocodifica un bloque a la vez: lo que crece el histograma es lo de este bloque
+    antes = DURACION_ETAPAS.sumas()
+    inicio = time.perf_counter()
+    resultados = _geocodificar_registros(registros)
+    geocodificacion = time.perf_counter() - inicio
+    etapas = {
+        clave[0]: segundos - antes.get(clave, 0.0)
+        for clave, segundos in DURACION_ETAPAS.sumas().items()
+        if segundos > antes.get(clave, 0.0)
+    }
+
+    inicio = time.perf_counter()
+    df = pd.concat([pd.DataFrame(registros, columns=columnas), pd.DataFrame(resultados)], axis=1)
+    _escribir_parte(df, ruta_parte, formato)
+    escritura = time.perf_counter() - inicio
+
+    return numero, len(filas), {"geocodificacion": geocodificacion, **etapas, "escritura": escritura}
+
+
+def leer_progreso(ruta: str, entrada: str, tamano_bloque: int) -> Dict[str, Any]:
+    """Lee el registro de avance; uno de otra entrada o tamaño de bloque no se puede reutilizar."""
+    progreso = {"entrada": entrada, "tamano_bloque": tamano_bloque, "completados": []}
+    if not os.path.exists(ruta):
+        return progreso
+    with open(ruta, "r", encoding="utf-8") as f:
+        guardado = json.load(f)
+    if guardado.get("entrada") != entrada or guardado.get("tamano_bloque") != tamano_bloque:
+        raise SystemExit(
+            f"El directorio de salida tiene un avance de otra ejecución ({guardado.get('entrada')}, "
+            f"bloques de {guardado.get('tamano_bloque')}). Use --reiniciar o otro directorio."
+        )
+    return guardado
+
+
+def guardar_progreso(ruta: str, progreso: Dict[str, Any]) -> None:
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(progreso, f)
+    os.replace(temporal, ruta)
+
+
+def consulta_lectura(entrada: str) -> str:
+    """
+    Consulta DuckDB que lee la entrada según su extensión, con todas las columnas como texto.
+    La ruta va como parámetro (``?``), no dentro del texto de la consulta.
+    """
+    if entrada.lower().endswith(".parquet"):
+        return "SELECT * FROM read_parquet(?)"
+    return "SELECT * FROM read_csv_auto(?, all_varchar = true)"
+
+
+def ejecutar(args: argparse.Namespace) -> None:
+    entrada = os.path.abspath(args.entrada)
+    os.makedirs(args.salida, exist_ok=True)
+    ruta_progreso = os.path.join(args.salida, ARCHIVO_PROGRESO)
+    if args.reiniciar and os.path.exists(ruta_progreso):
+        os.remove(ruta_progreso)
+    progreso = leer_progreso(ruta_progreso, entrada, args.tamano_bloque)
+    completados = set(progreso["completados"])
+
+    lector = duckdb.connect()
+    cursor = lector.execute(consulta_lectura(entrada), [entrada])
+    columnas = [descripcion[0] for descripcion in cursor.description]
+    faltantes = [columna for columna in COLUMNAS_REQUERIDAS if columna not in columnas]
+    if faltantes:
+        raise SystemExit(f"Faltan las siguientes columnas en la entrada: {', '.join(faltantes)}")
+
+    tiempos = {"lectura": 0.0, "geocodificacion": 0.0, "escritura": 0.0}
+    filas_procesadas = 0
+    inicio_total = time.perf_counter()
+
+    contexto = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(
+        max_workers=args.procesos, mp_context=contexto, initializer=inicializar_trabajador, initargs=(args.hilos, args.procesos)
+    ) as pool:
+        pendientes = set()
+
+        def recoger(tareas):
+            nonlocal filas_procesadas
+            for tarea in tareas:
+                numero, cantidad, etapas = tarea.result()
+                filas_procesadas += cantidad
+                for etapa, segundos in etapas.items():
+                    tiempos[etapa] = tiempos.get(etapa, 0.0) + segundos
+                progreso["completados"].append(numero)
+                guardar_progreso(ruta_progreso, progreso)
+                print(f"Bloque {numero} listo ({filas_procesadas} filas en esta ejecución)")
+
+        numero = 0
+        while True:
+            inicio = time.perf_counter()
+            filas = cursor.fetchmany(args.tamano_bloque)
+            tiempos["lectura"] += time.perf_counter() - inicio
+            if not filas:
+                break
+            if numero not in completados:
+                ruta_parte = os.path.join(args.salida, f"parte_{numero:06d}.{args.formato}")
+                pendientes.add(pool.submit(geocodificar_bloque, numero, columnas, filas, ruta_parte, args.formato))
+                # Solo unos pocos bloques en vuelo, para no cargar el archivo completo en memoria
+                if len(pendientes) >= args.procesos * 2:
+                    listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    recoger(listos)
+            numero += 1
+
+        listos, _ = wait(pendientes)
+        recoger(listos)
+    lector.close()
+
+    total = time.perf_counter() - inicio_total
+    print(f"\nFilas geocodificadas: {filas_procesadas} de {numero} bloques (ya completados: {len(completados)})")
+    print(f"Tiempo total: {total:.1f} s ({filas_procesadas / total if total else 0:.1f} filas/s)")
+    # Las etapas de los trabajadores suman el tiempo de todos los procesos (y de sus hilos);
+    # las de la cascada van sangradas bajo la geocodificación
+    tiempos["escritura"] = tiempos.pop("escritura")
+    for etapa, segundos in tiempos.items():
+        tasa = filas_procesadas / segundos if segundos else 0
+        nombre = etapa if etapa in ("lectura", "geocodificacion", "escritura") else f"  {etapa}"
+        print(f"  {nombre:<26} {segundos:9.1f} s  {tasa:10.1f} filas/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Geocodifica un archivo CSV o Parquet de direcciones.")
+    parser.add_argument("entrada", help="Archivo CSV o Parquet con nombre_via, numero, comuna y region")
+    parser.add_argument("salida", help="Directorio donde se escriben las partes y el registro de avance")
+    parser.add_argument("--formato", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--hilos", type=int, default=1, help="Hilos por proceso")
+    parser.add_argument("--tamano-bloque", type=int, default=1000)
+    parser.add_argument("--reiniciar", action="store_true", help="Descarta el avance guardado y comienza de cero")
+    ejecutar(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
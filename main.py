@@ -1,11 +1,37 @@
+import asyncio
 import os
 import json
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional
+from api.arranque import (
+    GEO_REVISAR_REFERENCIAS_S,
+    estado_arranque,
+    precargar,
+    recargar_referencias,
+    recargar_si_cambiaron,
+    registrar_carga_referencias,
+)
+from api.cache import cache_geolocalizacion, cache_negativo
+from api.cache_proveedores import obtener_cache_proveedores
+from api.coalescencia import coalescedor_geolocalizacion
+from api.concurrencia import cerrar_ejecutor, ejecutar_en_pool, obtener_ejecutor
+from api.conexiones_duckdb import gestor_duckdb
+from api.geopanda_util import refrescar_comunas
+from api.lote import geocodificar_lote, leer_items, recibir_cuerpo
 from api.manager import retorna_geolocalizacion
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import HTMLResponse
+from api.metricas import registro_metricas
+from api.perfilador import GEO_PERFILADOR, perfilar, solicita_perfil
+from api.serializacion import RespuestaJSON
+from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from api.payloads import RequestGetGeo
+from mapeador.config.PathConfig import (
+    obtener_ruta_apt_chile,
+    obtener_ruta_apt_localidades,
+    obtener_ruta_maestro_calles,
+)
 
 # Crear el router
 router = APIRouter()
@@ -19,8 +45,11 @@ class ErrorResponse(BaseModel):
     code: int = 500
 
 # Endpoint para recibir y procesar la geolocalización de una dirección
-@router.post("/getgeo/")
-async def get_geo_endpoint(request: RequestGetGeo):
+# Con GEO_PERFILADOR=1, el encabezado "X-Perfilar: 1" o el parámetro ?perfilar=1 ejecutan la
+# petición bajo cProfile (sin usar el caché) y agregan a la respuesta el resumen del perfil.
+# La respuesta se serializa con orjson; show="resumen" entrega una traza reducida.
+@router.post("/getgeo/", response_class=RespuestaJSON)
+async def get_geo_endpoint(request: RequestGetGeo, http_request: Request):
     try:
         # Extraer los datos recibidos como un diccionario
         data = request.dict()
@@ -36,8 +65,14 @@ async def get_geo_endpoint(request: RequestGetGeo):
                 "data": data,
             }
 
-        # Llamar a retornaGeolocalizacion con los datos del diccionario
-        return retorna_geolocalizacion(request)        
+        if GEO_PERFILADOR and solicita_perfil(http_request.headers, http_request.query_params):
+            resultado, perfil = await ejecutar_en_pool(
+                perfilar, retorna_geolocalizacion, request, ignorar_cache=True
+            )
+            return RespuestaJSON({**resultado, "perfil": perfil})
+
+        # Llamar a retornaGeolocalizacion en el pool de hilos, sin bloquear el event loop
+        return RespuestaJSON(await ejecutar_en_pool(retorna_geolocalizacion, request))
 
     except Exception as e:
         raise HTTPException(
@@ -45,8 +80,135 @@ async def get_geo_endpoint(request: RequestGetGeo):
         )
 
 
+# Endpoint para geocodificar un lote de direcciones (lista JSON o NDJSON, una por línea).
+# Los resultados se entregan como NDJSON en el orden de entrada, a medida que están listos.
+@router.post("/getgeo/batch")
+async def get_geo_batch_endpoint(request: Request):
+    archivo = await recibir_cuerpo(request)
+    es_ndjson = "ndjson" in request.headers.get("content-type", "")
+    return StreamingResponse(
+        geocodificar_lote(leer_items(archivo, es_ndjson), archivo=archivo),
+        media_type="application/x-ndjson",
+    )
+
+
+# Endpoint para recargar las geometrías de comunas tras una actualización de owd.comunas
+@router.post("/admin/comunas/refrescar")
+def refrescar_comunas_endpoint():
+    try:
+        almacen = refrescar_comunas()
+        return {"comunas": len(almacen.cut_coms)}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error al refrescar las comunas: {str(e)}"
+        )
+
+
+# Estadísticas del caché de resultados de geolocalización
+@router.get("/admin/cache")
+def estadisticas_cache_endpoint():
+    return cache_geolocalizacion.estadisticas()
+
+
+# Invalida el caché de resultados de geolocalización
+@router.delete("/admin/cache")
+def invalidar_cache_endpoint():
+    return {"eliminadas": cache_geolocalizacion.invalidar()}
+
+
+# Estadísticas por fuente del caché de búsquedas sin resultado en APT CHILE y Servel
+@router.get("/admin/cache/negativo")
+def estadisticas_cache_negativo_endpoint():
+    return cache_negativo.estadisticas()
+
+
+# Invalida las búsquedas sin resultado de una fuente (?fuente=servel_direccion_persona) o de todas
+@router.delete("/admin/cache/negativo")
+def invalidar_cache_negativo_endpoint(fuente: Optional[str] = None):
+    try:
+        return {"eliminadas": cache_negativo.invalidar(fuente)}
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Fuente desconocida: {fuente}")
+
+
+# Vuelve a abrir las bases DuckDB tras ejecutar construir_referencias.py y rehace los índices
+@router.post("/admin/referencias/recargar")
+def recargar_referencias_endpoint():
+    try:
+        return {"eliminadas": recargar_referencias()}
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error al recargar las referencias: {str(e)}"
+        )
+
+
+# Estadísticas por proveedor del caché persistente de Nominatim y Google Maps
+@router.get("/admin/cache/proveedores")
+def estadisticas_cache_proveedores_endpoint():
+    return obtener_cache_proveedores().estadisticas()
+
+
+# Cascadas ejecutadas, peticiones idénticas que esperaron una cascada en curso y esperas abandonadas
+# por plazo o con el resultado rechazado
+@router.get("/admin/coalescencia")
+def estadisticas_coalescencia_endpoint():
+    return coalescedor_geolocalizacion.estadisticas()
+
+
+# Disponibilidad para el balanceador: 503 hasta que termina la precarga del arranque, o si falló
+# alguna de sus etapas requeridas
+@router.get("/ready")
+def ready_endpoint():
+    resumen = estado_arranque.resumen()
+    return JSONResponse(resumen, status_code=200 if resumen["listo"] else 503)
+
+
+# Métricas en formato de texto de Prometheus: duración por etapa y por origen, consultas a
+# proveedores y uso de los cachés
+@router.get("/metrics")
+def metricas_endpoint():
+    return PlainTextResponse(registro_metricas.exponer(), media_type="text/plain; version=0.0.4")
+
+
+async def revisar_referencias(intervalo: float):
+    """Recarga las bases de referencia cuando construir_referencias.py las reemplaza."""
+    while True:
+        await asyncio.sleep(intervalo)
+        try:
+            eliminadas = await ejecutar_en_pool(recargar_si_cambiaron)
+        except Exception as e:
+            print(f"Error al recargar las referencias reconstruidas: {e}")
+            continue
+        if eliminadas is not None:
+            print(f"Referencias reconstruidas recargadas; entradas eliminadas de los cachés: {eliminadas}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Abrir una sola vez las bases DuckDB de solo lectura que se comparten entre peticiones
+    gestor_duckdb.abrir(
+        obtener_ruta_maestro_calles(),
+        obtener_ruta_apt_chile(),
+        obtener_ruta_apt_localidades(),
+    )
+    registrar_carga_referencias()
+    app.state.duckdb = gestor_duckdb
+    app.state.ejecutor = obtener_ejecutor()
+    # Índices, glosarios, polígonos y calentamiento en segundo plano; /ready responde 503 hasta que terminen
+    app.state.arranque = asyncio.ensure_future(ejecutar_en_pool(precargar))
+    app.state.revision = (
+        asyncio.ensure_future(revisar_referencias(GEO_REVISAR_REFERENCIAS_S)) if GEO_REVISAR_REFERENCIAS_S > 0 else None
+    )
+    yield
+    app.state.arranque.cancel()
+    if app.state.revision is not None:
+        app.state.revision.cancel()
+    cerrar_ejecutor()
+    gestor_duckdb.cerrar()
+
+
 # Configurar la aplicación principal
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 app.include_router(router)
 
 # Iniciar el servidor si se ejecuta como un script
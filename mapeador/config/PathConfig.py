@@ -1,10 +1,16 @@
 import json
+import os
 
 # Variable global para almacenar la configuración
 _config = None
 
-def cargar_configuracion(archivo_config="./mapeador/config/config.json"):
-    """Carga la configuración desde un archivo JSON, solo si no se ha cargado antes."""
+def cargar_configuracion(archivo_config=None):
+    """
+    Carga la configuración desde un archivo JSON, solo si no se ha cargado antes.
+    Por defecto usa ./mapeador/config/config.json o el archivo indicado en GEO_CONFIG.
+    """
+    if archivo_config is None:
+        archivo_config = os.getenv("GEO_CONFIG", "./mapeador/config/config.json")
     global _config
     if _config is None:
         with open(archivo_config, "r", encoding="utf-8") as f:
@@ -26,6 +32,21 @@ def obtener_ruta_apt_localidades():
     config = cargar_configuracion()
     return config.get("LOCALIDADES", "")
 
+def obtener_ruta_jerarquias():
+    """Obtiene la ruta del glosario de jerarquías desde la configuración"""
+    config = cargar_configuracion()
+    return config.get("JERARQUIAS", "./mapeador/jerarquias.json")
+
+def obtener_ruta_abreviaciones():
+    """Obtiene la ruta del glosario de abreviaciones desde la configuración"""
+    config = cargar_configuracion()
+    return config.get("ABREVIACIONES", "./mapeador/abreviaciones.json")
+
+def obtener_ruta_cache_proveedores():
+    """Obtiene la ruta del caché persistente de Nominatim y Google Maps desde la configuración"""
+    config = cargar_configuracion()
+    return config.get("CACHE_PROVEEDORES", "./database/cache_proveedores.sqlite")
+
 def obtener_config():
     """Devuelve la configuración cargada"""
     return cargar_configuracion()
@@ -0,0 +1,104 @@
+import json
+import re
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from mapeador.config.PathConfig import obtener_ruta_abreviaciones, obtener_ruta_jerarquias
+from mapeador.puntaje import ratio_entero
+
+# Similitud mínima para aceptar una corrección del glosario
+SIMILITUD_MINIMA = 80
+
+
+def _normalizar(texto: str) -> str:
+    # Eliminar puntos y convertir a mayúsculas
+    return re.sub(r"\.", "", texto).strip().upper()
+
+
+def _largo_compatible(largo_a: int, largo_b: int) -> bool:
+    """
+    Indica si dos textos de estos largos pueden alcanzar la similitud mínima: ``ratio_entero``
+    nunca supera ``2 * min / (a + b)`` (la subsecuencia común no es más larga que el texto más
+    corto), así que las claves de largo muy distinto se descartan sin puntuar.
+    """
+    total = largo_a + largo_b
+    return total > 0 and round(100 * (2.0 * min(largo_a, largo_b) / total)) >= SIMILITUD_MINIMA
+
+
+class Glosario:
+    """
+    Glosario compilado para corregir palabras: primero una búsqueda exacta por hash, luego una
+    búsqueda aproximada solo entre las claves de largo compatible y, por encima, un caché por palabra.
+
+    Puntúa con ``ratio_entero``, la misma similitud del resto de la cascada: gana la clave con
+    mejor similitud (al menos SIMILITUD_MINIMA) y, ante empate, la primera del archivo.
+    """
+
+    def __init__(self, diccionario: Dict[str, List[str]]):
+        self.diccionario = diccionario
+        self.claves = list(diccionario.keys())
+        self._exactas = set(self.claves)
+        self._por_largo: Dict[int, List[Tuple[int, str]]] = {}
+        for orden, clave in enumerate(self.claves):
+            self._por_largo.setdefault(len(clave), []).append((orden, clave))
+        self._candidatas = lru_cache(maxsize=None)(self._candidatas_por_largo)
+        self._corregir = lru_cache(maxsize=65536)(self._corregir_normalizado)
+
+    def __contains__(self, palabra: str) -> bool:
+        return palabra in self._exactas
+
+    def _candidatas_por_largo(self, largo: int) -> Tuple[str, ...]:
+        # Claves de largo compatible, en el orden original del archivo
+        candidatas = sorted(
+            candidata
+            for largo_clave, claves in self._por_largo.items()
+            if _largo_compatible(largo, largo_clave)
+            for candidata in claves
+        )
+        return tuple(clave for _, clave in candidatas)
+
+    def _corregir_normalizado(self, texto: str) -> str:
+        if texto in self._exactas:
+            return texto
+
+        mejor_match = None
+        mejor_similitud = 0
+        for palabra in self._candidatas(len(texto)):
+            similitud = ratio_entero(texto, palabra)
+            if similitud > mejor_similitud and similitud >= SIMILITUD_MINIMA:
+                mejor_match = palabra
+                mejor_similitud = similitud
+        return mejor_match if mejor_match else texto
+
+    def corregir(self, texto: str) -> str:
+        """
+        Corrige una palabra con la clave más parecida del glosario.
+
+        :param texto: Palabra a corregir (se normaliza antes de buscar).
+        :return: La clave del glosario o la palabra normalizada si ninguna alcanza la similitud mínima.
+        """
+        return self._corregir(_normalizar(texto))
+
+
+def cargar_glosario(archivo: str) -> Glosario:
+    """Carga un glosario JSON asegurando UTF-8 y lo compila."""
+    with open(archivo, "r", encoding="utf-8") as f:
+        return Glosario(json.load(f))
+
+
+_glosarios: Optional[Tuple[Glosario, Glosario]] = None
+_lock_glosarios = threading.Lock()
+
+
+def obtener_glosarios() -> Tuple[Glosario, Glosario]:
+    """Retorna los glosarios (jerarquías, abreviaciones), leyéndolos del disco solo la primera vez."""
+    global _glosarios
+    if _glosarios is None:
+        with _lock_glosarios:
+            if _glosarios is None:
+                _glosarios = (
+                    cargar_glosario(obtener_ruta_jerarquias()),
+                    cargar_glosario(obtener_ruta_abreviaciones()),
+                )
+    return _glosarios
@@ -0,0 +1,164 @@
+import threading
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+from api.conexiones_duckdb import obtener_cursor
+from mapeador.config.PathConfig import obtener_ruta_maestro_calles
+from mapeador.normalizacion import patron_like
+from mapeador.puntaje import ColumnasCalles, indice_columna, ratio_entero
+
+# Similitud mínima para considerar que un nombre de comuna o región corresponde al ingresado
+UMBRAL_COMUNA = 70
+UMBRAL_REGION = 70
+
+
+class IndiceMaestroCalles:
+    """
+    Índice en memoria del maestro de calles del INE, particionado por CUT de comuna.
+
+    En lugar de recorrer la tabla completa con ``LIKE``/``OR`` en cada petición, primero se
+    resuelve la comuna (o, en su defecto, la región) y luego se entregan solo las calles
+    de esa partición al proceso de puntaje.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.columnas: List[str] = []
+        self._calles_por_cut: Dict[int, List[tuple]] = {}
+        self._columnas_por_cut: Dict[int, ColumnasCalles] = {}
+        self._cuts_por_comuna: Dict[str, List[int]] = {}
+        self._cuts_por_region: Dict[str, List[int]] = {}
+        self._resolver = lru_cache(maxsize=4096)(self._resolver_cuts)
+
+    def cargar(self) -> "IndiceMaestroCalles":
+        """Lee el maestro de calles una sola vez y construye las particiones por CUT."""
+        cursor = obtener_cursor(self.ruta)
+        cursor.execute("SELECT * FROM maestro_calles ORDER BY CUT")
+        self.columnas = [desc[0] for desc in cursor.description]
+        filas = cursor.fetchall()
+
+        idx_cut = self.columnas.index("CUT")
+        idx_comuna = indice_columna(self.columnas, "COMUNA")
+        idx_region = indice_columna(self.columnas, "REGION")
+
+        calles_por_cut: Dict[int, List[tuple]] = {}
+        cuts_por_comuna: Dict[str, List[int]] = {}
+        cuts_por_region: Dict[str, List[int]] = {}
+        for fila in filas:
+            if fila[idx_cut] is None:
+                continue
+            cut = int(fila[idx_cut])
+            particion = calles_por_cut.get(cut)
+            if particion is None:
+                particion = calles_por_cut[cut] = []
+                comuna = fila[idx_comuna] or ""
+                region = fila[idx_region] or ""
+                cuts_por_comuna.setdefault(comuna, []).append(cut)
+                cuts_por_region.setdefault(region, []).append(cut)
+            particion.append(fila)
+
+        self._calles_por_cut = calles_por_cut
+        self._columnas_por_cut = {
+            cut: ColumnasCalles(particion, self.columnas) for cut, particion in calles_por_cut.items()
+        }
+        self._cuts_por_comuna = cuts_por_comuna
+        self._cuts_por_region = cuts_por_region
+        self._resolver.cache_clear()
+        return self
+
+    def _resolver_cuts(self, comuna: str, region: str) -> Tuple[int, ...]:
+        # 1) Coincidencia exacta del nombre de la comuna
+        if comuna in self._cuts_por_comuna:
+            return tuple(self._cuts_por_comuna[comuna])
+
+        # 2) Comunas con mejor similitud sobre el umbral (errores de escritura, abreviaciones)
+        if comuna:
+            mejor_similitud = 0
+            mejores: List[int] = []
+            for nombre, cuts in self._cuts_por_comuna.items():
+                similitud = ratio_entero(nombre, comuna)
+                if comuna in nombre:
+                    similitud = max(similitud, UMBRAL_COMUNA)
+                if similitud < UMBRAL_COMUNA or similitud < mejor_similitud:
+                    continue
+                if similitud > mejor_similitud:
+                    mejor_similitud = similitud
+                    mejores = []
+                mejores.extend(cuts)
+            if mejores:
+                return tuple(mejores)
+
+        # 3) Sin comuna reconocible: todas las comunas de la región más parecida
+        if region:
+            mejor_similitud = 0
+            mejores = []
+            for nombre, cuts in self._cuts_por_region.items():
+                similitud = ratio_entero(nombre, region)
+                if region in nombre:
+                    similitud = max(similitud, UMBRAL_REGION)
+                if similitud < UMBRAL_REGION or similitud < mejor_similitud:
+                    continue
+                if similitud > mejor_similitud:
+                    mejor_similitud = similitud
+                    mejores = []
+                mejores.extend(cuts)
+            return tuple(mejores)
+
+        return ()
+
+    def resolver_cuts(self, comuna: str, region: str) -> Tuple[int, ...]:
+        """
+        Resuelve los CUT de comuna que corresponden a los nombres ingresados.
+
+        :param comuna: Nombre de la comuna, normalizado con ``normalizar_referencia``.
+        :param region: Nombre de la región, normalizado con ``normalizar_referencia``.
+        :return: CUTs candidatos; vacío si no se reconoce ni la comuna ni la región.
+        """
+        return self._resolver(comuna or "", region or "")
+
+    def candidatos(self, comuna: str, region: str, nombre_via: str) -> List[Tuple[List[tuple], ColumnasCalles]]:
+        """
+        Retorna las particiones candidatas para el puntaje, como pares (filas, columnas preparadas):
+        las de la comuna resuelta o, si no se reconoce la comuna ni la región, las calles que
+        contienen el nombre de la vía.
+        """
+        cuts = self.resolver_cuts(comuna, region)
+        if cuts:
+            return [
+                (self._calles_por_cut[cut], self._columnas_por_cut[cut])
+                for cut in cuts
+                if cut in self._calles_por_cut
+            ]
+
+        if not nombre_via:
+            return []
+
+        cursor = obtener_cursor(self.ruta)
+        filas = cursor.execute(
+            "SELECT * FROM maestro_calles WHERE NOMBRE_VIA_NORM LIKE ? ESCAPE '\\'",
+            (patron_like(nombre_via),),
+        ).fetchall()
+        return [(filas, ColumnasCalles(filas, self.columnas))]
+
+
+_indice: Optional[IndiceMaestroCalles] = None
+_lock_indice = threading.Lock()
+
+
+def obtener_indice_maestro_calles() -> IndiceMaestroCalles:
+    """Retorna el índice compartido del maestro de calles, construyéndolo en el primer uso."""
+    global _indice
+    if _indice is None:
+        with _lock_indice:
+            if _indice is None:
+                _indice = IndiceMaestroCalles(obtener_ruta_maestro_calles()).cargar()
+    return _indice
+
+
+def recargar_indice_maestro_calles() -> IndiceMaestroCalles:
+    """Reconstruye el índice compartido, por ejemplo tras actualizar el archivo del maestro de calles."""
+    global _indice
+    nuevo = IndiceMaestroCalles(obtener_ruta_maestro_calles()).cargar()
+    with _lock_indice:
+        _indice = nuevo
+    return nuevo
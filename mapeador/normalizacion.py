@@ -0,0 +1,30 @@
+import unicodedata
+
+
+def expresion_normalizacion(columna: str) -> str:
+    """
+    Expresión SQL (DuckDB) con la que ``construir_referencias.py`` precalcula las columnas
+    ``*_NORM``: mayúsculas, sin tildes y con espacios simples.
+    """
+    return f"trim(regexp_replace(strip_accents(upper({columna})), '\\s+', ' ', 'g'))"
+
+
+def normalizar_referencia(texto: str) -> str:
+    """
+    Normaliza un texto de entrada igual que las columnas ``*_NORM`` de las bases de
+    referencia, para compararlo con ellas sin ``upper()`` ni ``ILIKE`` en la consulta.
+    """
+    if not texto:
+        return ""
+    descompuesto = unicodedata.normalize("NFKD", str(texto).upper())
+    sin_tildes = "".join(caracter for caracter in descompuesto if not unicodedata.combining(caracter))
+    return " ".join(sin_tildes.split())
+
+
+def patron_like(texto: str) -> str:
+    """
+    Patrón LIKE que exige las palabras del texto normalizado en orden: 'LOS AROMOS' -> '%LOS%AROMOS%'.
+    Los ``%``, ``_`` y ``\\`` del texto se escapan con ``\\``, así que la consulta debe usar ``ESCAPE '\\'``.
+    """
+    palabras = normalizar_referencia(texto).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").split()
+    return f"%{'%'.join(palabras)}%"
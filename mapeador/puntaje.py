@@ -0,0 +1,130 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from rapidfuzz import process
+from rapidfuzz.distance import Indel
+
+# Umbrales del puntaje del maestro de calles
+UMBRAL_JERARQUIA = 70  # estrictamente mayor
+UMBRAL_COMUNA = 70
+UMBRAL_REGION = 70
+UMBRAL_NOMBRE_VIA = 50
+
+
+def ratio_entero(a: Optional[str], b: Optional[str]) -> int:
+    """
+    Equivalente escalar de ``fuzz.ratio``: similitud entera 0-100 por subsecuencia común más
+    larga, 100 si los textos son iguales y 0 si alguno es None o solo uno está vacío.
+
+    Coincide con ``fuzz.ratio`` cuando fuzzywuzzy usa python-Levenshtein (``requirements.txt``);
+    sin él, fuzzywuzzy cae en ``difflib.SequenceMatcher``, que puntúa distinto.
+    """
+    if a is None or b is None:
+        return 0
+    if a == b:
+        return 100
+    if not a or not b:
+        return 0
+    largo_total = len(a) + len(b)
+    coincidencias = (largo_total - Indel.distance(a, b)) // 2
+    return int(round(100 * (2.0 * coincidencias / largo_total)))
+
+
+class ColumnaCategorica:
+    """
+    Columna de texto ya normalizada (mayúsculas, ``""`` para nulos) guardada como valores
+    únicos más un arreglo de posiciones, para puntuar cada valor distinto una sola vez.
+    """
+
+    __slots__ = ("unicos", "largos", "vacios", "inverso")
+
+    def __init__(self, valores: Sequence[Optional[str]]):
+        normalizados = [valor.upper() if valor else "" for valor in valores]
+        unicos, inverso = np.unique(np.array(normalizados, dtype=object), return_inverse=True)
+        self.unicos: List[str] = list(unicos)
+        self.largos = np.fromiter((len(valor) for valor in self.unicos), dtype=np.int64, count=len(self.unicos))
+        self.vacios = self.largos == 0
+        self.inverso = inverso.reshape(-1)
+
+    def similitudes(self, consulta: str) -> np.ndarray:
+        """
+        Similitud de cada fila con la consulta, igual a ``ratio_entero`` (0 a 100, redondeo al
+        par más cercano). Valores o consulta vacíos puntúan 0, como las filas con el campo nulo
+        en el recorrido fila a fila.
+        """
+        if not consulta or not self.unicos:
+            return np.zeros(len(self.inverso), dtype=np.int64)
+
+        distancias = process.cdist([consulta], self.unicos, scorer=Indel.distance, dtype=np.int64, workers=1)[0]
+        largo_total = self.largos + len(consulta)
+        coincidencias = (largo_total - distancias) // 2
+        puntajes = np.rint(100 * (2.0 * coincidencias / largo_total)).astype(np.int64)
+        puntajes[self.vacios] = 0
+        return puntajes[self.inverso]
+
+
+def indice_columna(columnas: List[str], nombre: str) -> int:
+    """Posición de la columna normalizada (``<nombre>_NORM``) si la base la trae, o de la original."""
+    normalizada = f"{nombre}_NORM"
+    return columnas.index(normalizada) if normalizada in columnas else columnas.index(nombre)
+
+
+class ColumnasCalles:
+    """
+    Columnas del maestro de calles que participan en el puntaje, preparadas para una partición.
+    Se usan las columnas ``*_NORM`` precalculadas cuando existen.
+    """
+
+    __slots__ = ("jerarquia", "comuna", "region", "nombre_via")
+
+    def __init__(self, filas: Sequence[tuple], columnas: List[str]):
+        idx_jerarquia = indice_columna(columnas, "JERARQUIA")
+        idx_comuna = indice_columna(columnas, "COMUNA")
+        idx_region = indice_columna(columnas, "REGION")
+        idx_nombre_via = indice_columna(columnas, "NOMBRE_VIA")
+        self.jerarquia = ColumnaCategorica([fila[idx_jerarquia] for fila in filas])
+        self.comuna = ColumnaCategorica([fila[idx_comuna] for fila in filas])
+        self.region = ColumnaCategorica([fila[idx_region] for fila in filas])
+        self.nombre_via = ColumnaCategorica([fila[idx_nombre_via] for fila in filas])
+
+    def puntajes(self, jerarquia: str, comuna: str, region: str, nombre_via: str) -> np.ndarray:
+        """Puntaje total por fila con la misma ponderación que el recorrido fila a fila."""
+        jerarquia_similitud = self.jerarquia.similitudes(jerarquia)
+        comuna_similitud = self.comuna.similitudes(comuna)
+        region_similitud = self.region.similitudes(region)
+        nombre_via_similitud = self.nombre_via.similitudes(nombre_via)
+
+        return (
+            (jerarquia_similitud > UMBRAL_JERARQUIA) * jerarquia_similitud
+            + (comuna_similitud >= UMBRAL_COMUNA) * comuna_similitud
+            + (region_similitud >= UMBRAL_REGION) * region_similitud
+            + (nombre_via_similitud >= UMBRAL_NOMBRE_VIA) * nombre_via_similitud
+        )
+
+
+def mejor_candidato(
+    particiones: Sequence[Tuple[Sequence[tuple], ColumnasCalles]],
+    jerarquia: str,
+    comuna: str,
+    region: str,
+    nombre_via: str,
+) -> Tuple[Optional[tuple], int]:
+    """
+    Busca la fila con mayor puntaje entre todas las particiones candidatas.
+
+    Ante empates gana la primera fila en el orden de las particiones, igual que el recorrido
+    original (que solo reemplazaba la mejor fila con un puntaje estrictamente mayor).
+
+    :return: Tupla (mejor fila o None si ninguna puntúa sobre 0, puntaje).
+    """
+    mejor_fila = None
+    mejor_puntaje = 0
+    for filas, columnas in particiones:
+        if not filas:
+            continue
+        puntajes = columnas.puntajes(jerarquia, comuna, region, nombre_via)
+        posicion = int(np.argmax(puntajes))
+        if puntajes[posicion] > mejor_puntaje:
+            mejor_puntaje = int(puntajes[posicion])
+            mejor_fila = filas[posicion]
+    return mejor_fila, mejor_puntaje
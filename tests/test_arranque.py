@@ -0,0 +1,16 @@
+"""Recarga de las bases de referencia cuando ``construir_referencias.py`` las reemplaza."""
+import api.arranque as arranque
+
+
+def test_recarga_solo_si_cambia_la_firma(monkeypatch):
+    firmas = iter([{"apt": (1, 10)}, {"apt": (1, 10)}, {"apt": (2, 20)}])
+    recargas = []
+    monkeypatch.setattr(arranque, "firma_referencias", lambda: next(firmas))
+    monkeypatch.setattr(arranque, "recargar_referencias", lambda: recargas.append(1) or {"resultados": 3})
+    monkeypatch.setattr(arranque, "_firma_cargada", None)
+
+    assert arranque.recargar_si_cambiaron() is None
+    arranque.registrar_carga_referencias()
+    assert arranque.recargar_si_cambiaron() is None
+    assert arranque.recargar_si_cambiaron() == {"resultados": 3}
+    assert recargas == [1]
@@ -0,0 +1,39 @@
+"""Validación de comuna con el almacén en memoria."""
+import geopandas as gpd
+from shapely.geometry import box
+
+import api.geopanda_util as geopanda_util
+from api.geopanda_util import AlmacenComunas, esta_en_comuna
+
+
+def almacen_de_prueba():
+    gdf = gpd.GeoDataFrame(
+        {"cut_com": ["13101", "05101"], "comuna": ["SANTIAGO", "VALPARAISO"]},
+        geometry=[box(-70.7, -33.5, -70.6, -33.4), box(-71.7, -33.1, -71.5, -33.0)],
+    ).rename_geometry("geom")
+    return AlmacenComunas().cargar(gdf)
+
+
+def test_ubica_dentro_limite_y_fuera(monkeypatch):
+    almacen = almacen_de_prueba()
+    monkeypatch.setattr(geopanda_util, "obtener_almacen_comunas", lambda: almacen)
+    assert esta_en_comuna("SANTIAGO", "13101", -33.45, -70.65)["resultado"] == "Dentro"
+    assert esta_en_comuna("SANTIAGO", "13101", -33.45, -70.6)["resultado"] == "Limite"
+    assert esta_en_comuna("SANTIAGO", "13101", -33.05, -71.6)["resultado"] == "Fuera"
+    # Un código de 4 dígitos se completa con el cero inicial
+    assert esta_en_comuna("VALPARAISO", "5101", -33.05, -71.6) == {
+        "comuna": "VALPARAISO",
+        "cod_comuna": "05101",
+        "resultado": "Dentro",
+    }
+
+
+def test_error_al_cargar_entrega_el_mismo_diccionario(monkeypatch):
+    def fallar():
+        raise RuntimeError("sin conexión")
+
+    monkeypatch.setattr(geopanda_util, "obtener_almacen_comunas", fallar)
+    respuesta = esta_en_comuna("SANTIAGO", "13101", -33.45, -70.65)
+    assert respuesta["resultado"] is None
+    assert respuesta["comuna"] == "SANTIAGO" and respuesta["cod_comuna"] == "13101"
+    assert "sin conexión" in respuesta["error"]
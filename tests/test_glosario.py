@@ -0,0 +1,34 @@
+"""El glosario compilado contra un recorrido de todas sus claves con ``fuzz.ratio``."""
+import random
+
+from fuzzywuzzy import fuzz
+
+from mapeador.config.PathConfig import obtener_ruta_abreviaciones, obtener_ruta_jerarquias
+from mapeador.glosario import SIMILITUD_MINIMA, cargar_glosario
+
+
+def corregir_recorriendo(texto, claves):
+    texto = texto.replace(".", "").strip().upper()
+    mejor_match, mejor_similitud = None, 0
+    for palabra in claves:
+        similitud = fuzz.ratio(texto, palabra)
+        if similitud > mejor_similitud and similitud >= SIMILITUD_MINIMA:
+            mejor_match, mejor_similitud = palabra, similitud
+    return mejor_match if mejor_match else texto
+
+
+def test_corregir_igual_al_recorrido_de_todas_las_claves():
+    azar = random.Random(1)
+    for ruta in (obtener_ruta_jerarquias(), obtener_ruta_abreviaciones()):
+        glosario = cargar_glosario(ruta)
+        palabras = list(glosario.claves)
+        for variaciones in glosario.diccionario.values():
+            palabras.extend(variaciones)
+        for palabra in list(palabras):
+            letras = list(palabra)
+            if letras:
+                letras[azar.randrange(len(letras))] = azar.choice("AEIOU.")
+            palabras.append("".join(letras))
+            palabras.append(palabra.lower() + ".")
+        for palabra in palabras:
+            assert glosario.corregir(palabra) == corregir_recorriendo(palabra, glosario.claves), palabra
@@ -0,0 +1,130 @@
+"""Lectura incremental del cuerpo de ``/getgeo/batch`` y armado de las líneas NDJSON."""
+import asyncio
+import io
+import json
+
+import pytest
+
+import api.lote as lote
+from api.lote import geocodificar_lote, leer_items, leer_lista_json
+
+BLOQUES = [1, 2, 3, 7, 64 * 1024]
+
+ITEMS = [
+    {"nombre_via": "PASAJE \"EL [SOL]\"", "numero": "12", "comuna": "ÑUÑOA", "region": "RM"},
+    {"nombre_via": "CALLE {NUEVA}, LOTE [3]", "info": {"origen": {"sistema": "x", "ids": [1, [2, 3]]}}},
+    "texto con \\ y \u00f1 y ]},[{",
+    [[], {}, [{"a": "]"}]],
+    -12.5e-3,
+    123456789,
+    True,
+    None,
+]
+
+
+def cuerpo(datos, separador=", "):
+    return ("[" + separador.join(json.dumps(item, ensure_ascii=False) for item in datos) + "]").encode("utf-8")
+
+
+@pytest.mark.parametrize("bloque", BLOQUES)
+def test_lista_con_textos_anidados_y_escapes(bloque):
+    assert list(leer_lista_json(io.BytesIO(cuerpo(ITEMS)), bloque)) == ITEMS
+
+
+@pytest.mark.parametrize("bloque", BLOQUES)
+def test_espacios_y_lista_vacia(bloque):
+    assert list(leer_lista_json(io.BytesIO(b" \n[ \n]\n"), bloque)) == []
+    assert list(leer_lista_json(io.BytesIO(cuerpo(ITEMS, separador=" ,\n\t ")), bloque)) == ITEMS
+
+
+@pytest.mark.parametrize("bloque", BLOQUES)
+def test_cada_corte_de_bloque(bloque):
+    # Un "{" o "[" (y cualquier otro carácter, incluso un carácter UTF-8 de varios bytes) al borde de un bloque
+    datos = cuerpo(ITEMS)
+    for inicio in range(0, min(len(datos), 40)):
+        archivo = io.BytesIO(b" " * inicio + datos)
+        assert list(leer_lista_json(archivo, bloque)) == ITEMS
+
+
+@pytest.mark.parametrize("bloque", BLOQUES)
+@pytest.mark.parametrize(
+    "datos, leidos",
+    [
+        (b'{"nombre_via": "x"}', 0),
+        (b"", 0),
+        (b'[{"a": 1}, {"a": 2}', 2),
+        (b'[{"a": 1} {"a": 2}]', 1),
+        (b'[{"a": 1}, {"a": }]', 1),
+        (b'[{"a": "sin cerrar}]', 0),
+        (b"[1, 2,]", 2),
+    ],
+)
+def test_json_invalido(bloque, datos, leidos):
+    entregados = []
+    with pytest.raises(ValueError):
+        for item in leer_lista_json(io.BytesIO(datos), bloque):
+            entregados.append(item)
+    assert len(entregados) == leidos
+
+
+def test_ndjson_salta_lineas_vacias_e_informa_las_invalidas():
+    datos = b'{"id": "a", "nombre_via": "X"}\n\n   \n{"nombre_via": "Y"}\r\n{malo\n\n{"nombre_via": "Z"}'
+    items = list(leer_items(io.BytesIO(datos), es_ndjson=True))
+    assert [id_item for id_item, _ in items] == ["a", 1, 2, 3]
+    assert items[0][1] == {"nombre_via": "X"} and items[1][1] == {"nombre_via": "Y"}
+    assert isinstance(items[2][1], ValueError)
+    assert items[3][1] == {"nombre_via": "Z"}
+
+
+def lineas_del_lote(datos, es_ndjson, paralelismo=2):
+    async def recorrer():
+        return [linea async for linea in geocodificar_lote(leer_items(io.BytesIO(datos), es_ndjson), paralelismo)]
+
+    return [json.loads(linea) for bloque in asyncio.run(recorrer()) for linea in bloque.splitlines()]
+
+
+def test_lote_por_ventanas_en_orden(monkeypatch):
+    ventanas = []
+
+    def geocodificar(requests, ejecutor=None):
+        ventanas.append([request.nombre_via for request in requests])
+        return [{"origen": "APT CHILE", "direccion": request.nombre_via} for request in requests]
+
+    monkeypatch.setattr(lote, "retorna_geolocalizaciones", geocodificar)
+    direccion = {"numero": "1", "comuna": "C", "region": "R"}
+    datos = cuerpo(
+        [
+            {**direccion, "nombre_via": "A", "id": "x"},
+            {**direccion, "nombre_via": ""},
+            {**direccion, "nombre_via": "B"},
+            {**direccion, "nombre_via": "C"},
+            {"nombre_via": 5},
+        ]
+    )[:-1] + b", {"
+    lineas = lineas_del_lote(datos, es_ndjson=False)
+    assert ventanas == [["A"], ["B", "C"]]
+    assert [linea["id"] for linea in lineas] == ["x", 1, 2, 3, 4, None]
+    assert lineas[0]["resultado"]["direccion"] == "A"
+    assert "warnings" in lineas[1]
+    assert lineas[3]["resultado"]["direccion"] == "C"
+    assert lineas[4]["error"].startswith("Dirección inválida")
+    assert lineas[5]["error"].startswith("Lote inválido")
+
+
+def test_ventana_fallida_se_geocodifica_de_a_una(monkeypatch):
+    def fallar(requests, ejecutor=None):
+        raise RuntimeError("duckdb caído")
+
+    def geocodificar_una(request):
+        if request.nombre_via == "MALA":
+            raise RuntimeError("falla propia")
+        return {"direccion": request.nombre_via}
+
+    monkeypatch.setattr(lote, "retorna_geolocalizaciones", fallar)
+    monkeypatch.setattr(lote, "retorna_geolocalizacion", geocodificar_una)
+    direccion = {"numero": "1", "comuna": "C", "region": "R"}
+    datos = b"\n".join(json.dumps({**direccion, "nombre_via": via}).encode() for via in ("A", "MALA", "B"))
+    lineas = lineas_del_lote(datos, es_ndjson=True, paralelismo=3)
+    assert lineas[0]["resultado"] == {"direccion": "A"}
+    assert lineas[1]["error"] == "Error al procesar la solicitud: falla propia"
+    assert lineas[2]["resultado"] == {"direccion": "B"}
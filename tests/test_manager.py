@@ -0,0 +1,142 @@
+"""
+Caché y coalescencia de ``retorna_geolocalizacion`` y lotes de ``retorna_geolocalizaciones``, con
+la cascada reemplazada por un doble.
+"""
+import threading
+
+import pytest
+
+import api.manager as manager
+from api.cache import cache_geolocalizacion
+from api.degradacion import fallas_peticion, marcar_falla
+from api.payloads import RequestGetGeo
+from api.plazo import tiempo_restante
+from api.registros import DatosCalle, DireccionEnProceso
+
+
+@pytest.fixture
+def cascada(monkeypatch):
+    """Reemplaza la cascada por una que anota la petición recibida y entrega un resultado nuevo."""
+    llamadas = []
+
+    def calcular(request):
+        llamadas.append(request)
+        request.numero = manager.procesar_numero(request.numero)
+        return {"origen": "APT CHILE", "latitud": -33.4, "longitud": -70.6, "geopanda": {"resultado": "Dentro"}}
+
+    cache_geolocalizacion.invalidar()
+    monkeypatch.setattr(manager, "calcula_geolocalizacion", calcular)
+    yield llamadas
+    cache_geolocalizacion.invalidar()
+
+
+def peticion(**campos):
+    datos = {"nombre_via": "los aromos", "numero": "12", "comuna": "Ñuñoa", "region": "Metropolitana"}
+    return RequestGetGeo(**{**datos, **campos})
+
+
+def test_no_modifica_la_peticion(cascada):
+    request = peticion(numero="SN")
+    manager.retorna_geolocalizacion(request)
+    assert (request.nombre_via, request.numero, request.comuna, request.region) == (
+        "los aromos",
+        "SN",
+        "Ñuñoa",
+        "Metropolitana",
+    )
+    # La cascada recibe los textos tal como llegaron, en una copia
+    assert cascada[0] is not request and cascada[0].nombre_via == "los aromos"
+
+
+def test_cada_llamada_recibe_su_copia(cascada):
+    primero = manager.retorna_geolocalizacion(peticion())
+    primero["geopanda"]["resultado"] = "modificado"
+    segundo = manager.retorna_geolocalizacion(peticion())
+    assert len(cascada) == 1
+    assert segundo["geopanda"]["resultado"] == "Dentro"
+    segundo["latitud"] = 0
+    assert manager.retorna_geolocalizacion(peticion())["latitud"] == -33.4
+
+
+def test_la_clave_distingue_provincia_y_mayusculas(cascada):
+    manager.retorna_geolocalizacion(peticion(provincia="SANTIAGO"))
+    manager.retorna_geolocalizacion(peticion(provincia="CORDILLERA"))
+    manager.retorna_geolocalizacion(peticion(nombre_via="LOS AROMOS", provincia="SANTIAGO"))
+    manager.retorna_geolocalizacion(peticion(provincia="SANTIAGO", numero="12 "))
+    assert len(cascada) == 3
+
+
+def test_los_que_esperan_reciben_copias(monkeypatch):
+    cache_geolocalizacion.invalidar()
+    liberar = threading.Event()
+
+    def calcular(request):
+        liberar.wait(5)
+        return {"origen": "APT CHILE", "geopanda": {"resultado": "Dentro"}}
+
+    monkeypatch.setattr(manager, "calcula_geolocalizacion", calcular)
+    resultados = []
+    hilos = [
+        threading.Thread(target=lambda: resultados.append(manager.retorna_geolocalizacion(peticion(plazo_ms=0))))
+        for _ in range(3)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    liberar.set()
+    for hilo in hilos:
+        hilo.join()
+    cache_geolocalizacion.invalidar()
+    assert len(resultados) == 3
+    assert len({id(resultado["geopanda"]) for resultado in resultados}) == 3
+
+
+@pytest.fixture
+def lote(monkeypatch):
+    """
+    Reemplaza las etapas del lote por dobles: la preparación marca una falla y la etapa final
+    entrega el plazo y las fallas que ve cada dirección.
+    """
+    preparadas = []
+
+    def preparar(request):
+        preparadas.append((request.nombre_via, tiempo_restante()))
+        marcar_falla("maestro_calles")
+        return DireccionEnProceso(
+            nombre_via=request.nombre_via, numero=request.numero, datos_callejeros=DatosCalle(cut="13101")
+        )
+
+    def resolver(request, direccion, apt):
+        return {"origen": "APT CHILE" if apt else None, "restante": tiempo_restante(), "fallas": fallas_peticion()}
+
+    cache_geolocalizacion.invalidar()
+    monkeypatch.setattr(manager, "preparar_direccion", preparar)
+    monkeypatch.setattr(manager, "resolver_geolocalizacion", resolver)
+    monkeypatch.setattr(
+        manager.AptChile, "buscar_direcciones_con_numero", lambda self, consultas: [object()] * len(consultas)
+    )
+    yield preparadas
+    cache_geolocalizacion.invalidar()
+
+
+def test_lote_calcula_una_vez_las_repetidas(lote):
+    resultados = manager.retorna_geolocalizaciones([peticion(), peticion(nombre_via="otra"), peticion()])
+    assert [nombre for nombre, _ in lote] == ["los aromos", "otra"]
+    assert resultados[0] == resultados[2] and resultados[0] is not resultados[2]
+
+
+def test_lote_prepara_dentro_del_plazo_y_las_fallas_de_cada_direccion(lote):
+    resultados = manager.retorna_geolocalizaciones([peticion(plazo_ms=5000), peticion(nombre_via="otra", plazo_ms=0)])
+    assert 0 < lote[0][1] <= 5 and lote[1][1] is None
+    assert 0 < resultados[0]["restante"] <= lote[0][1] and resultados[1]["restante"] is None
+    assert [resultado["fallas"] for resultado in resultados] == [["maestro_calles"], ["maestro_calles"]]
+
+
+def test_lote_degrada_si_falla_apt_chile(lote, monkeypatch):
+    def fallar(self, consultas):
+        raise RuntimeError("base no disponible")
+
+    monkeypatch.setattr(manager.AptChile, "buscar_direcciones_con_numero", fallar)
+    resultados = manager.retorna_geolocalizaciones([peticion(), peticion(nombre_via="otra", numero="")])
+    assert resultados[0]["origen"] is None
+    assert resultados[0]["fallas"] == ["maestro_calles", "apt_chile"]
+    assert resultados[1]["fallas"] == ["maestro_calles"]
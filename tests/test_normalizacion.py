@@ -0,0 +1,27 @@
+"""Patrones LIKE de ``mapeador.normalizacion`` contra DuckDB."""
+import duckdb
+import pytest
+
+from mapeador.normalizacion import patron_like
+
+
+@pytest.mark.parametrize(
+    "texto, nombre, coincide",
+    [
+        ("los aromos", "PASAJE LOS AROMOS", True),
+        ("los aromos", "AROMOS LOS", False),
+        ("100%", "CALLE 100%", True),
+        ("100%", "CALLE 1000", False),
+        ("a_b", "A_B", True),
+        ("a_b", "AXB", False),
+        ("a\\b", "A\\B", True),
+        ("a\\b", "AB", False),
+    ],
+)
+def test_patron_like_escapa_comodines(texto, nombre, coincide):
+    conexion = duckdb.connect()
+    try:
+        resultado = conexion.execute("SELECT ? LIKE ? ESCAPE '\\'", [nombre, patron_like(texto)]).fetchone()[0]
+    finally:
+        conexion.close()
+    assert resultado is coincide
@@ -0,0 +1,100 @@
+"""
+Paridad del motor de puntaje del maestro de calles (``mapeador.puntaje``) con ``fuzz.ratio``,
+sobre los nombres de la base configurada en ``mapeador/config/config.json``.
+"""
+import os
+import random
+
+import duckdb
+import pytest
+from fuzzywuzzy import fuzz
+
+from mapeador.config.PathConfig import obtener_ruta_maestro_calles
+from mapeador.puntaje import ColumnaCategorica, ColumnasCalles, mejor_candidato, ratio_entero
+
+COLUMNAS = ["JERARQUIA", "COMUNA", "REGION", "NOMBRE_VIA"]
+
+
+@pytest.fixture(scope="module")
+def filas():
+    ruta = obtener_ruta_maestro_calles()
+    if not ruta or not os.path.exists(ruta):
+        pytest.skip(f"No está la base del maestro de calles ({ruta!r}); se genera con construir_referencias.py")
+    conexion = duckdb.connect(ruta, read_only=True)
+    try:
+        return conexion.execute(f"SELECT {', '.join(COLUMNAS)} FROM maestro_calles").fetchall()
+    finally:
+        conexion.close()
+
+
+def variantes(nombres, cantidad, semilla=1):
+    """Nombres reales con errores de tipeo: letras borradas, cambiadas o duplicadas."""
+    azar = random.Random(semilla)
+    consultas = []
+    for _ in range(cantidad):
+        nombre = list(azar.choice(nombres))
+        for _ in range(azar.randint(0, 3)):
+            if not nombre:
+                break
+            posicion = azar.randrange(len(nombre))
+            operacion = azar.choice(("borrar", "cambiar", "duplicar"))
+            if operacion == "borrar":
+                del nombre[posicion]
+            elif operacion == "cambiar":
+                nombre[posicion] = azar.choice("AEIOURSTLN ")
+            else:
+                nombre.insert(posicion, nombre[posicion])
+        consultas.append("".join(nombre))
+    return consultas
+
+
+def test_fuzzywuzzy_usa_levenshtein():
+    # Con difflib, fuzz.ratio no coincide con el motor vectorizado
+    assert fuzz.SequenceMatcher.__module__ != "difflib"
+
+
+def test_ratio_entero_igual_a_fuzz_ratio(filas):
+    nombres = sorted({fila[3].upper() for fila in filas if fila[3]})
+    consultas = variantes(nombres, 300) + ["", nombres[0]]
+    azar = random.Random(2)
+    for consulta in consultas:
+        for nombre in azar.sample(nombres, min(50, len(nombres))) + [""]:
+            assert ratio_entero(nombre, consulta) == fuzz.ratio(nombre, consulta), (nombre, consulta)
+
+
+def test_similitudes_iguales_al_recorrido_fila_a_fila(filas):
+    valores = [fila[3] for fila in filas]
+    columna = ColumnaCategorica(valores)
+    nombres = sorted({valor.upper() for valor in valores if valor})
+    for consulta in variantes(nombres, 40):
+        esperadas = [fuzz.ratio(valor.upper(), consulta) if valor else 0 for valor in valores]
+        assert columna.similitudes(consulta).tolist() == esperadas, consulta
+
+
+def test_mejor_candidato_igual_al_recorrido_fila_a_fila(filas):
+    columnas = ColumnasCalles(filas, COLUMNAS)
+    azar = random.Random(3)
+    nombres = sorted({fila[3].upper() for fila in filas if fila[3]})
+    for nombre_via in variantes(nombres, 30):
+        jerarquia, comuna, region, _ = azar.choice(filas)
+        jerarquia, comuna, region = (valor.upper() if valor else "" for valor in (jerarquia, comuna, region))
+
+        mejor_fila, mejor_puntaje = None, 0
+        for fila in filas:
+            similitudes = [
+                fuzz.ratio(valor.upper(), consulta) if valor else 0
+                for valor, consulta in zip(fila, (jerarquia, comuna, region, nombre_via))
+            ]
+            puntaje = (
+                (similitudes[0] > 70) * similitudes[0]
+                + (similitudes[1] >= 70) * similitudes[1]
+                + (similitudes[2] >= 70) * similitudes[2]
+                + (similitudes[3] >= 50) * similitudes[3]
+            )
+            if puntaje > mejor_puntaje:
+                mejor_fila, mejor_puntaje = fila, puntaje
+
+        assert mejor_candidato([(filas, columnas)], jerarquia, comuna, region, nombre_via) == (
+            mejor_fila,
+            mejor_puntaje,
+        )